@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends, Header
 from pydantic import BaseModel
-from app.services.auth_service import get_auth_service
+from app.services.auth_service import get_auth_service, user_id_from_response, response_field
+from app.utils.exceptions import AppException
 from typing import Optional
 
 router = APIRouter()
@@ -18,11 +19,7 @@ async def signup(request: SignUpRequest, auth_service = Depends(get_auth_service
     """用户注册"""
     try:
         response = await auth_service.sign_up(request.email, request.password)
-        user_id = None
-        if response.get("user"):
-            user_id = response["user"]["id"]
-        elif hasattr(response, 'user') and response.user:
-            user_id = response.user.id
+        user_id = user_id_from_response(response)
             
         return {
             "success": True,
@@ -38,19 +35,9 @@ async def signin(request: SignInRequest, auth_service = Depends(get_auth_service
     try:
         response = await auth_service.sign_in(request.email, request.password)
         
-        # 处理不同的响应格式
-        access_token = None
-        user_id = None
-        
-        if response.get("session"):
-            access_token = response["session"]["access_token"]
-        elif hasattr(response, 'session') and response.session:
-            access_token = response.session.access_token
-            
-        if response.get("user"):
-            user_id = response["user"]["id"]
-        elif hasattr(response, 'user') and response.user:
-            user_id = response.user.id
+        # 兼容SDK响应对象与demo模式的字典
+        access_token = response_field(response_field(response, "session"), "access_token")
+        user_id = user_id_from_response(response)
             
         return {
             "success": True,
@@ -79,6 +66,8 @@ async def get_current_user(
             raise HTTPException(status_code=401, detail="Invalid token")
         
         return user_id
+    except AppException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=401, detail="Invalid token")
 
@@ -1,27 +1,54 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
-from typing import List
+import json
+import logging
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from typing import List, Optional
+from app.config import settings
 from app.models.memory import (
     MemoryCreateRequest, MemoryUpdateRequest, MemoryResponse,
-    SearchRequest, SearchResponse, MemoryListResponse, StandardResponse
+    SearchRequest, SearchResponse, MemoryListResponse, StandardResponse,
+    SearchMode, FusionMethod, BatchCreateResponse, BatchItemResult, ImportResponse,
+    WriteStatusResponse
 )
 from app.services.memory_service import get_memory_service
+from app.services.llm_service import get_llm_service
+from app.services.import_service import get_import_service
+from app.services.write_queue import get_write_queue
 from app.api.auth import get_current_user
+from app.utils.exceptions import AppException, NotFoundException, ValidationException
+from app.utils.ndjson import dumps_line, gzip_stream, is_ndjson, parse_ndjson
 
 router = APIRouter()
 
+def _sse_event(data: dict, event: Optional[str] = None) -> str:
+    """格式化一条Server-Sent Event"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 @router.post("/memories", response_model=StandardResponse, summary="添加新记忆")
 async def create_memory(
     request: MemoryCreateRequest,
+    response: Response,
     current_user: str = Depends(get_current_user),
-    memory_service = Depends(get_memory_service)
+    memory_service = Depends(get_memory_service),
+    write_queue = Depends(get_write_queue)
 ):
     """
     添加新的文本记忆
     
     - **content**: 记忆内容（必填，1-10000字符）
     - **metadata**: 可选的元数据，如分类、标签等
+    
+    memory_write_mode=async时写入本地日志后立即返回202和write_id，
+    可通过 GET /api/memories/writes/{write_id} 查询写入状态
     """
     try:
+        if settings.memory_write_mode == "async":
+            accepted = await write_queue.submit(current_user, request.content, request.metadata)
+            response.status_code = 202
+            return StandardResponse(success=True, message="记忆已接收，正在后台写入", data=accepted)
+
         result = await memory_service.add_memory(
             content=request.content,
             user_id=current_user,
@@ -33,13 +60,102 @@ async def create_memory(
             message="记忆添加成功",
             data={"memory_id": result.get("id", "unknown")}
         )
+    except AppException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"添加记忆失败: {str(e)}")
 
+def _validation_message(error: ValidationError) -> str:
+    """把pydantic校验错误压缩为一行"""
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc']) or 'item'}: {item['msg']}"
+        for item in error.errors()
+    )
+
+def _parse_batch_body(body: bytes, content_type: str) -> list:
+    """解析批量请求体：JSON数组或NDJSON"""
+    try:
+        items = parse_ndjson(body) if is_ndjson(content_type) else json.loads(body)
+    except ValueError as e:
+        raise ValidationException(detail=f"请求体解析失败: {e}", field="body")
+    if not isinstance(items, list):
+        raise ValidationException(detail="请求体必须是JSON数组或NDJSON", field="body")
+    if len(items) > settings.memory_batch_max_items:
+        raise ValidationException(
+            detail=f"单次最多{settings.memory_batch_max_items}条记忆", field="body"
+        )
+    return items
+
+@router.post("/memories/batch", response_model=BatchCreateResponse, summary="批量添加记忆")
+async def create_memories_batch(
+    http_request: Request,
+    current_user: str = Depends(get_current_user),
+    memory_service = Depends(get_memory_service)
+):
+    """
+    批量添加记忆，单次认证、单次请求写入多条
+    
+    - 请求体为MemoryCreateRequest的JSON数组，或Content-Type为application/x-ndjson时每行一条
+    - 先整体校验，校验失败的条目标记为invalid，其余条目以有界并发写入
+    - 返回与请求顺序一致的逐条结果
+    """
+    items = _parse_batch_body(await http_request.body(), http_request.headers.get("content-type", ""))
+    results: List[Optional[BatchItemResult]] = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        try:
+            request = MemoryCreateRequest.model_validate(item)
+        except ValidationError as e:
+            results[index] = BatchItemResult(index=index, status="invalid", error=_validation_message(e))
+            continue
+        valid.append((index, {"content": request.content, "metadata": request.metadata}))
+    
+    try:
+        outcomes = await memory_service.add_memories([item for _, item in valid], user_id=current_user)
+    except AppException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"批量添加记忆失败: {str(e)}")
+    for (index, _), outcome in zip(valid, outcomes):
+        results[index] = BatchItemResult(index=index, **outcome)
+    
+    succeeded = sum(1 for result in results if result.status == "created")
+    return BatchCreateResponse(
+        total=len(results),
+        succeeded=succeeded,
+        failed=len(results) - succeeded,
+        results=results
+    )
+
+def _search_response(results: list, query: str, limit: int, current_user: str) -> SearchResponse:
+    """把后端搜索结果转换为SearchResponse"""
+    memory_responses = []
+    for item in results:
+        memory_responses.append(MemoryResponse(
+            id=item.get("id", ""),
+            content=item.get("memory", ""),
+            user_id=current_user,
+            metadata=item.get("metadata", {}),
+            categories=item.get("categories") or [],
+            created_at=item.get("created_at"),
+            updated_at=item.get("updated_at"),
+            score=item.get("score"),
+            scores=item.get("scores")
+        ))
+    
+    return SearchResponse(
+        results=memory_responses,
+        total=len(memory_responses),
+        query=query,
+        limit=limit
+    )
+
 @router.get("/memories/search", response_model=SearchResponse, summary="搜索记忆")
 async def search_memories(
     q: str = Query(..., description="搜索查询", min_length=1),
     limit: int = Query(default=10, description="结果数量限制", ge=1, le=100),
+    mode: SearchMode = Query(default=SearchMode.DEFAULT, description="检索模式"),
+    fusion: FusionMethod = Query(default=FusionMethod.RRF, description="混合检索融合方式"),
     current_user: str = Depends(get_current_user),
     memory_service = Depends(get_memory_service)
 ):
@@ -48,56 +164,78 @@ async def search_memories(
     
     - **q**: 搜索查询关键词
     - **limit**: 返回结果数量（1-100）
+    - **mode**: 检索模式 default | keyword | vector | hybrid
+    - **fusion**: 混合检索融合方式 rrf | weighted
     """
     try:
         results = await memory_service.search_memories(
             query=q,
             user_id=current_user,
-            limit=limit
+            limit=limit,
+            mode=mode.value,
+            fusion=fusion.value
         )
-        
-        # 转换结果格式
-        memory_responses = []
-        for item in results:
-            memory_responses.append(MemoryResponse(
-                id=item.get("id", ""),
-                content=item.get("memory", ""),
-                user_id=current_user,
-                metadata=item.get("metadata", {}),
-                created_at=item.get("created_at"),
-                updated_at=item.get("updated_at")
-            ))
-        
-        return SearchResponse(
-            results=memory_responses,
-            total=len(memory_responses),
-            query=q
+        return _search_response(results, q, limit, current_user)
+    except AppException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"搜索失败: {str(e)}")
+
+@router.post("/memories/search", response_model=SearchResponse, summary="带过滤条件搜索记忆")
+async def search_memories_with_filters(
+    request: SearchRequest,
+    current_user: str = Depends(get_current_user),
+    memory_service = Depends(get_memory_service)
+):
+    """
+    搜索用户记忆，支持分类与元数据过滤
+    
+    - **query**: 搜索查询
+    - **limit**: 返回结果数量（1-100）
+    - **categories**: 分类过滤，命中任一分类即可
+    - **metadata_filter**: 元数据过滤，所有键值都需匹配
+    - **mode** / **fusion**: 检索模式与混合检索融合方式
+    """
+    limit = request.limit or 10
+    try:
+        results = await memory_service.search_memories(
+            query=request.query,
+            user_id=current_user,
+            limit=limit,
+            mode=request.mode.value,
+            fusion=request.fusion.value,
+            categories=request.categories,
+            metadata_filter=request.metadata_filter
         )
+        return _search_response(results, request.query, limit, current_user)
+    except AppException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"搜索失败: {str(e)}")
 
 @router.get("/memories", response_model=MemoryListResponse, summary="获取用户所有记忆")
 async def get_user_memories(
     limit: int = Query(default=50, description="结果数量限制", ge=1, le=200),
-    offset: int = Query(default=0, description="偏移量", ge=0),
+    cursor: Optional[str] = Query(default=None, description="分页游标（上一页返回的next_cursor）"),
     current_user: str = Depends(get_current_user),
     memory_service = Depends(get_memory_service)
 ):
     """
-    获取当前用户的所有记忆列表
+    游标分页获取当前用户的记忆列表
     
     - **limit**: 返回记忆数量（1-200）
-    - **offset**: 分页偏移量
+    - **cursor**: 分页游标，首页不传；后续页传入上一页的next_cursor
     """
     try:
-        all_memories = await memory_service.get_all_memories(user_id=current_user)
-        
-        # 简单分页处理
-        paginated_memories = all_memories[offset:offset + limit]
+        page = await memory_service.list_memories(
+            user_id=current_user,
+            limit=limit,
+            cursor=cursor
+        )
         
         # 转换格式
         memory_responses = []
-        for item in paginated_memories:
+        for item in page["results"]:
             memory_responses.append(MemoryResponse(
                 id=item.get("id", ""),
                 content=item.get("memory", ""),
@@ -109,12 +247,118 @@ async def get_user_memories(
         
         return MemoryListResponse(
             memories=memory_responses,
-            total=len(all_memories),
-            user_id=current_user
+            total=page["total"],
+            user_id=current_user,
+            limit=limit,
+            has_more=page["has_more"],
+            next_cursor=page["next_cursor"]
         )
+    except AppException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取记忆列表失败: {str(e)}")
 
+def _export_record(memory: dict) -> dict:
+    """导出行格式，content/metadata可直接作为MemoryCreateRequest重新导入"""
+    return {
+        "id": memory.get("id"),
+        "content": memory.get("memory", ""),
+        "metadata": memory.get("metadata") or {},
+        "categories": memory.get("categories") or [],
+        "created_at": memory.get("created_at"),
+        "updated_at": memory.get("updated_at")
+    }
+
+@router.get("/memories/export", summary="导出用户全部记忆（NDJSON）")
+async def export_memories(
+    gzip: bool = Query(default=False, description="是否gzip压缩"),
+    current_user: str = Depends(get_current_user),
+    memory_service = Depends(get_memory_service)
+):
+    """
+    以NDJSON流式导出当前用户的全部记忆，每行一条
+    
+    - 逐页向后端拉取，边取边写，不在内存中保留完整列表
+    - **gzip**: 为true时返回gzip压缩的memories.ndjson.gz
+    """
+    page_size = settings.memory_export_page_size
+    try:
+        # 先取首页，后端错误在发送响应头之前就能以正常的错误码返回
+        first_page = await memory_service.list_memories(user_id=current_user, limit=page_size, use_cache=False)
+    except AppException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"导出记忆失败: {str(e)}")
+
+    async def lines():
+        try:
+            async for memory in memory_service.iter_memories(current_user, page_size, first_page):
+                yield dumps_line(_export_record(memory))
+        except Exception as e:
+            # 响应已开始发送，只能中断连接，由客户端感知不完整的导出
+            logging.error(f"Export aborted for user {current_user}: {e}")
+            raise
+
+    if gzip:
+        return StreamingResponse(
+            gzip_stream(lines()),
+            media_type="application/gzip",
+            headers={"Content-Disposition": 'attachment; filename="memories.ndjson.gz"'}
+        )
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="memories.ndjson"'}
+    )
+
+@router.post("/memories/import", response_model=ImportResponse, summary="流式导入记忆（NDJSON）")
+async def import_memories(
+    http_request: Request,
+    import_id: str = Query(..., description="导入任务ID，中断后用同一ID重新提交同一文件即可续传",
+                           min_length=1, max_length=200),
+    current_user: str = Depends(get_current_user),
+    memory_service = Depends(get_memory_service),
+    import_service = Depends(get_import_service)
+):
+    """
+    从请求体流式读取NDJSON并写入记忆，每行一个MemoryCreateRequest
+    
+    - 边读边写，同时在途的写入批次有上限，超过时暂停读取请求体
+    - 每批完成后记录检查点，重新提交时跳过检查点及之前的行
+    - 后端不可用时返回503，稍后用同一import_id续传
+    """
+    try:
+        summary = await import_service.import_ndjson(
+            memory_service, current_user, import_id, http_request.stream()
+        )
+    except ValueError as e:
+        raise ValidationException(detail=f"请求体解析失败: {e}", field="body")
+    return ImportResponse(**summary)
+
+@router.get("/memories/import/{import_id}", response_model=ImportResponse, summary="查询导入检查点")
+async def get_import_checkpoint(
+    import_id: str,
+    current_user: str = Depends(get_current_user),
+    import_service = Depends(get_import_service)
+):
+    """查询导入任务的检查点，续传前可用来确认进度"""
+    checkpoint = await import_service.get_checkpoint(current_user, import_id)
+    if checkpoint is None:
+        raise NotFoundException(detail="导入任务不存在", resource_type="import")
+    return ImportResponse(import_id=import_id, **checkpoint)
+
+@router.get("/memories/writes/{write_id}", response_model=WriteStatusResponse, summary="查询后写状态")
+async def get_write_status(
+    write_id: str,
+    current_user: str = Depends(get_current_user),
+    write_queue = Depends(get_write_queue)
+):
+    """查询异步写入模式下提交的记忆是否已写入后端"""
+    record = await write_queue.status(write_id, current_user)
+    if record is None:
+        raise NotFoundException(detail="写入记录不存在", resource_type="write")
+    return WriteStatusResponse(**record)
+
 @router.put("/memories/{memory_id}", response_model=StandardResponse, summary="更新记忆")
 async def update_memory(
     memory_id: str,
@@ -131,14 +375,20 @@ async def update_memory(
     try:
         result = await memory_service.update_memory(
             memory_id=memory_id,
-            data=request.content
+            data=request.content,
+            user_id=current_user
         )
+        # 各后端以{"error": ...}（NOT_FOUND）表示记忆不存在或不属于当前用户
+        if isinstance(result, dict) and "error" in result:
+            raise NotFoundException(detail="记忆不存在", resource_type="memory")
         
         return StandardResponse(
             success=True,
             message="记忆更新成功",
             data={"memory_id": memory_id}
         )
+    except AppException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"更新记忆失败: {str(e)}")
 
@@ -154,12 +404,56 @@ async def delete_memory(
     - **memory_id**: 要删除的记忆ID
     """
     try:
-        result = await memory_service.delete_memory(memory_id=memory_id)
+        result = await memory_service.delete_memory(memory_id=memory_id, user_id=current_user)
+        # 各后端以{"error": ...}（NOT_FOUND）表示记忆不存在或不属于当前用户
+        if isinstance(result, dict) and "error" in result:
+            raise NotFoundException(detail="记忆不存在", resource_type="memory")
         
         return StandardResponse(
             success=True,
             message="记忆删除成功",
             data={"memory_id": memory_id}
         )
+    except AppException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"删除记忆失败: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"删除记忆失败: {str(e)}") 
+
+@router.get("/memories/{memory_id}/summary/stream", summary="流式生成记忆摘要")
+async def stream_memory_summary(
+    memory_id: str,
+    current_user: str = Depends(get_current_user),
+    memory_service = Depends(get_memory_service),
+    llm_service = Depends(get_llm_service)
+):
+    """
+    以Server-Sent Events流式返回记忆摘要，首个token生成后立即推送
+    
+    - 增量事件: `data: {"delta": "..."}`
+    - 结束事件: `event: done`，data中包含完整摘要
+    - 出错事件: `event: error`
+    """
+    try:
+        memory = await memory_service.get_memory(memory_id=memory_id)
+    except AppException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取记忆失败: {str(e)}")
+    if not memory or memory.get("user_id") != current_user:
+        raise NotFoundException(detail="记忆不存在", resource_type="memory")
+
+    async def events():
+        parts = []
+        try:
+            async for delta in llm_service.stream_summary(memory.get("memory", "")):
+                parts.append(delta)
+                yield _sse_event({"delta": delta})
+            yield _sse_event({"summary": "".join(parts)}, event="done")
+        except Exception:
+            yield _sse_event({"message": "摘要生成失败"}, event="error")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
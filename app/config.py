@@ -8,11 +8,122 @@ class Settings(BaseSettings):
     
     # mem0配置
     mem0_api_key: str
+    # mem0同步SDK调用的线程池：并发线程数、排队深度、单次调用超时（秒）
+    mem0_max_workers: int = 8
+    mem0_max_queue: int = 64
+    mem0_call_timeout: float = 30.0
+    # 记忆后端: mem0 (同步SDK + 线程池) | mem0_http (原生异步HTTP客户端) | local_vector (本地NumPy向量检索)
+    # | sqlite (本地持久化，SQLite WAL + FTS5) | log (本地日志结构存储，追加写 + mmap读)
+    memory_backend: str = "mem0"
+    mem0_base_url: str = "https://api.mem0.ai"
+    mem0_http2: bool = True
+    mem0_max_connections: int = 100
+    mem0_max_keepalive_connections: int = 20
+    mem0_keepalive_expiry: float = 30.0
+    # SQLite本地后端：数据库文件路径、写锁等待超时（秒）
+    memory_sqlite_path: str = "data/memories.db"
+    memory_sqlite_busy_timeout: float = 5.0
+    # 日志结构本地后端：段文件目录、单段大小上限（字节）、后台整理间隔（秒，0关闭）、
+    # 触发整理的垃圾比例、每条记录写入后是否fsync
+    memory_log_dir: str = "data/memory_log"
+    memory_log_segment_max_bytes: int = 64 * 1024 * 1024
+    memory_log_compact_interval: float = 300.0
+    memory_log_compact_garbage_ratio: float = 0.5
+    memory_log_fsync: bool = False
+    # 本地向量检索：向量维度、索引模式(exact | ivf)、启用IVF的向量数阈值、每次检索扫描的簇数
+    vector_dim: int = 256
+    vector_index_mode: str = "exact"
+    vector_ivf_min_vectors: int = 10000
+    vector_ivf_nprobe: int = 8
+    # 向量化：提供方(hashing)、内存缓存条目上限、可选的SQLite磁盘缓存路径（空表示不落盘）
+    embedding_provider: str = "hashing"
+    embedding_cache_enabled: bool = True
+    embedding_cache_max_entries: int = 50000
+    embedding_cache_sqlite_path: str = ""
+    embedding_cache_sqlite_max_entries: int = 1000000
+    # 记忆列表缓存：缓存用户数上限、单用户完整列表上限、TTL（秒，兜底多进程部署下的过期）
+    memory_list_cache_enabled: bool = True
+    memory_list_cache_max_users: int = 1000
+    memory_list_cache_max_user_memories: int = 5000
+    memory_list_cache_ttl: float = 60.0
+    # 搜索结果缓存：条目上限、TTL（秒）
+    search_cache_enabled: bool = True
+    search_cache_max_entries: int = 10000
+    search_cache_ttl: float = 30.0
+    # 合并并发的相同读请求（get_all/search），同一时刻只向后端发起一次
+    memory_singleflight_enabled: bool = True
+    # 批量写入：单次请求条目上限、并发写入数
+    memory_batch_max_items: int = 5000
+    memory_batch_concurrency: int = 8
+    # 导出：每次向后端拉取的记忆条数
+    memory_export_page_size: int = 200
+    # 导入：每批条数、同时在途的批次数、单行字节上限、检查点存储（SQLite路径为空时只保存在进程内）与保留时间（秒）
+    memory_import_batch_size: int = 100
+    memory_import_max_in_flight: int = 4
+    memory_import_max_line_bytes: int = 1 << 20
+    memory_import_checkpoint_path: str = ""
+    memory_import_checkpoint_ttl: float = 7 * 24 * 3600
+    # 写入模式: sync (请求内写入后端) | async (先写本地日志并立即返回write_id，后台批量写入后端)
+    memory_write_mode: str = "sync"
+    # 后写日志：SQLite路径、组提交等待时间（毫秒）与单次组提交条目上限
+    memory_write_journal_path: str = "data/write_journal.db"
+    memory_write_group_commit_ms: float = 5.0
+    memory_write_group_max_items: int = 256
+    # 后台写入：每批条目数、最多尝试次数、重试退避基数（秒）、已完成条目的保留时间（秒）
+    memory_write_batch_size: int = 100
+    memory_write_max_attempts: int = 5
+    memory_write_retry_backoff: float = 2.0
+    memory_write_retention: float = 24 * 3600
+    # 认领条目的租约（秒）：认领后超过该时间仍未标记结果，条目可被其他写入任务重新认领
+    memory_write_lease: float = 300.0
+    # 混合检索：RRF常数k、各来源权重；后端不支持过滤下推时，带过滤条件的候选倍数
+    search_rrf_k: int = 60
+    search_keyword_weight: float = 1.0
+    search_vector_weight: float = 1.0
+    search_filter_candidate_multiplier: int = 5
     
     # Supabase Auth配置 (仅用于认证)
     supabase_url: str = ""
     supabase_key: str = ""
+    # Supabase同步SDK调用的线程池：并发线程数、排队深度、单次调用超时（秒）
+    auth_max_workers: int = 4
+    auth_max_queue: int = 64
+    auth_call_timeout: float = 10.0
+    # token验证缓存：条目上限、有效token最长缓存时间（同时不超过JWT exp）、无效token负缓存时间（秒）
+    auth_token_cache_enabled: bool = True
+    auth_token_cache_max_entries: int = 10000
+    auth_token_cache_max_ttl: float = 300.0
+    auth_token_cache_negative_ttl: float = 30.0
+    # 本地JWT验证：HS256使用项目JWT secret；RS/ES使用JWKS（为空时按supabase_url推导），定期后台刷新（秒）
+    auth_local_verification: bool = True
+    supabase_jwt_secret: str = ""
+    supabase_jwt_audience: str = "authenticated"
+    supabase_jwks_url: str = ""
+    supabase_jwks_refresh_interval: float = 600.0
     
+    # OpenRouter LLM配置
+    openrouter_api_key: str = ""
+    preferred_model: str = "claude-3-opus-20240229"
+    llm_base_url: str = "https://openrouter.ai/api/v1"
+    # LLM共享连接池：连接数上限、超时（秒）、429/5xx重试次数与退避基数（秒）
+    llm_max_connections: int = 20
+    llm_max_keepalive_connections: int = 10
+    llm_connect_timeout: float = 5.0
+    llm_read_timeout: float = 60.0
+    llm_max_retries: int = 3
+    llm_retry_backoff: float = 0.5
+    # LLM结果缓存：内存LRU条目数、TTL（秒）；sqlite路径为空时不启用磁盘层
+    llm_cache_enabled: bool = True
+    llm_cache_max_entries: int = 10000
+    llm_cache_ttl: float = 7 * 24 * 3600
+    llm_cache_sqlite_path: str = ""
+    llm_cache_sqlite_max_entries: int = 200000
+    # 批量富化：单批token预算、单批条目上限、并发批次数、攒批等待时间（毫秒）
+    enrichment_batch_max_tokens: int = 3000
+    enrichment_batch_max_items: int = 20
+    enrichment_max_concurrency: int = 4
+    enrichment_linger_ms: float = 20.0
+
     # OpenAI配置
     openai_api_key: str = ""
     log_level: str = "INFO"
@@ -3,6 +3,14 @@ from fastapi.middleware.cors import CORSMiddleware
 
 # Import routers
 from app.api import auth, memories
+from app.services.memory_service import get_memory_service
+from app.services.llm_service import get_llm_service
+from app.services.embedding_service import close_embedding_service
+from app.services.enrichment_queue import get_enrichment_queue
+from app.services.auth_service import get_auth_service
+from app.services.write_queue import get_write_queue
+from app.services.import_service import get_import_service
+from app.config import settings
 
 # Import exception handlers and logging
 from app.utils.exception_handlers import setup_exception_handlers
@@ -47,6 +55,11 @@ async def health_check():
 async def startup_event():
     """应用启动事件"""
     logger.info("🚀 re-call.ai API starting up...")
+    await get_memory_service().startup()
+    await get_llm_service().startup()
+    await get_auth_service().startup()
+    if settings.memory_write_mode == "async":
+        get_write_queue().start(get_memory_service())
     logger.info("📝 Exception handlers configured")
     logger.info("🔒 CORS middleware enabled")
     logger.info("✅ Application ready to serve requests")
@@ -55,4 +68,13 @@ async def startup_event():
 async def shutdown_event():
     """应用关闭事件"""
     logger.info("🛑 re-call.ai API shutting down...")
+    # 先停止后写任务，再关闭它依赖的记忆服务
+    await get_write_queue().close()
+    await get_memory_service().shutdown()
+    # 向量后端关闭后再关闭它使用的向量缓存
+    close_embedding_service()
+    await get_enrichment_queue().close()
+    await get_import_service().close()
+    await get_llm_service().shutdown()
+    await get_auth_service().shutdown()
     logger.info("✅ Shutdown complete")
@@ -11,6 +11,18 @@ class MemoryCategory(str, Enum):
     STUDY = "study"
     PROJECT = "project"
 
+class SearchMode(str, Enum):
+    """检索模式枚举"""
+    DEFAULT = "default"
+    KEYWORD = "keyword"
+    VECTOR = "vector"
+    HYBRID = "hybrid"
+
+class FusionMethod(str, Enum):
+    """混合检索融合方式枚举"""
+    RRF = "rrf"
+    WEIGHTED = "weighted"
+
 class MemoryCreateRequest(BaseModel):
     """创建记忆请求模型"""
     content: str = Field(
@@ -108,6 +120,7 @@ class MemoryResponse(BaseModel):
     internal_metadata: Optional[Dict[str, Any]] = Field(None, description="内部元数据")
     deleted_at: Optional[str] = Field(None, description="删除时间")
     score: Optional[float] = Field(None, description="相关性评分 (搜索时返回)")
+    scores: Optional[Dict[str, float]] = Field(None, description="混合检索时各来源的原始评分")
 
     @validator('memory', pre=True)
     def handle_memory_alias(cls, v, values):
@@ -157,6 +170,14 @@ class SearchRequest(BaseModel):
         description="元数据过滤条件",
         example={"importance": "high"}
     )
+    mode: SearchMode = Field(
+        default=SearchMode.DEFAULT,
+        description="检索模式：default | keyword | vector | hybrid"
+    )
+    fusion: FusionMethod = Field(
+        default=FusionMethod.RRF,
+        description="混合检索融合方式：rrf（倒数排名融合）| weighted（归一化加权）"
+    )
     
     @validator('query')
     def validate_query(cls, v):
@@ -178,7 +199,9 @@ class SearchRequest(BaseModel):
                 "query": "FastAPI学习",
                 "limit": 10,
                 "categories": ["study"],
-                "metadata_filter": {"importance": "high"}
+                "metadata_filter": {"importance": "high"},
+                "mode": "hybrid",
+                "fusion": "rrf"
             }
         }
     }
@@ -219,11 +242,10 @@ class MemoryListRequest(BaseModel):
         le=200,
         example=50
     )
-    offset: Optional[int] = Field(
-        default=0,
-        description="分页偏移量",
-        ge=0,
-        example=0
+    cursor: Optional[str] = Field(
+        default=None,
+        description="分页游标（上一页返回的next_cursor）",
+        example=None
     )
     
     @validator('limit')
@@ -236,11 +258,11 @@ class MemoryListRequest(BaseModel):
 class MemoryListResponse(BaseModel):
     """记忆列表响应模型"""
     memories: List[MemoryResponse] = Field(..., description="记忆列表")
-    total: int = Field(..., description="用户总记忆数量")
+    total: Optional[int] = Field(None, description="用户总记忆数量（后端不提供时为空）")
     user_id: str = Field(..., description="用户ID")
     limit: int = Field(..., description="请求的结果数量限制")
-    offset: int = Field(..., description="分页偏移量")
     has_more: bool = Field(..., description="是否还有更多数据")
+    next_cursor: Optional[str] = Field(None, description="下一页游标，没有更多数据时为空")
     
     model_config = {
         "json_schema_extra": {
@@ -249,8 +271,82 @@ class MemoryListResponse(BaseModel):
                 "total": 100,
                 "user_id": "user123",
                 "limit": 50,
-                "offset": 0,
-                "has_more": True
+                "has_more": True,
+                "next_cursor": "eyJwIjo0OX0"
+            }
+        }
+    }
+
+class BatchItemResult(BaseModel):
+    """批量写入的单条结果"""
+    index: int = Field(..., description="条目在请求中的位置（从0开始）")
+    status: str = Field(..., description="created | invalid | error")
+    memory_id: Optional[str] = Field(None, description="创建成功时的记忆ID")
+    error: Optional[str] = Field(None, description="失败原因")
+
+class BatchCreateResponse(BaseModel):
+    """批量写入响应模型"""
+    total: int = Field(..., description="请求条目数")
+    succeeded: int = Field(..., description="创建成功的条目数")
+    failed: int = Field(..., description="校验失败或写入失败的条目数")
+    results: List[BatchItemResult] = Field(..., description="逐条结果，与请求顺序一致")
+    
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "total": 2,
+                "succeeded": 1,
+                "failed": 1,
+                "results": [
+                    {"index": 0, "status": "created", "memory_id": "59bcc066-d304-4259-8a26-60da89bf9243"},
+                    {"index": 1, "status": "invalid", "error": "content: 记忆内容不能为空"}
+                ]
+            }
+        }
+    }
+
+class ImportResponse(BaseModel):
+    """流式导入响应模型"""
+    import_id: str = Field(..., description="导入任务ID（续传时使用同一ID）")
+    line: int = Field(..., description="检查点：连续处理完成的最大行号")
+    resumed_from: int = Field(0, description="本次从哪一行之后开始处理")
+    lines: int = Field(0, description="本次请求体的总行数")
+    created: int = Field(..., description="累计创建的记忆数")
+    invalid: int = Field(..., description="累计校验失败的行数")
+    failed: int = Field(..., description="累计写入失败的行数")
+    errors: List[Dict[str, Any]] = Field(default_factory=list, description="本次的逐行错误（最多100条）")
+    
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "import_id": "notes-2024-12-01",
+                "line": 3,
+                "resumed_from": 0,
+                "lines": 3,
+                "created": 2,
+                "invalid": 1,
+                "failed": 0,
+                "errors": [{"line": 2, "error": "Invalid JSON"}]
+            }
+        }
+    }
+
+class WriteStatusResponse(BaseModel):
+    """后写模式下的写入状态"""
+    write_id: str = Field(..., description="提交时返回的写入ID")
+    status: str = Field(..., description="pending（等待写入）| committed（已写入）| failed（重试用尽）")
+    memory_id: Optional[str] = Field(None, description="写入成功后的记忆ID")
+    error: Optional[str] = Field(None, description="最近一次写入失败的原因")
+    attempts: int = Field(0, description="已尝试写入的次数")
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "write_id": "5f0c6d1e-8a41-4a53-9a3e-2b7f4f0e9c11",
+                "status": "committed",
+                "memory_id": "mem_123456",
+                "error": None,
+                "attempts": 1
             }
         }
     }
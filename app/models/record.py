@@ -12,3 +12,9 @@ class Record(BaseModel):
     user_id: str
     created_at: datetime
     updated_at: datetime
+
+class RecordEnrichment(BaseModel):
+    """LLM生成的记录摘要、关键词和标签，字段与Record一致"""
+    summary: Optional[str] = None
+    keywords: List[str] = []
+    tags: List[str] = []
@@ -1,12 +1,114 @@
 from supabase import create_client
 from app.config import settings
+from app.services.jwt_verifier import JWTVerifier, UnknownKeyError
+from app.utils.cache import LRUCache
+from app.utils.exceptions import AppException
+from app.utils.executor import BlockingExecutor
+import base64
+import hashlib
+import json
 import logging
+import time
+from typing import Optional
+import jwt
+
+# Supabase判定token无效时返回的状态码，这类结果可以做负缓存
+INVALID_TOKEN_STATUSES = (400, 401, 403, 404)
+
+
+def response_field(obj, name):
+    """兼容Supabase SDK的响应对象与字典"""
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def user_id_from_response(response) -> Optional[str]:
+    """从get_user/sign_in等响应中取出用户ID"""
+    return response_field(response_field(response, "user"), "id")
+
+
+def token_expiry(token: str) -> Optional[float]:
+    """读取JWT的exp（不校验签名，只用于确定缓存时长）"""
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return float(claims["exp"])
+    except (IndexError, ValueError, KeyError, TypeError):
+        return None
+
+
+class TokenVerificationCache:
+    """已验证token的缓存，键为token的sha256（不在内存中保存原始token）
+
+    - 有效token缓存到JWT的exp，且不超过max_ttl（兜底吊销后的生效时间）
+    - 无效token做短时间负缓存，挡住重复的无效请求
+    """
+
+    def __init__(self, max_size: int = 10000, max_ttl: float = 300.0, negative_ttl: float = 30.0):
+        self.max_ttl = max_ttl
+        self.negative_ttl = negative_ttl
+        self._entries = LRUCache(max_size=max_size)
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str) -> Optional[dict]:
+        """命中时返回{"user_id": str或None}，None表示已知无效"""
+        return self._entries.get(self._key(token))
+
+    def set_valid(self, token: str, user_id: str, expires_at: Optional[float] = None) -> None:
+        ttl = self.max_ttl
+        if expires_at is not None:
+            ttl = min(ttl, expires_at - time.time())
+        if ttl > 0:
+            self._entries.set(self._key(token), {"user_id": user_id}, ttl=ttl)
+
+    def set_invalid(self, token: str) -> None:
+        if self.negative_ttl > 0:
+            self._entries.set(self._key(token), {"user_id": None}, ttl=self.negative_ttl)
+
+    def stats(self) -> dict:
+        return self._entries.stats()
+
+
+def create_token_cache() -> Optional[TokenVerificationCache]:
+    """根据配置创建token验证缓存"""
+    if not settings.auth_token_cache_enabled:
+        return None
+    return TokenVerificationCache(
+        max_size=settings.auth_token_cache_max_entries,
+        max_ttl=settings.auth_token_cache_max_ttl,
+        negative_ttl=settings.auth_token_cache_negative_ttl
+    )
+
+
+def create_jwt_verifier() -> Optional[JWTVerifier]:
+    """根据配置创建本地JWT验证器；未配置secret且无法确定JWKS地址时返回None"""
+    if not settings.auth_local_verification:
+        return None
+    jwks_url = settings.supabase_jwks_url
+    if not jwks_url and settings.supabase_url.startswith("https://"):
+        jwks_url = f"{settings.supabase_url.rstrip('/')}/auth/v1/.well-known/jwks.json"
+    if not settings.supabase_jwt_secret and not jwks_url:
+        return None
+    return JWTVerifier(
+        secret=settings.supabase_jwt_secret,
+        jwks_url=jwks_url,
+        audience=settings.supabase_jwt_audience or None,
+        refresh_interval=settings.supabase_jwks_refresh_interval
+    )
+
 
 class AuthService:
-    def __init__(self):
+    def __init__(self, token_cache: Optional[TokenVerificationCache] = None,
+                 verifier: Optional[JWTVerifier] = None):
         # 检查是否有有效的Supabase配置
-        if (settings.supabase_url and 
-            settings.supabase_key and 
+        if (settings.supabase_url and
+            settings.supabase_key and
             settings.supabase_url.startswith("https://") and
             not settings.supabase_url.endswith(".supabase.co") == False):
             try:
@@ -18,14 +120,24 @@ class AuthService:
         else:
             self.client = None
             logging.warning("Supabase Auth not configured - using demo mode")
+        self.token_cache = token_cache if token_cache is not None else create_token_cache()
+        # 本地验证签名，只有kid未知时才请求Supabase
+        self.verifier = verifier if verifier is not None else (create_jwt_verifier() if self.client else None)
+        # Supabase SDK是同步的，调用放到有界线程池执行
+        self.executor = BlockingExecutor(
+            max_workers=settings.auth_max_workers,
+            max_queue=settings.auth_max_queue,
+            timeout=settings.auth_call_timeout,
+            name="supabase-auth"
+        )
 
     async def sign_up(self, email: str, password: str):
         """用户注册"""
         if not self.client:
             return {"user": {"id": f"demo-{email}"}, "session": None}
-            
+
         try:
-            response = self.client.auth.sign_up({
+            response = await self.executor.run(self.client.auth.sign_up, {
                 "email": email,
                 "password": password
             })
@@ -41,9 +153,9 @@ class AuthService:
                 "user": {"id": f"demo-{email}"},
                 "session": {"access_token": f"demo-token-{email}"}
             }
-            
+
         try:
-            response = self.client.auth.sign_in_with_password({
+            response = await self.executor.run(self.client.auth.sign_in_with_password, {
                 "email": email,
                 "password": password
             })
@@ -52,31 +164,68 @@ class AuthService:
             logging.error(f"Sign in error: {e}")
             raise
 
-    async def verify_token(self, token: str):
-        """验证token"""
+    async def _verify(self, token: str) -> Optional[str]:
+        """验证token并返回用户ID；token无效时返回None，网络等临时错误时抛出异常"""
+        if self.verifier is not None:
+            try:
+                return self.verifier.verify(token)["sub"]
+            except UnknownKeyError as e:
+                logging.info(f"Falling back to remote token verification: {e}")
+            except jwt.InvalidTokenError:
+                return None
         if not self.client:
             # Demo mode - 从token中提取用户ID
             if token.startswith("demo-token-"):
-                email = token.replace("demo-token-", "")
-                return {"user": {"id": f"demo-{email}"}}
+                return f"demo-{token.replace('demo-token-', '')}"
             return None
-            
         try:
-            response = self.client.auth.get_user(token)
-            return response
+            response = await self.executor.run(self.client.auth.get_user, token)
         except Exception as e:
+            if getattr(e, "status", None) in INVALID_TOKEN_STATUSES:
+                return None
+            raise
+        return user_id_from_response(response)
+
+    async def verify_token(self, token: str):
+        """验证token，返回{"user": {"id": ...}}，无效时返回None"""
+        user_id = await self.get_user_from_token(token)
+        return {"user": {"id": user_id}} if user_id else None
+
+    async def get_user_from_token(self, token: str):
+        """从token获取用户信息，结果按token缓存"""
+        if self.token_cache is not None:
+            cached = self.token_cache.get(token)
+            if cached is not None:
+                return cached["user_id"]
+        try:
+            user_id = await self._verify(token)
+        except AppException:
+            # 线程池饱和/超时，交给全局处理返回503/504
+            raise
+        except Exception as e:
+            # 临时错误不缓存，下次请求重试
             logging.error(f"Token verification error: {e}")
             return None
+        if self.token_cache is not None:
+            if user_id:
+                self.token_cache.set_valid(token, user_id, token_expiry(token))
+            else:
+                self.token_cache.set_invalid(token)
+        return user_id
 
-    async def get_user_from_token(self, token: str):
-        """从token获取用户信息"""
-        user_response = await self.verify_token(token)
-        if user_response and user_response.get("user"):
-            return user_response["user"]["id"]
-        return None
+    async def startup(self):
+        """应用启动时获取JWKS"""
+        if self.verifier is not None:
+            await self.verifier.start()
+
+    async def shutdown(self):
+        """停止JWKS刷新并释放线程池"""
+        if self.verifier is not None:
+            await self.verifier.close()
+        self.executor.shutdown()
 
 # 单例
 auth_service = AuthService()
 
 def get_auth_service():
-    return auth_service 
\ No newline at end of file
+    return auth_service
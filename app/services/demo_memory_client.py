@@ -0,0 +1,186 @@
+"""
+Demo模式的本地记忆客户端
+mem0 SDK不可用时使用，接口与mem0 MemoryClient保持一致
+
+存储按user_id分片：每个用户一个分片（记忆、分页顺序、倒排索引、二级索引和分片锁），
+另有记忆ID -> 用户的索引。列表/检索只访问该用户的分片，归属检查为O(1)，
+不同用户的读写互不阻塞。
+"""
+import bisect
+import itertools
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from app.services.hybrid_search import memory_categories
+from app.services.memory_records import NOT_FOUND, public_memory
+from app.services.search_index import BM25Index, FilterIndex
+from app.utils.exceptions import InvalidCursorException
+
+
+class UserShard:
+    """单个用户的存储，访问内部结构时需持有lock"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.memories: Dict[str, dict] = {}
+        # 按写入顺序排列的(序号, 记忆ID)，用于游标分页
+        self.order = []
+        self.search_index = BM25Index()
+        # 分类/元数据二级索引
+        self.filter_index = FilterIndex()
+
+
+class DemoMemoryClient:
+    # 检索方法接受categories/metadata_filter，在打分前过滤
+    supports_filters = True
+    # update/delete接受user_id，记忆不属于该用户时按不存在处理
+    enforces_ownership = True
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+        # 只在创建分片时加锁，分片内部由各自的锁保护
+        self._lock = threading.Lock()
+        self._shards: Dict[str, UserShard] = {}
+        # 记忆ID -> user_id，在所属分片的锁内增删（单键读写是原子的）
+        self._owners: Dict[str, str] = {}
+        self._seq = itertools.count()
+        logging.warning("Using demo MemoryClient - mem0 not available")
+
+    def _new_shard(self) -> UserShard:
+        return UserShard()
+
+    def _shard(self, user_id: str, create: bool = False) -> Optional[UserShard]:
+        shard = self._shards.get(user_id)
+        if shard is None and create:
+            with self._lock:
+                shard = self._shards.get(user_id)
+                if shard is None:
+                    shard = self._shards[user_id] = self._new_shard()
+        return shard
+
+    def _record(self, memory_id: str, user_id: Optional[str] = None) -> Tuple[Optional[UserShard], Optional[dict]]:
+        """按ID定位记忆所在分片和内部记录；指定user_id且不是所有者时返回(None, None)
+
+        返回的记录需在shard.lock内读写
+        """
+        owner = self._owners.get(memory_id)
+        if owner is None or (user_id is not None and owner != user_id):
+            return None, None
+        shard = self._shards.get(owner)
+        if shard is None:
+            return None, None
+        return shard, shard.memories.get(memory_id)
+
+    def add(self, messages, user_id, metadata=None):
+        seq = next(self._seq)
+        memory_id = f"demo-memory-{seq}"
+        content = messages[0]["content"] if messages else ""
+        now = datetime.now(timezone.utc).isoformat()
+        memory = {
+            "id": memory_id,
+            "memory": content,
+            "user_id": user_id,
+            "metadata": metadata or {},
+            "created_at": now,
+            "updated_at": now,
+            "_seq": seq
+        }
+        shard = self._shard(user_id, create=True)
+        with shard.lock:
+            shard.memories[memory_id] = memory
+            # 并发写入时序号可能乱序到达，按序插入保持分页顺序
+            bisect.insort(shard.order, (seq, memory_id))
+            shard.search_index.add(memory_id, content)
+            shard.filter_index.add(memory_id, memory_categories(memory), memory["metadata"])
+            self._owners[memory_id] = user_id
+        return {"id": memory_id}
+
+    def search(self, query, user_id, limit=10, categories=None, metadata_filter=None):
+        return self.keyword_search(query, user_id, limit=limit, categories=categories,
+                                   metadata_filter=metadata_filter)
+
+    def keyword_search(self, query, user_id, limit=10, categories=None, metadata_filter=None):
+        """BM25检索，结果带score"""
+        shard = self._shard(user_id)
+        if shard is None:
+            return []
+        with shard.lock:
+            candidates = self._filter_candidates(shard, categories, metadata_filter)
+            if candidates is not None and not candidates:
+                return []
+            return [dict(public_memory(shard.memories[memory_id]), score=round(score, 6))
+                    for memory_id, score in shard.search_index.search(query, limit=limit, candidates=candidates)]
+
+    @staticmethod
+    def _filter_candidates(shard: UserShard, categories, metadata_filter):
+        """由二级索引求出满足过滤条件的记忆ID，没有过滤条件时返回None"""
+        if not categories and not metadata_filter:
+            return None
+        return shard.filter_index.candidates(categories, metadata_filter)
+
+    def get_all(self, user_id):
+        shard = self._shard(user_id)
+        if shard is None:
+            return []
+        with shard.lock:
+            return [public_memory(shard.memories[memory_id]) for _, memory_id in shard.order]
+
+    def list(self, user_id, limit=50, cursor=None):
+        """按写入顺序分页，cursor为上一页最后一条的序号"""
+        if cursor is not None and (not isinstance(cursor, int) or isinstance(cursor, bool)):
+            raise InvalidCursorException()
+        shard = self._shard(user_id)
+        if shard is None:
+            return {"results": [], "next_cursor": None, "total": 0}
+        with shard.lock:
+            order = shard.order
+            start = 0 if cursor is None else bisect.bisect_right(order, cursor, key=lambda item: item[0])
+            page = order[start:start + limit]
+            has_more = start + limit < len(order)
+            return {
+                "results": [public_memory(shard.memories[memory_id]) for _, memory_id in page],
+                "next_cursor": page[-1][0] if page and has_more else None,
+                "total": len(order)
+            }
+
+    def get(self, memory_id):
+        shard, _ = self._record(memory_id)
+        if shard is None:
+            return None
+        with shard.lock:
+            memory = shard.memories.get(memory_id)
+            return public_memory(memory) if memory else None
+
+    def update(self, memory_id, data, user_id=None):
+        shard, _ = self._record(memory_id, user_id)
+        if shard is None:
+            return NOT_FOUND
+        with shard.lock:
+            memory = shard.memories.get(memory_id)
+            if memory is None:
+                return NOT_FOUND
+            memory["memory"] = data
+            memory["updated_at"] = datetime.now(timezone.utc).isoformat()
+            shard.search_index.add(memory_id, data)
+            return {"id": memory_id}
+
+    def delete(self, memory_id, user_id=None):
+        shard, _ = self._record(memory_id, user_id)
+        if shard is None:
+            return NOT_FOUND
+        with shard.lock:
+            memory = shard.memories.pop(memory_id, None)
+            if memory is None:
+                return NOT_FOUND
+            position = bisect.bisect_left(shard.order, (memory["_seq"], memory_id))
+            del shard.order[position]
+            shard.search_index.remove(memory_id)
+            shard.filter_index.remove(memory_id)
+            self._owners.pop(memory_id, None)
+            self._on_delete(shard, memory)
+            return {"deleted": True}
+
+    def _on_delete(self, shard: UserShard, memory: dict) -> None:
+        """删除记忆时的扩展点，在shard.lock内调用"""
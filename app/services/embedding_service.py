@@ -0,0 +1,172 @@
+"""
+向量化服务
+- EmbeddingProvider: 向量化提供方接口，按批编码文本
+- HashingEmbeddingProvider: 确定性的哈希n-gram向量，纯CPU、无需模型，可离线运行和用于测试
+- EmbeddingService: 在提供方前加一层按内容哈希的向量缓存（内存LRU + 可选SQLite磁盘层）
+
+numpy为可选依赖，只有启用本地向量后端时才需要安装。
+"""
+import base64
+import logging
+import zlib
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # 可选依赖
+    np = None
+
+from app.config import settings
+from app.services.search_index import tokenize
+from app.utils.cache import LRUCache, SQLiteCache, TieredCache, content_hash, normalize_text
+
+
+def require_numpy():
+    """numpy为可选依赖，本地向量化和向量后端在使用前调用"""
+    if np is None:
+        raise ImportError("numpy is required for local embeddings and the vector backend (pip install numpy)")
+
+
+def normalize_rows(vectors):
+    """按行L2归一化，零向量保持为零"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class EmbeddingProvider(ABC):
+    """向量化提供方接口
+
+    name参与缓存键，模型或算法变化时必须随之变化，避免命中旧向量。
+    """
+
+    name: str = ""
+    dim: int = 0
+
+    @abstractmethod
+    def embed_batch(self, texts: List[str]):
+        """返回形状为(len(texts), dim)的float32矩阵，每行已归一化"""
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """哈希n-gram向量（hashing trick）
+
+    特征为检索词（中日韩二元组、其他文字按词）加上非中日韩词的字符n-gram，
+    用crc32哈希到dim维并带符号累加，使拼写相近的词也有相近的向量。
+    """
+
+    def __init__(self, dim: int = 256, ngram: int = 3, ngram_weight: float = 0.5):
+        require_numpy()
+        self.dim = dim
+        self.ngram = ngram
+        self.ngram_weight = ngram_weight
+        self.name = f"hashing-v1:{dim}:{ngram}"
+
+    def _features(self, text: str):
+        for token in tokenize(text):
+            yield token, 1.0
+            if len(token) > self.ngram and token.isascii():
+                padded = f"#{token}#"
+                for i in range(len(padded) - self.ngram + 1):
+                    yield padded[i:i + self.ngram], self.ngram_weight
+
+    def embed_batch(self, texts: List[str]):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                vectors[i, h % self.dim] += weight if h & 0x80000000 else -weight
+        return normalize_rows(vectors)
+
+
+def _encode_vector(vector) -> str:
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+
+
+def _decode_vector(value: str):
+    return np.frombuffer(base64.b64decode(value), dtype=np.float32)
+
+
+class EmbeddingService:
+    """按内容哈希缓存向量，未命中的文本合并为一次批量编码"""
+
+    def __init__(self, provider: Optional[EmbeddingProvider] = None, cache=None):
+        self.provider = provider or HashingEmbeddingProvider(dim=settings.vector_dim)
+        self.cache = cache
+
+    @property
+    def dim(self) -> int:
+        return self.provider.dim
+
+    def embed(self, text: str):
+        return self.embed_batch([text])[0]
+
+    def embed_batch(self, texts: List[str]):
+        """批量编码，结果顺序与texts一致；相同内容只编码一次"""
+        require_numpy()
+        result = np.zeros((len(texts), self.dim), dtype=np.float32)
+        # 规范化后的内容 -> 所在位置
+        pending = {}
+        for i, text in enumerate(texts):
+            key = content_hash(text, self.provider.name)
+            cached = self.cache.get(key) if self.cache is not None else None
+            if cached is not None:
+                result[i] = _decode_vector(cached)
+            else:
+                pending.setdefault(key, (normalize_text(text), []))[1].append(i)
+        if not pending:
+            return result
+        keys = list(pending)
+        vectors = self.provider.embed_batch([pending[key][0] for key in keys])
+        for key, vector in zip(keys, vectors):
+            result[pending[key][1]] = vector
+            if self.cache is not None:
+                self.cache.set(key, _encode_vector(vector))
+        return result
+
+    def stats(self) -> dict:
+        return self.cache.stats() if self.cache is not None else {}
+
+    def close(self) -> None:
+        """写回并关闭缓存的磁盘层"""
+        if self.cache is not None:
+            self.cache.close()
+
+
+def create_embedding_cache() -> Optional[TieredCache]:
+    """根据配置创建向量缓存"""
+    if not settings.embedding_cache_enabled:
+        return None
+    disk = None
+    if settings.embedding_cache_sqlite_path:
+        disk = SQLiteCache(
+            settings.embedding_cache_sqlite_path,
+            max_entries=settings.embedding_cache_sqlite_max_entries
+        )
+    return TieredCache(LRUCache(max_size=settings.embedding_cache_max_entries), disk)
+
+
+def create_embedding_provider() -> EmbeddingProvider:
+    """根据配置创建向量化提供方"""
+    if settings.embedding_provider != "hashing":
+        logging.warning(f"Unknown embedding_provider {settings.embedding_provider!r}, using hashing")
+    return HashingEmbeddingProvider(dim=settings.vector_dim)
+
+
+_embedding_service: Optional[EmbeddingService] = None
+
+
+def get_embedding_service() -> EmbeddingService:
+    """获取向量化服务实例（首次使用时创建，未安装numpy时不影响其他后端启动）"""
+    global _embedding_service
+    if _embedding_service is None:
+        _embedding_service = EmbeddingService(create_embedding_provider(), create_embedding_cache())
+    return _embedding_service
+
+
+def close_embedding_service() -> None:
+    """应用关闭时调用；服务从未创建时不做任何事"""
+    if _embedding_service is not None:
+        _embedding_service.close()
@@ -0,0 +1,127 @@
+"""
+批量LLM富化队列
+把并发提交的内容按token预算打包成多条目提示词（micro-batch），
+在信号量限制下并发执行，并把结果分发回每条内容的future
+"""
+import asyncio
+import logging
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.models.record import RecordEnrichment
+from app.services.llm_service import LLMService, get_llm_service
+from app.utils.cache import normalize_text
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数：中日韩字符约1字1 token，其余约4字符1 token"""
+    wide = sum(1 for ch in text if unicodedata.east_asian_width(ch) in ("W", "F"))
+    return wide + (len(text) - wide + 3) // 4 + 1
+
+
+class EnrichmentQueue:
+    """LLMService前的异步批处理队列
+
+    - 同一批次内容相同（规范化后）的请求共享一个结果
+    - 达到max_batch_tokens或max_batch_items时立即发出，否则最多等待linger秒
+    - 同时执行的批次数不超过max_concurrency
+    """
+
+    def __init__(self, llm: LLMService, max_batch_tokens: int = 3000, max_batch_items: int = 20,
+                 max_concurrency: int = 4, linger: float = 0.02):
+        self.llm = llm
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_items = max_batch_items
+        self.linger = linger
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._pending: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self._pending_tokens = 0
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+
+    async def enrich(self, content: str) -> RecordEnrichment:
+        """提交单条内容，等待所在批次完成"""
+        cached = await self.llm.get_cached_enrichment(content)
+        if cached is not None:
+            return cached
+
+        key = normalize_text(content)
+        entry = self._pending.get(key)
+        if entry is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[key] = (content, future)
+            self._pending_tokens += estimate_tokens(content)
+            if (self._pending_tokens >= self.max_batch_tokens or
+                    len(self._pending) >= self.max_batch_items):
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = asyncio.get_running_loop().call_later(self.linger, self._flush)
+        else:
+            future = entry[1]
+        # shield: 单个调用方取消不应影响同批次的其他调用方
+        return await asyncio.shield(future)
+
+    async def enrich_many(self, contents: List[str]) -> List[RecordEnrichment]:
+        """批量提交，结果顺序与输入一致"""
+        return list(await asyncio.gather(*(self.enrich(content) for content in contents)))
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        items = list(self._pending.values())
+        self._pending.clear()
+        self._pending_tokens = 0
+        for batch in self._pack(items):
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _pack(self, items: List[Tuple[str, asyncio.Future]]) -> List[List[Tuple[str, asyncio.Future]]]:
+        """按token预算和条目上限切分批次，超出预算的单条内容独占一个批次"""
+        batches, batch, tokens = [], [], 0
+        for item in items:
+            cost = estimate_tokens(item[0])
+            if batch and (tokens + cost > self.max_batch_tokens or len(batch) >= self.max_batch_items):
+                batches.append(batch)
+                batch, tokens = [], 0
+            batch.append(item)
+            tokens += cost
+        if batch:
+            batches.append(batch)
+        return batches
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        async with self._semaphore:
+            try:
+                results = await self.llm.enrich_batch([content for content, _ in batch])
+            except Exception as e:
+                logging.error(f"Enrichment batch of {len(batch)} failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def close(self) -> None:
+        """发出剩余内容并等待所有批次完成"""
+        if self._pending:
+            self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+# 单例实例
+enrichment_queue = EnrichmentQueue(
+    get_llm_service(),
+    max_batch_tokens=settings.enrichment_batch_max_tokens,
+    max_batch_items=settings.enrichment_batch_max_items,
+    max_concurrency=settings.enrichment_max_concurrency,
+    linger=settings.enrichment_linger_ms / 1000
+)
+
+def get_enrichment_queue():
+    return enrichment_queue
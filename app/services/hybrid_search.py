@@ -0,0 +1,74 @@
+"""
+混合检索
+- 关键词检索（BM25）与向量检索的结果融合：倒数排名融合（RRF）或归一化加权
+- 分类/元数据过滤条件的匹配
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# 来源名 -> 按得分降序的[(id, score)]
+SourceResults = Dict[str, List[Tuple[str, float]]]
+
+
+def reciprocal_rank_fusion(sources: SourceResults, k: int = 60,
+                           weights: Optional[Dict[str, float]] = None) -> List[Tuple[str, float]]:
+    """RRF: score(d) = Σ w_s / (k + rank_s(d))，rank从1开始；只依赖排名，不受各来源分数尺度影响"""
+    fused: Dict[str, float] = {}
+    for source, results in sources.items():
+        weight = (weights or {}).get(source, 1.0)
+        for rank, (item_id, _) in enumerate(results, start=1):
+            fused[item_id] = fused.get(item_id, 0.0) + weight / (k + rank)
+    return sorted(fused.items(), key=lambda item: (-item[1], item[0]))
+
+
+def weighted_fusion(sources: SourceResults,
+                    weights: Optional[Dict[str, float]] = None) -> List[Tuple[str, float]]:
+    """各来源分数按最大值归一化到[0, 1]后加权求和，未命中的来源记0分"""
+    fused: Dict[str, float] = {}
+    for source, results in sources.items():
+        if not results:
+            continue
+        weight = (weights or {}).get(source, 1.0)
+        top = max(score for _, score in results)
+        for item_id, score in results:
+            normalized = score / top if top > 0 else 0.0
+            fused[item_id] = fused.get(item_id, 0.0) + weight * normalized
+    return sorted(fused.items(), key=lambda item: (-item[1], item[0]))
+
+
+def fuse(sources: SourceResults, method: str = "rrf", rrf_k: int = 60,
+         weights: Optional[Dict[str, float]] = None) -> List[Tuple[str, float]]:
+    if method == "weighted":
+        return weighted_fusion(sources, weights)
+    return reciprocal_rank_fusion(sources, rrf_k, weights)
+
+
+def memory_categories(memory: dict) -> List[str]:
+    """记忆的分类：mem0返回的categories字段，或metadata中的category"""
+    categories = memory.get("categories")
+    if not categories:
+        categories = (memory.get("metadata") or {}).get("category")
+    if categories is None:
+        return []
+    if isinstance(categories, str):
+        return [categories]
+    return [str(category) for category in categories]
+
+
+def _value_matches(actual: Any, expected: Any) -> bool:
+    # 元数据值为列表（如tags）时，包含期望值即匹配
+    if isinstance(actual, list) and not isinstance(expected, list):
+        return expected in actual
+    return actual == expected
+
+
+def matches_filters(memory: dict, categories: Optional[Sequence[str]] = None,
+                    metadata_filter: Optional[Dict[str, Any]] = None) -> bool:
+    """categories命中任一即可，metadata_filter的每个键值都必须匹配"""
+    if categories and not set(categories) & set(memory_categories(memory)):
+        return False
+    if metadata_filter:
+        metadata = memory.get("metadata") or {}
+        for key, expected in metadata_filter.items():
+            if key not in metadata or not _value_matches(metadata[key], expected):
+                return False
+    return True
@@ -0,0 +1,224 @@
+"""
+NDJSON流式导入
+边读边写：按行解析校验，攒批后交给MemoryService写入；同时在途的批次数有上限，
+达到上限时暂停读取请求体（背压）。每批完成后推进检查点（连续完成的最大行号），
+中断后用同一import_id重新提交同一文件即可从检查点之后继续。
+请求中断时会等在途批次写完再返回，检查点与已写入的数据一致。
+
+单条写入失败记为failed并继续；整批全部失败视为后端不可用，停止导入并返回503，
+该批次不推进检查点，稍后续传时重试。此时（以及进程崩溃时）检查点之后已乱序完成的
+批次会在续传时重复写入，数量不超过max_in_flight批。
+"""
+import asyncio
+import heapq
+import json
+import logging
+import time
+from typing import AsyncIterable, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from app.config import settings
+from app.models.memory import MemoryCreateRequest
+from app.services.memory_service import MemoryService
+from app.utils.cache import LRUCache, SQLiteCache
+from app.utils.exceptions import ServiceUnavailableException
+from app.utils.executor import BlockingExecutor
+from app.utils.ndjson import iter_lines
+
+# 导入结果中最多返回的逐行错误数
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportCheckpointStore:
+    """导入检查点存储，配置了SQLite路径时持久化，否则只在进程内保存
+
+    协程中使用aget/aset：SQLite的读写和提交交给单线程执行器，按提交顺序执行，
+    后推进的检查点不会被先推进的覆盖
+    """
+
+    def __init__(self, path: str = "", ttl: Optional[float] = None, max_entries: int = 10000,
+                 max_queue: int = 1024):
+        self.executor: Optional[BlockingExecutor] = None
+        if path:
+            self._store = SQLiteCache(path, max_entries=max_entries, ttl=ttl)
+            self.executor = BlockingExecutor(max_workers=1, max_queue=max_queue, name="import-checkpoint")
+        else:
+            self._store = LRUCache(max_size=max_entries, ttl=ttl)
+
+    @staticmethod
+    def _key(user_id: str, import_id: str) -> str:
+        return f"{user_id}:{import_id}"
+
+    def get(self, user_id: str, import_id: str) -> Optional[dict]:
+        return self._store.get(self._key(user_id, import_id))
+
+    def set(self, user_id: str, import_id: str, checkpoint: dict) -> None:
+        self._store.set(self._key(user_id, import_id), checkpoint)
+
+    def delete(self, user_id: str, import_id: str) -> None:
+        self._store.delete(self._key(user_id, import_id))
+
+    async def aget(self, user_id: str, import_id: str) -> Optional[dict]:
+        if self.executor is None:
+            return self.get(user_id, import_id)
+        return await self.executor.run(self.get, user_id, import_id)
+
+    async def aset(self, user_id: str, import_id: str, checkpoint: dict) -> None:
+        if self.executor is None:
+            self.set(user_id, import_id, checkpoint)
+        else:
+            await self.executor.run(self.set, user_id, import_id, checkpoint)
+
+    async def aclose(self) -> None:
+        """等已提交的写入完成后关闭SQLite连接（之后使用时重新打开）"""
+        if self.executor is not None:
+            await self.executor.run(self._store.close)
+            self.executor.shutdown()
+
+
+class _ImportRun:
+    """一次导入的进度：完成的行区间可能乱序到达，检查点只在连续时推进"""
+
+    def __init__(self, checkpoint: dict):
+        self.line = checkpoint.get("line", 0)
+        self.created = checkpoint.get("created", 0)
+        self.invalid = checkpoint.get("invalid", 0)
+        self.failed = checkpoint.get("failed", 0)
+        self.errors: List[dict] = []
+        # 整批失败时的错误信息，设置后停止读取
+        self.aborted: Optional[str] = None
+        self._done: List[Tuple[int, int]] = []
+
+    def error(self, line: int, message: str) -> None:
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def complete(self, first: int, last: int) -> bool:
+        """标记[first, last]行完成，返回检查点是否推进"""
+        heapq.heappush(self._done, (first, last))
+        advanced = False
+        while self._done and self._done[0][0] == self.line + 1:
+            self.line = heapq.heappop(self._done)[1]
+            advanced = True
+        return advanced
+
+    def checkpoint(self) -> dict:
+        return {"line": self.line, "created": self.created, "invalid": self.invalid,
+                "failed": self.failed, "updated_at": time.time()}
+
+
+class ImportService:
+    def __init__(self, store: ImportCheckpointStore, batch_size: int = 100, max_in_flight: int = 4):
+        self.store = store
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+
+    async def get_checkpoint(self, user_id: str, import_id: str) -> Optional[dict]:
+        return await self.store.aget(user_id, import_id)
+
+    async def close(self) -> None:
+        await self.store.aclose()
+
+    async def import_ndjson(self, memory_service: MemoryService, user_id: str, import_id: str,
+                            chunks: AsyncIterable[bytes]) -> dict:
+        """导入NDJSON字节流，返回汇总；已记录检查点时跳过检查点及之前的行"""
+        checkpoint = await self.store.aget(user_id, import_id) or {}
+        run = _ImportRun(checkpoint)
+        resumed_from = run.line
+        slots = asyncio.Semaphore(self.max_in_flight)
+        tasks = set()
+        batch: List[dict] = []
+        batch_lines: List[int] = []
+        # 本批区间内校验失败的行，随批次完成一起计入，避免中断续传时重复计数
+        batch_invalid: List[Tuple[int, str]] = []
+        batch_first = resumed_from + 1
+        line_number = 0
+
+        async def write(first: int, last: int, items: List[dict], lines: List[int],
+                        invalid: List[Tuple[int, str]]) -> None:
+            try:
+                try:
+                    outcomes = await memory_service.add_memories(items, user_id=user_id)
+                except Exception as e:
+                    outcomes = [{"status": "error", "error": str(e)}] * len(items)
+                if outcomes and all(outcome["status"] != "created" for outcome in outcomes):
+                    run.aborted = run.aborted or outcomes[0].get("error", "")
+                    return
+                run.invalid += len(invalid)
+                for line, message in invalid:
+                    run.error(line, message)
+                for line, outcome in zip(lines, outcomes):
+                    if outcome["status"] == "created":
+                        run.created += 1
+                    else:
+                        run.failed += 1
+                        run.error(line, outcome.get("error", ""))
+                if run.complete(first, last):
+                    await self.store.aset(user_id, import_id, run.checkpoint())
+            finally:
+                # 处理完结果再释放，等待中的批次能看到aborted
+                slots.release()
+
+        async def flush(last: int) -> None:
+            nonlocal batch, batch_lines, batch_invalid, batch_first
+            # 在途批次已满时在这里等待，期间不再读取请求体
+            await slots.acquire()
+            if run.aborted:
+                slots.release()
+                return
+            task = asyncio.create_task(write(batch_first, last, batch, batch_lines, batch_invalid))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            batch, batch_lines, batch_invalid, batch_first = [], [], [], last + 1
+
+        try:
+            async for raw in iter_lines(chunks, settings.memory_import_max_line_bytes):
+                if run.aborted:
+                    break
+                line_number += 1
+                if line_number <= resumed_from or not raw.strip():
+                    continue
+                try:
+                    request = MemoryCreateRequest.model_validate(json.loads(raw))
+                except (ValueError, ValidationError) as e:
+                    batch_invalid.append((line_number, str(e).splitlines()[0]))
+                else:
+                    batch.append({"content": request.content, "metadata": request.metadata})
+                    batch_lines.append(line_number)
+                if len(batch) >= self.batch_size:
+                    await flush(line_number)
+            if line_number >= batch_first and not run.aborted:
+                await flush(line_number)
+        finally:
+            # 请求中断时也等在途批次写完并记录检查点，便于续传
+            if tasks:
+                await asyncio.gather(*tasks)
+        logging.info(f"Import {import_id} for user {user_id}: {run.created} created, "
+                     f"{run.invalid} invalid, {run.failed} failed, checkpoint line {run.line}")
+        if run.aborted:
+            raise ServiceUnavailableException(
+                detail=f"导入中断于第{run.line}行之后，可用同一import_id续传: {run.aborted}",
+                retry_after=5
+            )
+        return dict(run.checkpoint(), import_id=import_id, resumed_from=resumed_from,
+                    lines=line_number, errors=run.errors)
+
+
+def create_checkpoint_store() -> ImportCheckpointStore:
+    """根据配置创建导入检查点存储"""
+    return ImportCheckpointStore(
+        path=settings.memory_import_checkpoint_path,
+        ttl=settings.memory_import_checkpoint_ttl
+    )
+
+
+# 单例实例
+import_service = ImportService(
+    create_checkpoint_store(),
+    batch_size=settings.memory_import_batch_size,
+    max_in_flight=settings.memory_import_max_in_flight
+)
+
+def get_import_service():
+    return import_service
@@ -0,0 +1,116 @@
+"""
+Supabase JWT本地验证
+- HS256: 使用项目的JWT secret验证
+- RS*/ES*: 使用JWKS中的公钥验证，JWKS启动时获取一次并在后台定期刷新
+
+token的kid不在已知JWKS中时抛出UnknownKeyError，由调用方回退到远程验证，
+同时触发一次（限频的）JWKS刷新，使轮换后的新密钥尽快可以本地验证。
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+import httpx
+import jwt
+
+ASYMMETRIC_ALGORITHMS = ("RS256", "RS384", "RS512", "ES256", "ES384", "ES512", "PS256", "EdDSA")
+
+
+class UnknownKeyError(Exception):
+    """token的kid不在当前JWKS中，无法本地验证"""
+
+
+class JWTVerifier:
+    def __init__(self, secret: str = "", jwks_url: str = "", audience: Optional[str] = "authenticated",
+                 issuer: Optional[str] = None, leeway: float = 30.0, refresh_interval: float = 600.0,
+                 min_refresh_interval: float = 30.0, timeout: float = 5.0,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.secret = secret
+        self.jwks_url = jwks_url
+        self.audience = audience
+        self.issuer = issuer
+        self.leeway = leeway
+        self.refresh_interval = refresh_interval
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+        self._transport = transport
+        self._keys: Dict[str, jwt.PyJWK] = {}
+        self._last_refresh = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._background_task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """获取一次JWKS并启动后台刷新"""
+        if not self.jwks_url:
+            return
+        await self.refresh()
+        if self._background_task is None:
+            self._background_task = asyncio.create_task(self._refresh_loop())
+
+    async def close(self) -> None:
+        for task in (self._background_task, self._refresh_task):
+            if task is not None:
+                task.cancel()
+        self._background_task = self._refresh_task = None
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            await self.refresh()
+
+    async def refresh(self) -> None:
+        """拉取JWKS；失败时保留已有密钥"""
+        self._last_refresh = time.monotonic()
+        try:
+            async with httpx.AsyncClient(transport=self._transport, timeout=self.timeout) as client:
+                response = await client.get(self.jwks_url)
+                response.raise_for_status()
+                jwks = jwt.PyJWKSet.from_dict(response.json())
+        except (httpx.HTTPError, ValueError, jwt.PyJWKSetError) as e:
+            logging.warning(f"JWKS refresh failed: {e}")
+            return
+        self._keys = {key.key_id: key for key in jwks.keys if key.key_id}
+        logging.info(f"Loaded {len(self._keys)} signing keys from JWKS")
+
+    def _schedule_refresh(self) -> None:
+        """遇到未知kid时在后台刷新JWKS，限制刷新频率"""
+        if not self.jwks_url or time.monotonic() - self._last_refresh < self.min_refresh_interval:
+            return
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        try:
+            self._refresh_task = asyncio.get_running_loop().create_task(self.refresh())
+        except RuntimeError:
+            pass
+
+    def verify(self, token: str) -> dict:
+        """验证签名与exp/aud等声明，返回claims
+
+        签名或声明无效时抛出jwt.InvalidTokenError；kid未知时抛出UnknownKeyError
+        """
+        header = jwt.get_unverified_header(token)
+        algorithm = header.get("alg")
+        if algorithm == "HS256":
+            if not self.secret:
+                raise UnknownKeyError("HS256 token but no JWT secret configured")
+            key = self.secret
+        elif algorithm in ASYMMETRIC_ALGORITHMS:
+            jwk = self._keys.get(header.get("kid"))
+            if jwk is None:
+                self._schedule_refresh()
+                raise UnknownKeyError(f"unknown key id {header.get('kid')!r}")
+            if jwk.algorithm_name != algorithm:
+                raise jwt.InvalidAlgorithmError("token algorithm does not match the signing key")
+            key = jwk.key
+        else:
+            raise jwt.InvalidAlgorithmError(f"unsupported algorithm {algorithm!r}")
+        return jwt.decode(
+            token,
+            key,
+            algorithms=[algorithm],
+            audience=self.audience,
+            issuer=self.issuer,
+            leeway=self.leeway,
+            options={"require": ["exp", "sub"], "verify_aud": self.audience is not None}
+        )
@@ -1,15 +1,233 @@
+import asyncio
+import json
+import random
+import re
 import httpx
 import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional
 from app.config import settings
+from app.models.record import RecordEnrichment
+from app.utils.cache import LRUCache, SQLiteCache, TieredCache, content_hash
+
+# 可重试的HTTP状态码：限流和上游临时故障
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+MAX_RETRY_DELAY = 30.0
+
+# 修改提示词时递增版本号（缓存键包含该版本）
+SUMMARIZE_PROMPT_VERSION = "summarize-v1"
+EXTRACT_TAGS_PROMPT_VERSION = "tags-v1"
+ENRICH_PROMPT_VERSION = "enrich-v1"
+SUMMARIZE_PROMPT = "请用一句话总结以下内容："
+ENRICH_PROMPT = (
+    "请分析以下内容，只返回一个JSON对象，不要包含任何其他文字。格式：\n"
+    '{"summary": "一句话总结", "tags": ["3-5个分类标签"], "keywords": ["3-8个关键词"]}\n'
+    "内容："
+)
+ENRICH_BATCH_PROMPT = (
+    "请分别分析下面编号的每条内容，只返回一个JSON对象，不要包含任何其他文字。格式：\n"
+    '{"items": [{"index": 编号, "summary": "一句话总结", "tags": ["3-5个分类标签"], "keywords": ["3-8个关键词"]}]}\n'
+    "每条内容都必须有对应的index。\n"
+)
+MAX_ENRICH_ITEMS = 10
+
+_CODE_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+
+def _parse_string_list(value, field: str) -> List[str]:
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise ValueError(f"'{field}' must be a list of strings")
+    items = []
+    for item in value:
+        item = item.strip()
+        if item and item not in items:
+            items.append(item)
+    return items[:MAX_ENRICH_ITEMS]
+
+def parse_enrichment(text: str) -> RecordEnrichment:
+    """严格解析enrich的JSON输出，格式不符时抛出ValueError"""
+    text = _CODE_FENCE_RE.sub("", text.strip())
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"invalid JSON: {e}") from e
+    if not isinstance(data, dict):
+        raise ValueError("enrichment must be a JSON object")
+    summary = data.get("summary")
+    if not isinstance(summary, str) or not summary.strip():
+        raise ValueError("'summary' must be a non-empty string")
+    return RecordEnrichment(
+        summary=summary.strip(),
+        tags=_parse_string_list(data.get("tags", []), "tags"),
+        keywords=_parse_string_list(data.get("keywords", []), "keywords")
+    )
+
+def create_llm_cache() -> Optional[TieredCache]:
+    """根据配置创建LLM结果缓存"""
+    if not settings.llm_cache_enabled:
+        return None
+    disk = None
+    if settings.llm_cache_sqlite_path:
+        disk = SQLiteCache(
+            settings.llm_cache_sqlite_path,
+            max_entries=settings.llm_cache_sqlite_max_entries,
+            ttl=settings.llm_cache_ttl
+        )
+    return TieredCache(
+        LRUCache(max_size=settings.llm_cache_max_entries, ttl=settings.llm_cache_ttl),
+        disk
+    )
+
+def parse_batch_enrichment(text: str, count: int) -> dict:
+    """解析批量enrich输出，返回{index: RecordEnrichment}，跳过格式不符的条目"""
+    text = _CODE_FENCE_RE.sub("", text.strip())
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"invalid JSON: {e}") from e
+    items = data.get("items") if isinstance(data, dict) else None
+    if not isinstance(items, list):
+        raise ValueError("batch enrichment must contain an 'items' list")
+    results = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        index = item.get("index")
+        if not isinstance(index, int) or isinstance(index, bool) or not 0 <= index < count:
+            continue
+        try:
+            results[index] = parse_enrichment(json.dumps(item, ensure_ascii=False))
+        except ValueError:
+            continue
+    return results
 
 class LLMService:
-    def __init__(self):
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None,
+                 cache: Optional[TieredCache] = None):
         self.api_key = settings.openrouter_api_key
         self.model = settings.preferred_model
-        self.base_url = "https://openrouter.ai/api/v1/chat/completions"  # 示例，具体以 OpenRouter 文档为准
+        self.base_url = f"{settings.llm_base_url.rstrip('/')}/chat/completions"
+        self.max_retries = settings.llm_max_retries
+        self.retry_backoff = settings.llm_retry_backoff
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self.cache = cache if cache is not None else create_llm_cache()
+
+    async def startup(self):
+        """创建共享连接池，避免每次调用都重新握手"""
+        if self._client is not None:
+            return
+        self._client = httpx.AsyncClient(
+            headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            },
+            limits=httpx.Limits(
+                max_connections=settings.llm_max_connections,
+                max_keepalive_connections=settings.llm_max_keepalive_connections
+            ),
+            timeout=httpx.Timeout(
+                settings.llm_read_timeout,
+                connect=settings.llm_connect_timeout
+            ),
+            transport=self._transport
+        )
+        logging.info("LLM HTTP client opened")
+
+    async def shutdown(self):
+        """关闭共享连接池，写回并关闭缓存的磁盘层"""
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+            logging.info("LLM HTTP client closed")
+        if self.cache is not None:
+            await self.cache.aclose()
+
+    async def _cached(self, prompt_version: str, content: str,
+                      producer: Callable[[], Awaitable[Any]]) -> Any:
+        """按(规范化内容, 模型, 提示词版本)缓存结果，值必须可JSON序列化"""
+        if self.cache is None:
+            return await producer()
+        key = content_hash(content, self.model, prompt_version)
+        value = await self.cache.aget(key)
+        if value is not None:
+            return value
+        value = await producer()
+        await self.cache.aset(key, value)
+        return value
+
+    def cache_stats(self) -> dict:
+        """缓存命中/未命中计数"""
+        return self.cache.stats() if self.cache is not None else {}
 
     async def summarize(self, content: str) -> str:
-        prompt = f"请用一句话总结以下内容：{content}"
+        return await self._cached(SUMMARIZE_PROMPT_VERSION, content, lambda: self._summarize(content))
+
+    async def stream_summary(self, content: str) -> AsyncIterator[str]:
+        """流式生成摘要；命中缓存时一次性返回，流结束后写入缓存"""
+        key = content_hash(content, self.model, SUMMARIZE_PROMPT_VERSION)
+        cached = await self.cache.aget(key) if self.cache is not None else None
+        if cached is not None:
+            yield cached
+            return
+        parts = []
+        try:
+            async for delta in self._stream_llm(SUMMARIZE_PROMPT + content):
+                parts.append(delta)
+                yield delta
+        except Exception as e:
+            logging.error(f"LLM stream_summary error: {e}")
+            raise
+        if self.cache is not None and parts:
+            await self.cache.aset(key, "".join(parts))
+
+    async def extract_tags(self, content: str) -> list:
+        return await self._cached(EXTRACT_TAGS_PROMPT_VERSION, content, lambda: self._extract_tags(content))
+
+    async def enrich(self, content: str) -> RecordEnrichment:
+        """一次调用同时生成摘要、标签和关键词，输出无法解析时退回到分开调用"""
+        data = await self._cached(
+            ENRICH_PROMPT_VERSION, content,
+            lambda: self._enrich_uncached(content)
+        )
+        return RecordEnrichment(**data)
+
+    async def get_cached_enrichment(self, content: str) -> Optional[RecordEnrichment]:
+        """只查缓存，不调用LLM"""
+        if self.cache is None:
+            return None
+        data = await self.cache.aget(content_hash(content, self.model, ENRICH_PROMPT_VERSION))
+        return RecordEnrichment(**data) if data is not None else None
+
+    async def enrich_batch(self, contents: List[str]) -> List[RecordEnrichment]:
+        """把多条内容打包进一次调用；缺失或无法解析的条目单独重试"""
+        results: List[Optional[RecordEnrichment]] = [await self.get_cached_enrichment(c) for c in contents]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if len(missing) > 1:
+            numbered = "\n".join(f"[{n}] {contents[i]}" for n, i in enumerate(missing))
+            try:
+                response = await self._call_llm(ENRICH_BATCH_PROMPT + numbered, json_mode=True)
+            except Exception as e:
+                logging.error(f"LLM enrich_batch error: {e}")
+                raise
+            try:
+                parsed = parse_batch_enrichment(response, len(missing))
+            except ValueError as e:
+                logging.warning(f"LLM enrich_batch returned unparseable output ({e}), falling back")
+                parsed = {}
+            for n, enrichment in parsed.items():
+                i = missing[n]
+                results[i] = enrichment
+                if self.cache is not None:
+                    await self.cache.aset(content_hash(contents[i], self.model, ENRICH_PROMPT_VERSION),
+                                          enrichment.model_dump())
+        retry = [i for i, result in enumerate(results) if result is None]
+        if retry:
+            singles = await asyncio.gather(*(self.enrich(contents[i]) for i in retry))
+            for i, enrichment in zip(retry, singles):
+                results[i] = enrichment
+        return results
+
+    async def _summarize(self, content: str) -> str:
+        prompt = SUMMARIZE_PROMPT + content
         try:
             response = await self._call_llm(prompt)
             return response
@@ -17,7 +235,7 @@ class LLMService:
             logging.error(f"LLM summarize error: {e}")
             raise
 
-    async def extract_tags(self, content: str) -> list:
+    async def _extract_tags(self, content: str) -> list:
         prompt = f"请为以下内容提取3-5个关键词或标签，逗号分隔：{content}"
         try:
             response = await self._call_llm(prompt)
@@ -26,22 +244,106 @@ class LLMService:
             logging.error(f"LLM extract_tags error: {e}")
             raise
 
-    async def _call_llm(self, prompt: str) -> str:
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+    async def _enrich_uncached(self, content: str) -> dict:
+        try:
+            response = await self._call_llm(ENRICH_PROMPT + content, json_mode=True)
+        except Exception as e:
+            logging.error(f"LLM enrich error: {e}")
+            raise
+        try:
+            return parse_enrichment(response).model_dump()
+        except ValueError as e:
+            logging.warning(f"LLM enrich returned unparseable output ({e}), falling back")
+        summary, tags = await asyncio.gather(self.summarize(content), self.extract_tags(content))
+        tags = [tag for tag in tags if tag]
+        return RecordEnrichment(summary=summary, tags=tags, keywords=list(tags)).model_dump()
+
+    async def _call_llm(self, prompt: str, json_mode: bool = False) -> str:
         payload = {
             "model": self.model,
             "messages": [
                 {"role": "user", "content": prompt}
             ]
         }
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(self.base_url, json=payload, headers=headers, timeout=30)
-            await resp.raise_for_status()
-            data = await resp.json()
-            return data["choices"][0]["message"]["content"]
+        if json_mode:
+            payload["response_format"] = {"type": "json_object"}
+        resp = await self._post(payload)
+        data = resp.json()
+        return data["choices"][0]["message"]["content"]
+
+    async def _stream_llm(self, prompt: str) -> AsyncIterator[str]:
+        """以SSE流式接收补全，逐段产出增量文本"""
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "stream": True
+        }
+        resp = await self._post(payload, stream=True)
+        try:
+            async for line in resp.aiter_lines():
+                # 忽略空行和注释行（如 ": OPENROUTER PROCESSING"）
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                if chunk.get("error"):
+                    raise RuntimeError(f"LLM stream error: {chunk['error']}")
+                choices = chunk.get("choices") or [{}]
+                delta = (choices[0].get("delta") or {}).get("content")
+                if delta:
+                    yield delta
+        finally:
+            await resp.aclose()
+
+    async def _post(self, payload: dict, stream: bool = False) -> httpx.Response:
+        """发送请求，429/5xx和连接失败时按带抖动的指数退避重试
+
+        stream=True时返回未读取正文的响应，调用方负责aclose()。
+        """
+        if self._client is None:
+            # 未经过应用启动钩子（脚本、测试）时按需创建
+            await self.startup()
+        for attempt in range(self.max_retries + 1):
+            try:
+                request = self._client.build_request("POST", self.base_url, json=payload)
+                resp = await self._client.send(request, stream=stream)
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff_delay(attempt)
+                logging.warning(f"LLM connect error ({e}), retrying in {delay:.2f}s")
+            else:
+                if resp.status_code not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+                    if resp.is_error and stream:
+                        await resp.aclose()
+                    resp.raise_for_status()
+                    return resp
+                if stream:
+                    await resp.aclose()
+                delay = self._retry_after(resp)
+                if delay is None:
+                    delay = self._backoff_delay(attempt)
+                logging.warning(f"LLM returned {resp.status_code}, retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """Full jitter: 在[0, backoff * 2^attempt]内随机取值"""
+        return random.uniform(0, min(MAX_RETRY_DELAY, self.retry_backoff * (2 ** attempt)))
+
+    @staticmethod
+    def _retry_after(resp: httpx.Response) -> Optional[float]:
+        """读取Retry-After（秒数格式）"""
+        value = resp.headers.get("Retry-After")
+        if value is None:
+            return None
+        try:
+            return min(MAX_RETRY_DELAY, max(0.0, float(value)))
+        except ValueError:
+            return None
 
 # 单例实例
 llm_service = LLMService()
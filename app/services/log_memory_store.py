@@ -0,0 +1,519 @@
+"""
+日志结构的本地记忆后端
+- 写入只追加到当前段文件（近似顺序写），删除追加墓碑记录
+- 段文件写满后封存：末尾写入记录索引（footer）和定长尾部，之后只读并通过mmap访问，
+  读取时在memoryview上切片直接解码，不复制整段数据
+- 内存中只保存 记忆ID -> 位置 的索引和每个用户的写入顺序；冷启动时从各段footer重建索引，
+  不需要读取记录内容，只有未封存（进程中断时的当前段）的段需要逐条扫描
+- 后台整理：垃圾比例超过阈值的封存段，把仍有效的记录复制到新段后删除旧段
+- 墓碑只在该ID仍有旧记录留在某个段中时有效；旧记录所在的段都被整理掉后墓碑即成为垃圾
+
+每条记录带全局递增的版本号，重放时同一ID取版本号最大的记录，因此段的先后顺序不影响结果。
+关键词检索的倒排索引在用户首次检索时按需构建，之后增量维护。
+"""
+import bisect
+import itertools
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import uuid
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from app.services.memory_records import NOT_FOUND, public_memory
+from app.services.search_index import BM25Index
+from app.utils.exceptions import InvalidCursorException
+
+PUT = 1
+TOMBSTONE = 2
+# 记录头: 类型、版本号、内容长度、内容CRC32
+RECORD_HEADER = struct.Struct("<BQII")
+# 封存段尾部: footer偏移、footer长度、footer CRC32、魔数
+TRAILER = struct.Struct("<QII8s")
+MAGIC = b"RCLOGSG1"
+SEGMENT_NAME = re.compile(r"^(\d{8})\.seg$")
+
+
+class Entry(NamedTuple):
+    """段内一条记录；offset/length指向记录内容（不含记录头）"""
+    kind: int
+    memory_id: str
+    user_id: str
+    version: int
+    created: int
+    offset: int
+    length: int
+
+    @property
+    def size(self) -> int:
+        return RECORD_HEADER.size + self.length
+
+
+class Segment:
+    """一个段文件；未封存时可追加，封存后只读并通过mmap访问"""
+
+    def __init__(self, segment_id: int, path: str, fsync: bool = False):
+        self.id = segment_id
+        self.path = path
+        self.fsync = fsync
+        self.entries: List[Entry] = []
+        # 记录区总字节数，以及其中仍有效的字节数（当前版本的记录和仍需保留的墓碑）
+        self.size = 0
+        self.live = 0
+        self._fd: Optional[int] = None
+        self._map: Optional[mmap.mmap] = None
+        self._view: Optional[memoryview] = None
+
+    @property
+    def sealed(self) -> bool:
+        return self._map is not None
+
+    @property
+    def garbage_ratio(self) -> float:
+        return 1 - self.live / self.size if self.size else 0.0
+
+    @classmethod
+    def create(cls, segment_id: int, path: str, fsync: bool = False) -> "Segment":
+        segment = cls(segment_id, path, fsync)
+        segment._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        return segment
+
+    @classmethod
+    def open(cls, segment_id: int, path: str, fsync: bool = False) -> "Segment":
+        """打开已有段：有完整footer时直接读取索引；否则逐条扫描、截掉不完整的尾部并封存"""
+        segment = cls(segment_id, path, fsync)
+        if not segment._load_footer():
+            segment._fd = os.open(path, os.O_RDWR | os.O_APPEND)
+            entries, end = segment._scan()
+            if end < os.fstat(segment._fd).st_size:
+                logging.warning(f"Truncating torn tail of segment {path} at byte {end}")
+                os.ftruncate(segment._fd, end)
+            segment.entries, segment.size = entries, end
+            segment.seal()
+        return segment
+
+    def _load_footer(self) -> bool:
+        """校验尾部和footer，完整时映射文件并返回True"""
+        with open(self.path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            file_size = f.tell()
+            if file_size < TRAILER.size:
+                return False
+            f.seek(file_size - TRAILER.size)
+            footer_offset, footer_length, footer_crc, magic = TRAILER.unpack(f.read(TRAILER.size))
+            if magic != MAGIC or footer_offset + footer_length + TRAILER.size != file_size:
+                return False
+            f.seek(footer_offset)
+            footer = f.read(footer_length)
+        if zlib.crc32(footer) != footer_crc:
+            return False
+        self.size = footer_offset
+        self._map_file()
+        return True
+
+    def _scan(self) -> Tuple[List[Entry], int]:
+        """逐条读取记录，遇到不完整或校验失败的记录时停止，返回有效记录及其结束位置"""
+        entries, position = [], 0
+        with open(self.path, "rb") as f:
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                kind, version, length, crc = RECORD_HEADER.unpack(header)
+                payload = f.read(length)
+                if kind not in (PUT, TOMBSTONE) or len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                try:
+                    record = json.loads(payload)
+                except ValueError:
+                    break
+                entries.append(Entry(kind, record["id"], record["user_id"], version,
+                                     record.get("_seq", 0), position + RECORD_HEADER.size, length))
+                position += RECORD_HEADER.size + length
+        return entries, position
+
+    def append(self, kind: int, version: int, record: dict) -> Entry:
+        payload = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return self.append_raw(kind, version, record["id"], record["user_id"], record.get("_seq", 0), payload)
+
+    def append_raw(self, kind: int, version: int, memory_id: str, user_id: str, created: int,
+                   payload: bytes) -> Entry:
+        os.write(self._fd, RECORD_HEADER.pack(kind, version, len(payload), zlib.crc32(payload)) + payload)
+        if self.fsync:
+            os.fsync(self._fd)
+        entry = Entry(kind, memory_id, user_id, version, created, self.size + RECORD_HEADER.size, len(payload))
+        self.entries.append(entry)
+        self.size += entry.size
+        return entry
+
+    def seal(self) -> None:
+        """写入footer和尾部，之后只读"""
+        footer = json.dumps([list(entry) for entry in self.entries], separators=(",", ":")).encode("utf-8")
+        os.write(self._fd, footer + TRAILER.pack(self.size, len(footer), zlib.crc32(footer), MAGIC))
+        os.fsync(self._fd)
+        os.close(self._fd)
+        self._fd = None
+        self._map_file()
+
+    def _map_file(self) -> None:
+        with open(self.path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        # footer已在内存中重建为索引，封存段只在整理时才需要记录列表
+        self.entries = []
+
+    def read(self, offset: int, length: int) -> str:
+        if self._view is not None:
+            return str(self._view[offset:offset + length], "utf-8")
+        return os.pread(self._fd, length, offset).decode("utf-8")
+
+    def read_raw(self, entry: Entry) -> bytes:
+        """记录内容的原始字节，整理时原样复制"""
+        return bytes(self._view[entry.offset:entry.offset + entry.length])
+
+    def footer_entries(self) -> List[Entry]:
+        """重新读取封存段的footer"""
+        footer_offset, footer_length, _, _ = TRAILER.unpack(self._view[-TRAILER.size:])
+        return [Entry(*row) for row in json.loads(bytes(self._view[footer_offset:footer_offset + footer_length]))]
+
+    def close(self) -> None:
+        if self._view is not None:
+            self._view.release()
+            self._map.close()
+            self._view = self._map = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class Location(NamedTuple):
+    segment_id: int
+    offset: int
+    length: int
+    version: int
+    user_id: str
+    created: int
+
+
+class LogMemoryClient:
+    # 过滤条件由MemoryService在检索后处理
+    supports_filters = False
+    # update/delete接受user_id，记忆不属于该用户时按不存在处理
+    enforces_ownership = True
+
+    def __init__(self, directory: str, segment_max_bytes: int = 64 * 1024 * 1024,
+                 compact_interval: float = 300.0, compact_garbage_ratio: float = 0.5,
+                 fsync: bool = False):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.compact_garbage_ratio = compact_garbage_ratio
+        self.fsync = fsync
+        self._lock = threading.RLock()
+        # 同一时间只有一个整理任务
+        self._compact_lock = threading.Lock()
+        self._segments: Dict[int, Segment] = {}
+        self._locations: Dict[str, Location] = {}
+        # 每个用户按创建顺序排列的(创建序号, 记忆ID)
+        self._user_order: Dict[str, List[Tuple[int, str]]] = {}
+        self._search_indexes: Dict[str, BM25Index] = {}
+        # 记忆ID -> 仍保存着该ID非当前版本PUT记录的段（更新前的旧版本、已删除记忆的最后版本）
+        self._stale_puts: Dict[str, Set[int]] = {}
+        # 记忆ID -> 仍需保留的墓碑(段ID, 偏移, 字节数)
+        self._tombstones: Dict[str, Tuple[int, int, int]] = {}
+        self._load()
+        self._active = self._new_segment()
+        self._stop = threading.Event()
+        self._compactor = None
+        if compact_interval > 0:
+            self._compactor = threading.Thread(target=self._compact_loop, args=(compact_interval,),
+                                               name="memory-log-compactor", daemon=True)
+            self._compactor.start()
+
+    # ---- 启动与段管理 ----
+
+    def _segment_path(self, segment_id: int) -> str:
+        return os.path.join(self.directory, f"{segment_id:08d}.seg")
+
+    def _new_segment(self) -> Segment:
+        segment_id = next(self._segment_ids)
+        segment = Segment.create(segment_id, self._segment_path(segment_id), fsync=self.fsync)
+        self._segments[segment_id] = segment
+        return segment
+
+    def _load(self) -> None:
+        """打开已有段并重建索引：同一ID取版本号最大的记录"""
+        segment_ids = sorted(int(m.group(1)) for m in map(SEGMENT_NAME.match, os.listdir(self.directory)) if m)
+        latest: Dict[str, Tuple[Entry, int]] = {}
+        footers: List[Tuple[int, List[Entry]]] = []
+        for segment_id in segment_ids:
+            segment = Segment.open(segment_id, self._segment_path(segment_id), fsync=self.fsync)
+            if segment.size == 0:
+                # 上次运行时未写入任何记录的段
+                segment.close()
+                os.remove(segment.path)
+                continue
+            self._segments[segment_id] = segment
+            entries = segment.footer_entries()
+            footers.append((segment_id, entries))
+            for entry in entries:
+                current = latest.get(entry.memory_id)
+                if current is None or entry.version > current[0].version:
+                    latest[entry.memory_id] = (entry, segment_id)
+        for segment_id, entries in footers:
+            for entry in entries:
+                if entry.kind == PUT and latest[entry.memory_id] != (entry, segment_id):
+                    self._stale_puts.setdefault(entry.memory_id, set()).add(segment_id)
+        max_version = max_created = 0
+        for entry, segment_id in latest.values():
+            max_version = max(max_version, entry.version)
+            max_created = max(max_created, entry.created)
+            if entry.kind == PUT:
+                self._segments[segment_id].live += entry.size
+                self._index(entry, segment_id)
+            elif entry.memory_id in self._stale_puts:
+                # 墓碑需要保留到对应的旧记录被整理掉，计为有效字节
+                self._segments[segment_id].live += entry.size
+                self._tombstones[entry.memory_id] = (segment_id, entry.offset, entry.size)
+        for order in self._user_order.values():
+            order.sort()
+        self._versions = itertools.count(max_version + 1)
+        self._created = itertools.count(max_created + 1)
+        self._segment_ids = itertools.count((segment_ids[-1] + 1) if segment_ids else 1)
+        logging.info(f"Memory log opened at {self.directory}: {len(segment_ids)} segments, "
+                     f"{len(self._locations)} memories")
+
+    def _index(self, entry: Entry, segment_id: int) -> None:
+        self._locations[entry.memory_id] = Location(segment_id, entry.offset, entry.length,
+                                                    entry.version, entry.user_id, entry.created)
+        self._user_order.setdefault(entry.user_id, []).append((entry.created, entry.memory_id))
+
+    # ---- 读写 ----
+
+    def _append(self, kind: int, record: dict) -> Tuple[Entry, int]:
+        """追加记录到当前段，写满时封存并换新段；调用方持有self._lock"""
+        segment = self._active
+        entry = segment.append(kind, next(self._versions), record)
+        if segment.size >= self.segment_max_bytes:
+            segment.seal()
+            self._active = self._new_segment()
+        return entry, segment.id
+
+    def _release(self, memory_id: str, location: Location) -> None:
+        """旧版本记录变为垃圾，记录其所在段以便判断墓碑何时可以丢弃"""
+        segment = self._segments.get(location.segment_id)
+        if segment is not None:
+            segment.live -= RECORD_HEADER.size + location.length
+        self._stale_puts.setdefault(memory_id, set()).add(location.segment_id)
+
+    def _forget_stale(self, memory_id: str, segment_id: int) -> None:
+        """段已删除：其中的旧记录不复存在，该ID没有旧记录时墓碑也成为垃圾；调用方持有self._lock"""
+        segment_ids = self._stale_puts.get(memory_id)
+        if segment_ids is None:
+            return
+        segment_ids.discard(segment_id)
+        if segment_ids:
+            return
+        del self._stale_puts[memory_id]
+        tombstone = self._tombstones.pop(memory_id, None)
+        if tombstone is not None and tombstone[0] in self._segments:
+            self._segments[tombstone[0]].live -= tombstone[2]
+
+    def _read(self, location: Location) -> dict:
+        return json.loads(self._segments[location.segment_id].read(location.offset, location.length))
+
+    def add(self, messages, user_id, metadata=None):
+        memory_id = str(uuid.uuid4())
+        content = messages[0]["content"] if messages else ""
+        now = datetime.now(timezone.utc).isoformat()
+        with self._lock:
+            created = next(self._created)
+            record = {"id": memory_id, "memory": content, "user_id": user_id, "metadata": metadata or {},
+                      "created_at": now, "updated_at": now, "_seq": created}
+            entry, segment_id = self._append(PUT, record)
+            self._segments[segment_id].live += entry.size
+            self._locations[memory_id] = Location(segment_id, entry.offset, entry.length, entry.version,
+                                                  user_id, created)
+            bisect.insort(self._user_order.setdefault(user_id, []), (created, memory_id))
+            if user_id in self._search_indexes:
+                self._search_indexes[user_id].add(memory_id, content)
+        return {"id": memory_id}
+
+    def get(self, memory_id):
+        with self._lock:
+            location = self._locations.get(memory_id)
+            return public_memory(self._read(location)) if location else None
+
+    def get_all(self, user_id):
+        with self._lock:
+            return [public_memory(self._read(self._locations[memory_id]))
+                    for _, memory_id in self._user_order.get(user_id, [])]
+
+    def list(self, user_id, limit=50, cursor=None):
+        """按创建顺序分页，cursor为上一页最后一条的创建序号"""
+        if cursor is not None and (not isinstance(cursor, int) or isinstance(cursor, bool)):
+            raise InvalidCursorException()
+        with self._lock:
+            order = self._user_order.get(user_id, [])
+            start = 0 if cursor is None else bisect.bisect_right(order, cursor, key=lambda item: item[0])
+            page = order[start:start + limit]
+            return {
+                "results": [public_memory(self._read(self._locations[memory_id])) for _, memory_id in page],
+                "next_cursor": page[-1][0] if page and start + limit < len(order) else None,
+                "total": len(order)
+            }
+
+    def search(self, query, user_id, limit=10):
+        return self.keyword_search(query, user_id, limit=limit)
+
+    def keyword_search(self, query, user_id, limit=10):
+        """BM25检索；用户的倒排索引在首次检索时构建"""
+        with self._lock:
+            index = self._search_indexes.get(user_id)
+            if index is None:
+                index = self._search_indexes[user_id] = BM25Index()
+                for _, memory_id in self._user_order.get(user_id, []):
+                    index.add(memory_id, self._read(self._locations[memory_id])["memory"])
+            return [dict(public_memory(self._read(self._locations[memory_id])), score=round(score, 6))
+                    for memory_id, score in index.search(query, limit=limit)]
+
+    def update(self, memory_id, data, user_id=None):
+        with self._lock:
+            location = self._locations.get(memory_id)
+            if location is None or (user_id is not None and location.user_id != user_id):
+                return NOT_FOUND
+            record = dict(self._read(location), memory=data,
+                          updated_at=datetime.now(timezone.utc).isoformat())
+            entry, segment_id = self._append(PUT, record)
+            self._release(memory_id, location)
+            self._segments[segment_id].live += entry.size
+            self._locations[memory_id] = location._replace(segment_id=segment_id, offset=entry.offset,
+                                                           length=entry.length, version=entry.version)
+            if location.user_id in self._search_indexes:
+                self._search_indexes[location.user_id].add(memory_id, data)
+        return {"id": memory_id}
+
+    def delete(self, memory_id, user_id=None):
+        with self._lock:
+            location = self._locations.get(memory_id)
+            if location is None or (user_id is not None and location.user_id != user_id):
+                return NOT_FOUND
+            entry, segment_id = self._append(TOMBSTONE, {"id": memory_id, "user_id": location.user_id,
+                                                          "_seq": location.created})
+            self._release(memory_id, location)
+            self._segments[segment_id].live += entry.size
+            self._tombstones[memory_id] = (segment_id, entry.offset, entry.size)
+            del self._locations[memory_id]
+            order = self._user_order[location.user_id]
+            del order[bisect.bisect_left(order, (location.created, memory_id))]
+            if location.user_id in self._search_indexes:
+                self._search_indexes[location.user_id].remove(memory_id)
+        return {"deleted": True}
+
+    # ---- 整理 ----
+
+    def _compact_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.compact()
+            except Exception as e:
+                logging.error(f"Memory log compaction failed: {e}")
+
+    def compact(self) -> int:
+        """整理垃圾比例达到阈值的封存段，返回回收的字节数
+
+        有效记录原样复制到新段（保留版本号），复制期间不持有全局锁；
+        复制完成后只有位置未变的记录才改指向新段，期间被更新/删除的记录在新段中即为垃圾。
+        旧记录只存在于参与整理的段中的墓碑不再复制；其他段中的这类墓碑在整理后计为垃圾。
+        """
+        with self._compact_lock:
+            with self._lock:
+                victims = [s for s in self._segments.values()
+                           if s.sealed and s.garbage_ratio >= self.compact_garbage_ratio]
+                if not victims:
+                    return 0
+                target_id = next(self._segment_ids)
+            footers = {segment.id: segment.footer_entries() for segment in victims}
+            victim_ids = set(footers)
+            with self._lock:
+                # 已删除的记忆不会再有新记录，这个集合在复制期间不会变化
+                obsolete = {entry.memory_id for entries in footers.values() for entry in entries
+                            if entry.memory_id in self._tombstones
+                            and self._stale_puts.get(entry.memory_id, set()) <= victim_ids}
+            target = Segment.create(target_id, self._segment_path(target_id), fsync=False)
+            copied: List[Tuple[Entry, Entry, int]] = []
+            for segment in victims:
+                for entry in footers[segment.id]:
+                    with self._lock:
+                        location = self._locations.get(entry.memory_id)
+                        tombstone = self._tombstones.get(entry.memory_id)
+                    if entry.kind == PUT:
+                        if location is None or (location.segment_id, location.offset) != (segment.id, entry.offset):
+                            continue
+                    elif (entry.memory_id in obsolete or tombstone is None
+                          or tombstone[:2] != (segment.id, entry.offset)):
+                        continue
+                    new_entry = target.append_raw(entry.kind, entry.version, entry.memory_id, entry.user_id,
+                                                  entry.created, segment.read_raw(entry))
+                    copied.append((entry, new_entry, segment.id))
+            if copied:
+                target.seal()
+            else:
+                target.close()
+                os.remove(target.path)
+            reclaimed = sum(segment.size for segment in victims)
+            with self._lock:
+                if copied:
+                    self._segments[target_id] = target
+                for old, new, segment_id in copied:
+                    location = self._locations.get(old.memory_id)
+                    if old.kind == TOMBSTONE:
+                        self._tombstones[old.memory_id] = (target_id, new.offset, new.size)
+                        target.live += new.size
+                    elif location is not None and (location.segment_id, location.offset) == (segment_id, old.offset):
+                        self._locations[old.memory_id] = location._replace(segment_id=target_id, offset=new.offset)
+                        target.live += new.size
+                    else:
+                        # 复制期间被更新或删除，新段中的副本是旧记录
+                        self._stale_puts.setdefault(old.memory_id, set()).add(target_id)
+                for segment in victims:
+                    del self._segments[segment.id]
+                    segment.close()
+                for segment_id, entries in footers.items():
+                    for entry in entries:
+                        if entry.kind == PUT:
+                            self._forget_stale(entry.memory_id, segment_id)
+            for segment in victims:
+                os.remove(segment.path)
+            reclaimed -= target.size
+            logging.info(f"Compacted {len(victims)} memory log segments into {target_id:08d}, "
+                         f"reclaimed {reclaimed} bytes")
+            return reclaimed
+
+    def segments(self) -> Iterator[dict]:
+        """各段的大小与垃圾比例，便于观察整理效果"""
+        with self._lock:
+            for segment in sorted(self._segments.values(), key=lambda s: s.id):
+                yield {"id": segment.id, "sealed": segment.sealed, "size": segment.size,
+                       "garbage_ratio": round(segment.garbage_ratio, 4)}
+
+    def close(self) -> None:
+        """停止后台整理并封存当前段"""
+        self._stop.set()
+        if self._compactor is not None:
+            self._compactor.join()
+        with self._lock:
+            if self._active.entries:
+                self._active.seal()
+            else:
+                self._active.close()
+                os.remove(self._active.path)
+                del self._segments[self._active.id]
+            for segment in self._segments.values():
+                segment.close()
+            self._segments.clear()
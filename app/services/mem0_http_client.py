@@ -0,0 +1,167 @@
+"""
+mem0 Platform原生异步客户端
+基于长连接的httpx.AsyncClient（连接池 + keep-alive + HTTP/2）
+"""
+import importlib.util
+import logging
+from typing import Optional
+
+import httpx
+
+from app.services.memory_records import NOT_FOUND
+from app.utils.exceptions import InvalidCursorException
+
+DEFAULT_BASE_URL = "https://api.mem0.ai"
+
+
+def _http2_available() -> bool:
+    """HTTP/2需要可选依赖h2"""
+    return importlib.util.find_spec("h2") is not None
+
+
+def is_page_number(value) -> bool:
+    """游标是否为合法页码（bool是int的子类，需排除）"""
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 1
+
+def page_from_response(data, page: int, page_size: int) -> dict:
+    """把mem0的分页响应（或不支持分页时的完整列表）转换为统一的分页结果"""
+    if isinstance(data, dict):
+        results = data.get("results", [])
+        has_more = bool(data.get("next"))
+        total = data.get("count")
+    else:
+        start = (page - 1) * page_size
+        results = data[start:start + page_size]
+        has_more = len(data) > start + page_size
+        total = len(data)
+    return {
+        "results": results,
+        "next_cursor": page + 1 if has_more else None,
+        "total": total
+    }
+
+
+class AsyncMem0Client:
+    """与MemoryClient接口一致的异步mem0客户端
+
+    连接在open()时创建、aclose()时释放，整个应用生命周期内复用同一个连接池。
+    """
+
+    def __init__(self, api_key: str, base_url: str = DEFAULT_BASE_URL, http2: bool = True,
+                 max_connections: int = 100, max_keepalive_connections: int = 20,
+                 keepalive_expiry: float = 30.0, timeout: float = 30.0,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.http2 = http2
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = timeout
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def open(self) -> None:
+        """创建共享连接池"""
+        if self._client is not None:
+            return
+        http2 = self.http2
+        if http2 and not _http2_available():
+            logging.warning("h2 not installed - mem0 HTTP client falling back to HTTP/1.1")
+            http2 = False
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={
+                "Authorization": f"Token {self.api_key}",
+                "Content-Type": "application/json"
+            },
+            http2=http2,
+            limits=self.limits,
+            timeout=self.timeout,
+            transport=self._transport
+        )
+        logging.info(f"mem0 HTTP client opened (base_url={self.base_url}, http2={http2})")
+
+    async def aclose(self) -> None:
+        """关闭连接池"""
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+            logging.info("mem0 HTTP client closed")
+
+    async def _request(self, method: str, path: str, **kwargs):
+        if self._client is None:
+            # 未经过应用启动钩子（脚本、测试）时按需创建
+            await self.open()
+        resp = await self._client.request(method, path, **kwargs)
+        resp.raise_for_status()
+        if not resp.content:
+            return {}
+        return resp.json()
+
+    async def add(self, messages, user_id, metadata=None):
+        data = await self._request("POST", "/v1/memories/", json={
+            "messages": messages,
+            "user_id": user_id,
+            "metadata": metadata or {}
+        })
+        # 平台返回事件列表，统一为带id的字典以兼容MemoryClient的用法
+        if isinstance(data, list):
+            return {"id": data[0].get("id") if data else None, "results": data}
+        return data
+
+    async def search(self, query, user_id, limit=10):
+        data = await self._request("POST", "/v1/memories/search/", json={
+            "query": query,
+            "user_id": user_id,
+            "limit": limit
+        })
+        if isinstance(data, dict):
+            return data.get("results", [])
+        return data
+
+    async def get_all(self, user_id):
+        data = await self._request("GET", "/v1/memories/", params={"user_id": user_id})
+        if isinstance(data, dict):
+            return data.get("results", [])
+        return data
+
+    async def list(self, user_id, limit=50, cursor=None):
+        """页码分页，cursor为页码"""
+        page = cursor or 1
+        if not is_page_number(page):
+            raise InvalidCursorException()
+        data = await self._request("GET", "/v1/memories/", params={
+            "user_id": user_id,
+            "page": page,
+            "page_size": limit
+        })
+        return page_from_response(data, page, limit)
+
+    async def get(self, memory_id):
+        try:
+            return await self._request("GET", f"/v1/memories/{memory_id}/")
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                return None
+            raise
+
+    async def update(self, memory_id, data):
+        """记忆不存在时与本地后端一致返回NOT_FOUND"""
+        try:
+            return await self._request("PUT", f"/v1/memories/{memory_id}/", json={"text": data})
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                return NOT_FOUND
+            raise
+
+    async def delete(self, memory_id):
+        """记忆不存在时与本地后端一致返回NOT_FOUND"""
+        try:
+            return await self._request("DELETE", f"/v1/memories/{memory_id}/")
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                return NOT_FOUND
+            raise
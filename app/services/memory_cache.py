@@ -0,0 +1,184 @@
+"""
+MemoryService的读缓存
+写操作经由MemoryService时同步失效或修补缓存（write-through）
+"""
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from app.utils.cache import LRUCache, normalize_text
+
+MAX_PAGES_PER_USER = 32
+
+
+class WriteClock:
+    """按用户记录最近一次写入的时间戳（全局递增的写序号），内存有上限
+
+    - now(): 读取前取当前序号，changed_since(user_id, stamp)判断之后该用户是否有写入
+    - 只保留最近写入的max_users个用户；被淘汰用户的时间戳并入下限floor，
+      之后查询任何未记录的用户都返回floor，最多把少量读取误判为“期间有写入”（不缓存/不合并），
+      不会漏判
+    - 不知道所属用户的写入把floor推进到当前序号，相当于所有用户都有写入
+    """
+
+    def __init__(self, max_users: int = 10000):
+        if max_users < 1:
+            raise ValueError("max_users must be >= 1")
+        self.max_users = max_users
+        self._clock = 0
+        self._floor = 0
+        self._last: "OrderedDict[str, int]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._last)
+
+    def now(self) -> int:
+        return self._clock
+
+    def last_write(self, user_id: str) -> int:
+        return max(self._last.get(user_id, 0), self._floor)
+
+    def changed_since(self, user_id: str, stamp: int) -> bool:
+        return self.last_write(user_id) > stamp
+
+    def written(self, user_id: Optional[str] = None) -> None:
+        self._clock += 1
+        if user_id is None:
+            self._floor = self._clock
+            self._last.clear()
+            return
+        self._last[user_id] = self._clock
+        self._last.move_to_end(user_id)
+        while len(self._last) > self.max_users:
+            _, stamp = self._last.popitem(last=False)
+            self._floor = max(self._floor, stamp)
+
+
+class _UserEntry:
+    __slots__ = ("memories", "pages")
+
+    def __init__(self):
+        self.memories: Optional[List[dict]] = None
+        self.pages: Dict[tuple, dict] = {}
+
+
+class MemoryListCache:
+    """按用户缓存记忆列表（get_all结果和分页结果）
+
+    - 用户数量受LRU上限约束，整用户淘汰
+    - 单用户记忆数超过max_user_memories时不缓存完整列表
+    - add使该用户缓存失效，update原地修补，delete移除条目并丢弃分页
+    - 读取前取写时钟（WriteClock），写入缓存时该用户在读取期间有写操作则不写入，
+      避免写操作之前开始的读取把旧列表写回缓存
+    """
+
+    def __init__(self, max_users: int = 1000, max_user_memories: int = 5000,
+                 ttl: Optional[float] = 60.0, max_tracked_writers: int = 10000):
+        self.max_user_memories = max_user_memories
+        self._users = LRUCache(max_size=max_users, ttl=ttl)
+        self._writes = WriteClock(max_users=max_tracked_writers)
+
+    def generation(self, user_id: str) -> int:
+        """在向后端读取前调用，结果传给set_all/set_page"""
+        return self._writes.now()
+
+    def _bump(self, user_id: Optional[str]) -> None:
+        self._writes.written(user_id)
+
+    def _entry(self, user_id: str, create: bool = False) -> Optional[_UserEntry]:
+        entry = self._users.get(user_id, count=False)
+        if entry is None and create:
+            entry = _UserEntry()
+            self._users.set(user_id, entry)
+        return entry
+
+    def get_all(self, user_id: str) -> Optional[List[dict]]:
+        entry = self._users.get(user_id)
+        if entry is None or entry.memories is None:
+            return None
+        return list(entry.memories)
+
+    def set_all(self, user_id: str, memories: List[dict], generation: Optional[int] = None) -> None:
+        if len(memories) > self.max_user_memories:
+            return
+        if generation is not None and self._writes.changed_since(user_id, generation):
+            return
+        self._entry(user_id, create=True).memories = list(memories)
+
+    def get_page(self, user_id: str, key: tuple) -> Optional[dict]:
+        entry = self._users.get(user_id)
+        if entry is None:
+            return None
+        page = entry.pages.get(key)
+        return dict(page, results=list(page["results"])) if page is not None else None
+
+    def set_page(self, user_id: str, key: tuple, page: dict, generation: Optional[int] = None) -> None:
+        if generation is not None and self._writes.changed_since(user_id, generation):
+            return
+        entry = self._entry(user_id, create=True)
+        if len(entry.pages) >= MAX_PAGES_PER_USER:
+            entry.pages.pop(next(iter(entry.pages)))
+        entry.pages[key] = dict(page, results=list(page["results"]))
+
+    def invalidate(self, user_id: str) -> None:
+        self._bump(user_id)
+        self._users.delete(user_id)
+
+    def _entries_for(self, user_id: Optional[str]):
+        if user_id is not None:
+            entry = self._entry(user_id)
+            return [entry] if entry is not None else []
+        # 调用方不知道所属用户时检查所有已缓存用户（数量受max_users约束）
+        return self._users.values()
+
+    def patch(self, memory_id: str, changes: dict, user_id: Optional[str] = None) -> None:
+        """更新后修补缓存中的记忆（替换为新字典，不修改已返回给调用方的对象）"""
+        self._bump(user_id)
+        for entry in self._entries_for(user_id):
+            lists = [entry.memories] if entry.memories is not None else []
+            lists.extend(page["results"] for page in entry.pages.values())
+            for memories in lists:
+                for i, memory in enumerate(memories):
+                    if memory.get("id") == memory_id:
+                        memories[i] = {**memory, **changes}
+
+    def remove(self, memory_id: str, user_id: Optional[str] = None) -> None:
+        """删除后移除缓存条目；分页的游标和总数会变化，直接丢弃"""
+        self._bump(user_id)
+        for entry in self._entries_for(user_id):
+            if entry.memories is not None:
+                entry.memories = [m for m in entry.memories if m.get("id") != memory_id]
+            entry.pages.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return self._users.stats()
+
+
+class SearchResultCache:
+    """搜索结果缓存，键为(用户, 规范化查询, limit)
+
+    键中带该用户最近一次写入的时间戳（WriteClock），写操作之后旧条目不会再被命中，
+    随LRU/TTL自然淘汰。写操作不知道所属用户时所有用户的时间戳都推进。
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: Optional[float] = 30.0,
+                 max_tracked_writers: int = 10000):
+        self._results = LRUCache(max_size=max_entries, ttl=ttl)
+        self._writes = WriteClock(max_users=max_tracked_writers)
+
+    def key(self, user_id: str, query: str, limit: int, extra: tuple = ()) -> tuple:
+        """在发起搜索前取键，保证写操作之后才完成的旧搜索不会写入新时间戳下的键"""
+        return (user_id, normalize_text(query, casefold=True), limit, extra,
+                self._writes.last_write(user_id))
+
+    def get(self, key: tuple) -> Optional[List[dict]]:
+        results = self._results.get(key)
+        return list(results) if results is not None else None
+
+    def set(self, key: tuple, results: List[dict]) -> None:
+        self._results.set(key, list(results))
+
+    def bump(self, user_id: Optional[str] = None) -> None:
+        self._writes.written(user_id)
+
+    def stats(self) -> Dict[str, int]:
+        return self._results.stats()
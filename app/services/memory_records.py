@@ -0,0 +1,13 @@
+"""
+记忆后端共用的记录格式
+- NOT_FOUND: update/delete时记忆不存在（或不属于该用户）的返回值，与mem0 MemoryClient一致，
+  MemoryService据此不修改缓存，路由据此返回404
+- public_memory: 去掉以下划线开头的内部字段（如写入序号_seq）
+"""
+
+NOT_FOUND = {"error": "Memory not found"}
+
+
+def public_memory(memory: dict) -> dict:
+    """返回给调用方的记忆副本，不含内部字段"""
+    return {key: value for key, value in memory.items() if not key.startswith("_")}
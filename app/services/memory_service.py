@@ -1,5 +1,18 @@
+import asyncio
+import base64
+import binascii
+import inspect
+import json
 import logging
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional
 from app.config import settings
+from app.services.hybrid_search import fuse, matches_filters
+from app.services.mem0_http_client import AsyncMem0Client, is_page_number, page_from_response
+from app.services.memory_cache import MemoryListCache, SearchResultCache, WriteClock
+from app.utils.executor import BlockingExecutor
+from app.utils.singleflight import SingleFlight
+from app.utils.exceptions import InvalidCursorException
 
 try:
     from mem0 import MemoryClient
@@ -8,110 +21,393 @@ except ImportError:
         from mem0ai import MemoryClient
     except ImportError:
         # Demo模式的Mock客户端
-        class MemoryClient:
-            def __init__(self, api_key):
-                self.api_key = api_key
-                self._memories = {}
-                logging.warning("Using demo MemoryClient - mem0 not available")
-            
-            def add(self, messages, user_id, metadata=None):
-                memory_id = f"demo-memory-{len(self._memories)}"
-                content = messages[0]["content"] if messages else ""
-                self._memories[memory_id] = {
-                    "id": memory_id,
-                    "memory": content,
-                    "user_id": user_id,
-                    "metadata": metadata or {},
-                    "created_at": "2024-12-01T12:00:00Z"
-                }
-                return {"id": memory_id}
-            
-            def search(self, query, user_id, limit=10):
-                results = []
-                for mem_id, mem_data in self._memories.items():
-                    if (mem_data["user_id"] == user_id and 
-                        query.lower() in mem_data["memory"].lower()):
-                        results.append(mem_data)
-                return results[:limit]
-            
-            def get_all(self, user_id):
-                return [mem for mem in self._memories.values() 
-                       if mem["user_id"] == user_id]
-            
-            def update(self, memory_id, data):
-                if memory_id in self._memories:
-                    self._memories[memory_id]["memory"] = data
-                    return {"id": memory_id}
-                return {"error": "Memory not found"}
-            
-            def delete(self, memory_id):
-                if memory_id in self._memories:
-                    del self._memories[memory_id]
-                    return {"deleted": True}
-                return {"error": "Memory not found"}
+        from app.services.demo_memory_client import DemoMemoryClient as MemoryClient
+
+def encode_cursor(position) -> Optional[str]:
+    """把后端的分页位置编码为不透明游标"""
+    if position is None:
+        return None
+    raw = json.dumps({"p": position}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: Optional[str]):
+    """解码游标，格式错误时抛出InvalidCursorException；游标内容的类型由各后端校验"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        return json.loads(raw)["p"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise InvalidCursorException()
+
+def _is_error(result) -> bool:
+    """demo客户端以{"error": ...}表示失败而不抛异常"""
+    return isinstance(result, dict) and "error" in result
+
+def create_memory_client():
+    """根据配置创建记忆后端客户端"""
+    if settings.memory_backend == "mem0_http":
+        return AsyncMem0Client(
+            api_key=settings.mem0_api_key,
+            base_url=settings.mem0_base_url,
+            http2=settings.mem0_http2,
+            max_connections=settings.mem0_max_connections,
+            max_keepalive_connections=settings.mem0_max_keepalive_connections,
+            keepalive_expiry=settings.mem0_keepalive_expiry,
+            timeout=settings.mem0_call_timeout
+        )
+    if settings.memory_backend == "local_vector":
+        from app.services.embedding_service import get_embedding_service
+        from app.services.vector_store import VectorMemoryClient
+        embeddings = get_embedding_service()
+        return VectorMemoryClient(
+            api_key="local",
+            dim=embeddings.dim,
+            mode=settings.vector_index_mode,
+            ivf_min_vectors=settings.vector_ivf_min_vectors,
+            nprobe=settings.vector_ivf_nprobe,
+            embed=embeddings.embed_batch
+        )
+    if settings.memory_backend == "sqlite":
+        from app.services.sqlite_memory_store import SQLiteMemoryClient
+        return SQLiteMemoryClient(
+            path=settings.memory_sqlite_path,
+            busy_timeout=settings.memory_sqlite_busy_timeout
+        )
+    if settings.memory_backend == "log":
+        from app.services.log_memory_store import LogMemoryClient
+        return LogMemoryClient(
+            directory=settings.memory_log_dir,
+            segment_max_bytes=settings.memory_log_segment_max_bytes,
+            compact_interval=settings.memory_log_compact_interval,
+            compact_garbage_ratio=settings.memory_log_compact_garbage_ratio,
+            fsync=settings.memory_log_fsync
+        )
+    if settings.memory_backend != "mem0":
+        logging.warning(f"Unknown memory_backend {settings.memory_backend!r}, using mem0")
+    try:
+        return MemoryClient(api_key=settings.mem0_api_key)
+    except Exception as e:
+        logging.warning(f"Failed to initialize mem0 client: {e}")
+        return MemoryClient(api_key="demo")
+
+def create_list_cache() -> Optional[MemoryListCache]:
+    """根据配置创建记忆列表缓存"""
+    if not settings.memory_list_cache_enabled:
+        return None
+    return MemoryListCache(
+        max_users=settings.memory_list_cache_max_users,
+        max_user_memories=settings.memory_list_cache_max_user_memories,
+        ttl=settings.memory_list_cache_ttl
+    )
+
+def create_search_cache() -> Optional[SearchResultCache]:
+    """根据配置创建搜索结果缓存"""
+    if not settings.search_cache_enabled:
+        return None
+    return SearchResultCache(
+        max_entries=settings.search_cache_max_entries,
+        ttl=settings.search_cache_ttl
+    )
 
 class MemoryService:
-    def __init__(self):
-        try:
-            self.client = MemoryClient(api_key=settings.mem0_api_key)
-        except Exception as e:
-            logging.warning(f"Failed to initialize mem0 client: {e}")
-            self.client = MemoryClient(api_key="demo")
+    def __init__(self, client=None, list_cache: Optional[MemoryListCache] = None,
+                 search_cache: Optional[SearchResultCache] = None):
+        self.client = client if client is not None else create_memory_client()
+        self.list_cache = list_cache if list_cache is not None else create_list_cache()
+        self.search_cache = search_cache if search_cache is not None else create_search_cache()
+        # 合并并发的相同读请求（get_all/search），None表示关闭
+        self.singleflight = SingleFlight() if settings.memory_singleflight_enabled else None
+        # 每个用户最近一次写入的时间戳，写入后发起的读请求不会合并到写入前的在途请求上
+        self._writes = WriteClock()
+        # 同步客户端（如mem0 SDK）的调用都通过有界线程池执行
+        self.executor = BlockingExecutor(
+            max_workers=settings.mem0_max_workers,
+            max_queue=settings.mem0_max_queue,
+            timeout=settings.mem0_call_timeout,
+            name="mem0"
+        )
+
+    async def _call(self, method: str, **kwargs):
+        """调用客户端方法：异步客户端直接await，同步客户端放到线程池执行"""
+        func = getattr(self.client, method)
+        if inspect.iscoroutinefunction(func):
+            return await func(**kwargs)
+        return await self.executor.run(func, **kwargs)
+
+    async def startup(self):
+        """应用启动时建立客户端连接池"""
+        if hasattr(self.client, "open"):
+            await self.client.open()
+
+    async def shutdown(self):
+        """释放线程池和客户端连接"""
+        if hasattr(self.client, "aclose"):
+            await self.client.aclose()
+        elif hasattr(self.client, "close"):
+            self.client.close()
+        self.executor.shutdown()
+
+    async def _read_once(self, user_id: str, key: tuple, func):
+        """相同的并发读请求只调用一次后端"""
+        if self.singleflight is None:
+            return await func()
+        return await self.singleflight.do((user_id, self._writes.last_write(user_id)) + key, func)
+
+    def _written(self, user_id: Optional[str]) -> None:
+        """记录一次写入；不知道所属用户时视为所有用户都有写入"""
+        if self.singleflight is None:
+            return
+        self._writes.written(user_id)
 
     async def add_memory(self, content: str, user_id: str, metadata: dict = None) -> dict:
         """添加记忆到mem0"""
         try:
             messages = [{"role": "user", "content": content}]
-            result = self.client.add(
+            result = await self._call(
+                "add",
                 messages=messages,
                 user_id=user_id,
                 metadata=metadata or {}
             )
             logging.info(f"Memory added successfully for user {user_id}")
+            self._written(user_id)
+            if self.list_cache is not None:
+                self.list_cache.invalidate(user_id)
+            if self.search_cache is not None:
+                self.search_cache.bump(user_id)
             return result
         except Exception as e:
             logging.error(f"mem0 add_memory error: {e}")
             raise
 
-    async def search_memories(self, query: str, user_id: str, limit: int = 10) -> list:
-        """搜索用户记忆"""
+    async def add_memories(self, items: List[dict], user_id: str,
+                           concurrency: Optional[int] = None) -> List[dict]:
+        """批量添加记忆，以有界并发调用add_memory
+
+        items为[{"content", "metadata"}]，返回与items顺序一致的逐条结果：
+        {"status": "created", "memory_id"} 或 {"status": "error", "error"}
+        """
+        semaphore = asyncio.Semaphore(concurrency or settings.memory_batch_concurrency)
+
+        async def add_one(item: dict) -> dict:
+            async with semaphore:
+                try:
+                    result = await self.add_memory(item["content"], user_id, item.get("metadata"))
+                except Exception as e:
+                    return {"status": "error", "error": str(e)}
+            if _is_error(result):
+                return {"status": "error", "error": result["error"]}
+            memory_id = result.get("id") if isinstance(result, dict) else None
+            return {"status": "created", "memory_id": memory_id}
+
+        return await asyncio.gather(*(add_one(item) for item in items))
+
+    # 检索模式 -> 客户端方法；客户端未实现专用方法时退回search
+    SEARCH_METHODS = {"keyword": "keyword_search", "vector": "vector_search"}
+
+    def _search_method(self, mode: str) -> str:
+        method = self.SEARCH_METHODS.get(mode)
+        if method is not None and hasattr(self.client, method):
+            return method
+        if method is not None:
+            logging.debug(f"Search mode {mode!r} not supported by backend, using default search")
+        return "search"
+
+    async def search_memories(self, query: str, user_id: str, limit: int = 10,
+                              mode: str = "default", fusion: str = "rrf",
+                              categories: Optional[List[str]] = None,
+                              metadata_filter: Optional[Dict[str, Any]] = None) -> list:
+        """搜索用户记忆
+
+        - mode: default（后端默认检索）| keyword | vector | hybrid（关键词与向量并发检索后融合）
+        - fusion: 混合检索的融合方式 rrf | weighted，结果的scores给出各来源的原始得分
+        - categories/metadata_filter: 过滤条件
+        """
+        extra = (mode, fusion if mode == "hybrid" else None, tuple(sorted(categories or ())),
+                 json.dumps(metadata_filter or {}, sort_keys=True, ensure_ascii=False))
+        cache_key = None
+        if self.search_cache is not None:
+            cache_key = self.search_cache.key(user_id, query, limit, extra=extra)
+            cached = self.search_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        # 并发的相同检索共享一次后端调用
+        return await self._read_once(user_id, ("search", query, limit) + extra, lambda: self._search(
+            query, user_id, limit, mode, fusion, categories, metadata_filter, cache_key
+        ))
+
+    async def _search(self, query: str, user_id: str, limit: int, mode: str, fusion: str,
+                      categories: Optional[List[str]], metadata_filter: Optional[Dict[str, Any]],
+                      cache_key) -> list:
+        """执行检索并写入搜索缓存"""
+        filtered = bool(categories or metadata_filter)
+        pushdown = filtered and getattr(self.client, "supports_filters", False)
+        # 后端支持时过滤下推到二级索引；否则在检索之后过滤，多取一些候选避免过滤后结果不足
+        fetch = limit * settings.search_filter_candidate_multiplier if filtered and not pushdown else limit
+        filters = {"categories": categories, "metadata_filter": metadata_filter} if pushdown else {}
         try:
-            results = self.client.search(
-                query=query,
-                user_id=user_id,
-                limit=limit
-            )
+            sources = {"keyword": self._search_method("keyword"), "vector": self._search_method("vector")}
+            if mode == "hybrid" and "search" not in sources.values():
+                results = await self._hybrid_search(query, user_id, limit, fetch, fusion, sources,
+                                                    categories, metadata_filter, filters)
+            else:
+                results = await self._call(self._search_method(mode), query=query, user_id=user_id,
+                                           limit=fetch, **filters)
+                if filtered and not pushdown:
+                    results = [m for m in results if matches_filters(m, categories, metadata_filter)]
+                results = results[:limit]
             logging.info(f"Search completed for user {user_id}, found {len(results)} results")
+            if cache_key is not None:
+                self.search_cache.set(cache_key, results)
             return results
         except Exception as e:
             logging.error(f"mem0 search_memories error: {e}")
             raise
 
+    async def _hybrid_search(self, query: str, user_id: str, limit: int, fetch: int, fusion: str,
+                             sources: Dict[str, str], categories, metadata_filter,
+                             filters: Dict[str, Any]) -> list:
+        """并发执行各来源检索，过滤后融合排序；filters非空表示过滤已下推到后端"""
+        names = list(sources)
+        responses = await asyncio.gather(*(
+            self._call(sources[name], query=query, user_id=user_id, limit=fetch, **filters) for name in names
+        ))
+        memories: Dict[str, dict] = {}
+        ranked: Dict[str, list] = {}
+        for name, results in zip(names, responses):
+            ranked[name] = []
+            for memory in results:
+                if not filters and not matches_filters(memory, categories, metadata_filter):
+                    continue
+                memories.setdefault(memory["id"], memory)
+                ranked[name].append((memory["id"], memory.get("score") or 0.0))
+        weights = {"keyword": settings.search_keyword_weight, "vector": settings.search_vector_weight}
+        fused = fuse(ranked, fusion, rrf_k=settings.search_rrf_k, weights=weights)
+        source_scores = {name: dict(results) for name, results in ranked.items()}
+        return [
+            dict(memories[memory_id], score=round(score, 6), scores={
+                name: scores[memory_id] for name, scores in source_scores.items() if memory_id in scores
+            })
+            for memory_id, score in fused[:limit]
+        ]
+
     async def get_all_memories(self, user_id: str) -> list:
         """获取用户所有记忆"""
+        if self.list_cache is not None:
+            cached = self.list_cache.get_all(user_id)
+            if cached is not None:
+                return cached
+        # 读取前取写代数，读取期间发生写操作时不写回缓存
+        generation = self.list_cache.generation(user_id) if self.list_cache is not None else None
         try:
-            memories = self.client.get_all(user_id=user_id)
+            memories = await self._read_once(user_id, ("get_all",), lambda: self._call("get_all", user_id=user_id))
             logging.info(f"Retrieved {len(memories)} memories for user {user_id}")
+            if self.list_cache is not None:
+                self.list_cache.set_all(user_id, memories, generation=generation)
             return memories
         except Exception as e:
             logging.error(f"mem0 get_all_memories error: {e}")
             raise
 
-    async def update_memory(self, memory_id: str, data: str) -> dict:
-        """更新记忆"""
+    async def get_memory(self, memory_id: str) -> dict:
+        """获取单条记忆，不存在时返回None"""
+        try:
+            memory = await self._call("get", memory_id=memory_id)
+            return memory or None
+        except Exception as e:
+            logging.error(f"mem0 get_memory error: {e}")
+            raise
+
+    async def list_memories(self, user_id: str, limit: int = 50, cursor: Optional[str] = None,
+                            use_cache: bool = True) -> dict:
+        """游标分页获取用户记忆，每页只取limit条
+
+        返回 {"results", "next_cursor", "has_more", "total"}；
+        use_cache=False用于导出等一次性遍历，不读写分页缓存
+        """
+        position = decode_cursor(cursor)
+        cache_key = (limit, cursor)
+        use_cache = use_cache and self.list_cache is not None
+        if use_cache:
+            cached = self.list_cache.get_page(user_id, cache_key)
+            if cached is not None:
+                return cached
+        generation = self.list_cache.generation(user_id) if use_cache else None
+        try:
+            if hasattr(self.client, "list"):
+                page = await self._call("list", user_id=user_id, limit=limit, cursor=position)
+            else:
+                # mem0 SDK使用页码分页
+                page_number = position or 1
+                if not is_page_number(page_number):
+                    raise InvalidCursorException()
+                data = await self._call("get_all", user_id=user_id, page=page_number, page_size=limit)
+                page = page_from_response(data, page_number, limit)
+            logging.info(f"Listed {len(page['results'])} memories for user {user_id}")
+        except Exception as e:
+            logging.error(f"mem0 list_memories error: {e}")
+            raise
+        result = {
+            "results": page["results"],
+            "next_cursor": encode_cursor(page["next_cursor"]),
+            "has_more": page["next_cursor"] is not None,
+            "total": page.get("total")
+        }
+        if use_cache:
+            self.list_cache.set_page(user_id, cache_key, result, generation=generation)
+        return result
+
+    async def iter_memories(self, user_id: str, page_size: int = 200,
+                            first_page: Optional[dict] = None) -> AsyncIterator[dict]:
+        """逐页遍历用户的全部记忆，内存中最多只保留一页
+
+        first_page为已取到的首页（调用方用它提前暴露后端错误）
+        """
+        page = first_page or await self.list_memories(user_id, limit=page_size, use_cache=False)
+        while True:
+            for memory in page["results"]:
+                yield memory
+            if not page["has_more"]:
+                return
+            page = await self.list_memories(user_id, limit=page_size, cursor=page["next_cursor"],
+                                            use_cache=False)
+
+    def _owner(self, user_id: Optional[str]) -> dict:
+        """客户端支持归属校验时把user_id一并传入，记忆不属于该用户时按不存在处理"""
+        if user_id is not None and getattr(self.client, "enforces_ownership", False):
+            return {"user_id": user_id}
+        return {}
+
+    async def update_memory(self, memory_id: str, data: str, user_id: Optional[str] = None) -> dict:
+        """更新记忆；传入user_id可避免在所有已缓存用户中查找"""
         try:
-            result = self.client.update(memory_id=memory_id, data=data)
+            result = await self._call("update", memory_id=memory_id, data=data, **self._owner(user_id))
             logging.info(f"Memory {memory_id} updated successfully")
+            self._written(user_id)
+            if self.list_cache is not None and not _is_error(result):
+                self.list_cache.patch(
+                    memory_id,
+                    {"memory": data, "updated_at": datetime.now(timezone.utc).isoformat()},
+                    user_id=user_id
+                )
+            if self.search_cache is not None and not _is_error(result):
+                self.search_cache.bump(user_id)
             return result
         except Exception as e:
             logging.error(f"mem0 update_memory error: {e}")
             raise
 
-    async def delete_memory(self, memory_id: str) -> dict:
-        """删除记忆"""
+    async def delete_memory(self, memory_id: str, user_id: Optional[str] = None) -> dict:
+        """删除记忆；传入user_id可避免在所有已缓存用户中查找"""
         try:
-            result = self.client.delete(memory_id=memory_id)
+            result = await self._call("delete", memory_id=memory_id, **self._owner(user_id))
             logging.info(f"Memory {memory_id} deleted successfully")
+            self._written(user_id)
+            if self.list_cache is not None and not _is_error(result):
+                self.list_cache.remove(memory_id, user_id=user_id)
+            if self.search_cache is not None and not _is_error(result):
+                self.search_cache.bump(user_id)
             return result
         except Exception as e:
             logging.error(f"mem0 delete_memory error: {e}")
@@ -0,0 +1,199 @@
+"""
+本地全文检索
+- tokenize: 中日韩文字切分为二元组（bigram），其他文字按词切分
+- BM25Index: 倒排索引 + BM25打分
+- bm25_rank: 对外部检索出的候选文档按给定语料统计打分（SQLite后端使用）
+- FilterIndex: 分类/元数据二级索引，用于在打分前过滤
+"""
+import heapq
+import json
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# 中日韩统一表意文字（含扩展A、兼容区）、平假名/片假名、韩文音节
+_CJK = "㐀-䶿一-鿿豈-﫿぀-ヿ가-힯"
+_TOKEN_RE = re.compile(f"[{_CJK}]+|[^\\W_{_CJK}]+")
+_CJK_RE = re.compile(f"[{_CJK}]")
+
+
+def tokenize(text: str, for_query: bool = False) -> List[str]:
+    """切分文本为检索词
+
+    文档侧对中日韩文字同时产出单字和二元组，查询侧只产出二元组
+    （单字查询除外），这样单字查询也能命中，而多字查询按二元组精确匹配。
+    """
+    tokens = []
+    text = unicodedata.normalize("NFKC", text).casefold()
+    for run in _TOKEN_RE.findall(text):
+        if not _CJK_RE.match(run):
+            tokens.append(run)
+            continue
+        if len(run) == 1:
+            tokens.append(run)
+            continue
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        if not for_query:
+            tokens.extend(run)
+    return tokens
+
+
+def _idf(n_docs: int, df: int) -> float:
+    return math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+
+def bm25_rank(query: str, documents: Dict[str, str], n_docs: int, total_length: int, limit: int = 10,
+              k1: float = 1.2, b: float = 0.75) -> List[Tuple[str, float]]:
+    """按BM25给documents打分，与BM25Index的得分一致
+
+    documents须是语料中包含至少一个查询词的全部文档（文档频率由其求出），
+    n_docs/total_length为整个语料的文档数和词数
+    """
+    if n_docs <= 0 or limit <= 0 or not documents:
+        return []
+    avg_length = total_length / n_docs
+    doc_terms = {doc_id: Counter(tokenize(text)) for doc_id, text in documents.items()}
+    scores: Dict[str, float] = defaultdict(float)
+    for term, qtf in Counter(tokenize(query, for_query=True)).items():
+        matched = [(doc_id, terms) for doc_id, terms in doc_terms.items() if term in terms]
+        if not matched:
+            continue
+        idf = _idf(n_docs, len(matched))
+        for doc_id, terms in matched:
+            tf = terms[term]
+            norm = tf + k1 * (1 - b + b * sum(terms.values()) / avg_length)
+            scores[doc_id] += qtf * idf * tf * (k1 + 1) / norm
+    return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+
+
+class BM25Index:
+    """单用户的倒排索引，支持增量添加/删除文档"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._doc_terms: Dict[str, Counter] = {}
+        self._doc_length: Dict[str, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._doc_terms
+
+    def add(self, doc_id: str, text: str) -> None:
+        """索引文档，已存在时替换"""
+        if doc_id in self._doc_terms:
+            self.remove(doc_id)
+        terms = Counter(tokenize(text))
+        self._doc_terms[doc_id] = terms
+        self._doc_length[doc_id] = sum(terms.values())
+        self._total_length += self._doc_length[doc_id]
+        for term, tf in terms.items():
+            self._postings[term][doc_id] = tf
+
+    def remove(self, doc_id: str) -> None:
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self._total_length -= self._doc_length.pop(doc_id)
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+
+    def search(self, query: str, limit: int = 10,
+               candidates: Optional[Set[str]] = None) -> List[Tuple[str, float]]:
+        """返回按BM25得分降序的(doc_id, score)；candidates限定可返回的文档"""
+        n_docs = len(self._doc_terms)
+        if n_docs == 0 or limit <= 0:
+            return []
+        avg_length = self._total_length / n_docs
+        scores: Dict[str, float] = defaultdict(float)
+        for term, qtf in Counter(tokenize(query, for_query=True)).items():
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = _idf(n_docs, len(postings))
+            for doc_id in self._iter_candidates(postings, candidates):
+                tf = postings[doc_id]
+                length = self._doc_length[doc_id]
+                norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                scores[doc_id] += qtf * idf * tf * (self.k1 + 1) / norm
+        return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+
+    @staticmethod
+    def _iter_candidates(postings: Dict[str, int], candidates: Optional[Set[str]]) -> Iterable[str]:
+        if candidates is None:
+            return postings.keys()
+        # 从较小的集合一侧求交集
+        if len(candidates) < len(postings):
+            return [doc_id for doc_id in candidates if doc_id in postings]
+        return [doc_id for doc_id in postings if doc_id in candidates]
+
+
+def _filter_keys(value) -> List[str]:
+    """元数据值的索引键；列表值同时按整体和每个元素索引，与matches_filters的包含语义一致"""
+    keys = [json.dumps(value, sort_keys=True, ensure_ascii=False)]
+    if isinstance(value, list):
+        keys.extend(json.dumps(item, sort_keys=True, ensure_ascii=False) for item in value)
+    return keys
+
+
+class FilterIndex:
+    """单用户的二级索引：分类 -> 文档ID集合，(元数据键, 值) -> 文档ID集合
+
+    检索前先由过滤条件求出候选集，再只对候选打分。
+    """
+
+    def __init__(self):
+        self._categories: Dict[str, Set[str]] = defaultdict(set)
+        self._metadata: Dict[Tuple[str, str], Set[str]] = defaultdict(set)
+        self._doc_keys: Dict[str, Tuple[List[str], List[Tuple[str, str]]]] = {}
+
+    def add(self, doc_id: str, categories: Iterable[str], metadata: Optional[dict]) -> None:
+        if doc_id in self._doc_keys:
+            self.remove(doc_id)
+        category_keys = list(dict.fromkeys(categories))
+        metadata_keys = [(key, value_key) for key, value in (metadata or {}).items()
+                         for value_key in _filter_keys(value)]
+        for category in category_keys:
+            self._categories[category].add(doc_id)
+        for key in metadata_keys:
+            self._metadata[key].add(doc_id)
+        self._doc_keys[doc_id] = (category_keys, metadata_keys)
+
+    def remove(self, doc_id: str) -> None:
+        keys = self._doc_keys.pop(doc_id, None)
+        if keys is None:
+            return
+        for index, doc_keys in zip((self._categories, self._metadata), keys):
+            for key in doc_keys:
+                ids = index[key]
+                ids.discard(doc_id)
+                if not ids:
+                    del index[key]
+
+    def candidates(self, categories: Optional[Iterable[str]] = None,
+                   metadata_filter: Optional[dict] = None) -> Optional[Set[str]]:
+        """返回满足条件的文档ID集合；没有过滤条件时返回None"""
+        groups = []
+        if categories:
+            groups.append(set().union(*(self._categories.get(c, ()) for c in categories)))
+        for key, value in (metadata_filter or {}).items():
+            groups.append(self._metadata.get((key, _filter_keys(value)[0]), set()))
+        if not groups:
+            return None
+        # 从最小的集合开始求交集
+        groups.sort(key=len)
+        result = set(groups[0])
+        for group in groups[1:]:
+            result &= group
+            if not result:
+                break
+        return result
@@ -0,0 +1,245 @@
+"""
+基于SQLite的持久化本地记忆后端
+- WAL模式：读不阻塞写，写入只追加到WAL文件
+- FTS5全文检索：索引的是tokenize()的输出（中日韩二元组），与内存BM25索引切词一致；
+  用户标记列参与匹配，检索只扫描该用户的倒排表。FTS5的bm25()使用全表（所有用户）的统计，
+  因此只用FTS5取出该用户的候选，再用该用户的文档数和词数（user_stats表）按BM25打分，
+  得分与内存BM25索引一致，不受其他用户数据影响
+- (user_id, created_at, seq)索引支撑按用户的游标分页和计数
+- 每个线程一个连接，SQL语句为模块常量，由sqlite3的语句缓存复用预编译结果
+
+接口与DemoMemoryClient一致，可通过memory_backend=sqlite启用。
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import List, Tuple
+
+from app.services.memory_records import NOT_FOUND
+from app.services.search_index import bm25_rank, tokenize
+from app.utils.exceptions import InvalidCursorException
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS memories ("
+    "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+    "id TEXT NOT NULL UNIQUE, "
+    "user_id TEXT NOT NULL, "
+    "memory TEXT NOT NULL, "
+    "metadata TEXT NOT NULL, "
+    "created_at TEXT NOT NULL, "
+    "updated_at TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_memories_user_created ON memories (user_id, created_at, seq)",
+    # 无内容FTS表：只存倒排索引，删除时需提供原始列值；ascii分词器只按空白等ASCII符号切分，
+    # 保持tokenize()产出的词不被再次拆分
+    "CREATE VIRTUAL TABLE IF NOT EXISTS memories_fts USING fts5("
+    "owner, terms, content='', tokenize='ascii')",
+    # 每个用户的文档数和检索词总数，用于BM25的IDF和平均文档长度
+    "CREATE TABLE IF NOT EXISTS user_stats ("
+    "user_id TEXT PRIMARY KEY, docs INTEGER NOT NULL, terms INTEGER NOT NULL)",
+)
+
+SELECT_COLUMNS = "id, user_id, memory, metadata, created_at, updated_at"
+INSERT_MEMORY = ("INSERT INTO memories (id, user_id, memory, metadata, created_at, updated_at) "
+                 "VALUES (?, ?, ?, ?, ?, ?)")
+INSERT_FTS = "INSERT INTO memories_fts (rowid, owner, terms) VALUES (?, ?, ?)"
+DELETE_FTS = "INSERT INTO memories_fts (memories_fts, rowid, owner, terms) VALUES ('delete', ?, ?, ?)"
+SELECT_BY_ID = f"SELECT {SELECT_COLUMNS} FROM memories WHERE id = ?"
+SELECT_FOR_WRITE = "SELECT seq, user_id, memory FROM memories WHERE id = ?"
+UPDATE_MEMORY = "UPDATE memories SET memory = ?, updated_at = ? WHERE seq = ?"
+DELETE_MEMORY = "DELETE FROM memories WHERE seq = ?"
+SELECT_USER = f"SELECT {SELECT_COLUMNS} FROM memories WHERE user_id = ? ORDER BY created_at, seq"
+SELECT_PAGE_FIRST = (f"SELECT {SELECT_COLUMNS}, seq FROM memories WHERE user_id = ? "
+                     "ORDER BY created_at, seq LIMIT ?")
+SELECT_PAGE_AFTER = (f"SELECT {SELECT_COLUMNS}, seq FROM memories WHERE user_id = ? "
+                     "AND (created_at, seq) > (?, ?) ORDER BY created_at, seq LIMIT ?")
+COUNT_USER = "SELECT COUNT(*) FROM memories WHERE user_id = ?"
+MATCH = ("SELECT m.id, m.user_id, m.memory, m.metadata, m.created_at, m.updated_at "
+         "FROM memories_fts JOIN memories m ON m.seq = memories_fts.rowid WHERE memories_fts MATCH ?")
+SELECT_STATS = "SELECT docs, terms FROM user_stats WHERE user_id = ?"
+UPDATE_STATS = ("INSERT INTO user_stats (user_id, docs, terms) VALUES (?, ?, ?) ON CONFLICT(user_id) "
+                "DO UPDATE SET docs = docs + excluded.docs, terms = terms + excluded.terms")
+
+
+def _owner_token(user_id: str) -> str:
+    """用户标记词，只含字母数字，不会被ascii分词器拆开"""
+    return "u" + hashlib.sha1(user_id.encode("utf-8")).hexdigest()
+
+
+def _terms(text: str) -> Tuple[str, int]:
+    """FTS列内容和检索词数"""
+    tokens = tokenize(text)
+    return " ".join(tokens), len(tokens)
+
+
+def _quote(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _row_to_memory(row) -> dict:
+    return {
+        "id": row[0],
+        "memory": row[2],
+        "user_id": row[1],
+        "metadata": json.loads(row[3]),
+        "created_at": row[4],
+        "updated_at": row[5]
+    }
+
+
+class SQLiteMemoryClient:
+    # 过滤条件由MemoryService在检索后处理
+    supports_filters = False
+    # update/delete接受user_id，记忆不属于该用户时按不存在处理
+    enforces_ownership = True
+
+    def __init__(self, path: str, busy_timeout: float = 5.0, cached_statements: int = 64):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        with self._write() as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+            self._backfill_stats(conn)
+        logging.info(f"SQLite memory store opened at {path}")
+
+    @staticmethod
+    def _backfill_stats(conn: sqlite3.Connection) -> None:
+        """旧版本创建的库没有user_stats，打开时统计一次"""
+        if conn.execute("SELECT 1 FROM user_stats LIMIT 1").fetchone() is not None:
+            return
+        stats = {}
+        for user_id, memory in conn.execute("SELECT user_id, memory FROM memories"):
+            docs, terms = stats.get(user_id, (0, 0))
+            stats[user_id] = (docs + 1, terms + _terms(memory)[1])
+        conn.executemany(UPDATE_STATS, [(user_id, docs, terms) for user_id, (docs, terms) in stats.items()])
+
+    def _conn(self) -> sqlite3.Connection:
+        """当前线程的连接，首次使用时创建"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # 手动管理事务（isolation_level=None），写事务用BEGIN IMMEDIATE避免锁升级死锁
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                   check_same_thread=False, cached_statements=self.cached_statements)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def _write(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def add(self, messages, user_id, metadata=None):
+        memory_id = str(uuid.uuid4())
+        content = messages[0]["content"] if messages else ""
+        now = datetime.now(timezone.utc).isoformat()
+        terms, length = _terms(content)
+        with self._write() as conn:
+            cursor = conn.execute(INSERT_MEMORY, (
+                memory_id, user_id, content, json.dumps(metadata or {}, ensure_ascii=False), now, now
+            ))
+            conn.execute(INSERT_FTS, (cursor.lastrowid, _owner_token(user_id), terms))
+            conn.execute(UPDATE_STATS, (user_id, 1, length))
+        return {"id": memory_id}
+
+    def search(self, query, user_id, limit=10):
+        return self.keyword_search(query, user_id, limit=limit)
+
+    def keyword_search(self, query, user_id, limit=10):
+        """FTS5取出该用户包含任一查询词的记忆，按该用户的语料统计计算BM25得分（越大越相关）"""
+        terms = list(dict.fromkeys(tokenize(query, for_query=True)))
+        if not terms:
+            return []
+        expression = (f"owner : {_quote(_owner_token(user_id))} AND "
+                      f"terms : ({' OR '.join(_quote(term) for term in terms)})")
+        conn = self._conn()
+        rows = {row[0]: row for row in conn.execute(MATCH, (expression,))}
+        if not rows:
+            return []
+        docs, total_terms = conn.execute(SELECT_STATS, (user_id,)).fetchone()
+        ranked = bm25_rank(query, {memory_id: row[2] for memory_id, row in rows.items()},
+                           docs, total_terms, limit=limit)
+        return [dict(_row_to_memory(rows[memory_id]), score=round(score, 6)) for memory_id, score in ranked]
+
+    def get_all(self, user_id):
+        return [_row_to_memory(row) for row in self._conn().execute(SELECT_USER, (user_id,))]
+
+    def list(self, user_id, limit=50, cursor=None):
+        """按创建时间分页，cursor为上一页最后一条的[created_at, seq]
+
+        total只在首页计算（COUNT需扫描该用户的全部索引项），后续页为None
+        """
+        conn = self._conn()
+        if cursor is None:
+            rows = conn.execute(SELECT_PAGE_FIRST, (user_id, limit + 1)).fetchall()
+        else:
+            if not (isinstance(cursor, list) and len(cursor) == 2 and isinstance(cursor[0], str)
+                    and isinstance(cursor[1], int) and not isinstance(cursor[1], bool)):
+                raise InvalidCursorException()
+            created_at, seq = cursor
+            rows = conn.execute(SELECT_PAGE_AFTER, (user_id, created_at, seq, limit + 1)).fetchall()
+        page = rows[:limit]
+        has_more = len(rows) > limit
+        return {
+            "results": [_row_to_memory(row) for row in page],
+            "next_cursor": [page[-1][4], page[-1][6]] if page and has_more else None,
+            "total": conn.execute(COUNT_USER, (user_id,)).fetchone()[0] if cursor is None else None
+        }
+
+    def get(self, memory_id):
+        row = self._conn().execute(SELECT_BY_ID, (memory_id,)).fetchone()
+        return _row_to_memory(row) if row else None
+
+    def update(self, memory_id, data, user_id=None):
+        with self._write() as conn:
+            row = conn.execute(SELECT_FOR_WRITE, (memory_id,)).fetchone()
+            if row is None or (user_id is not None and row[1] != user_id):
+                return NOT_FOUND
+            seq, owner, old = row
+            conn.execute(UPDATE_MEMORY, (data, datetime.now(timezone.utc).isoformat(), seq))
+            owner_token = _owner_token(owner)
+            old_terms, old_length = _terms(old)
+            new_terms, new_length = _terms(data)
+            conn.execute(DELETE_FTS, (seq, owner_token, old_terms))
+            conn.execute(INSERT_FTS, (seq, owner_token, new_terms))
+            conn.execute(UPDATE_STATS, (owner, 0, new_length - old_length))
+        return {"id": memory_id}
+
+    def delete(self, memory_id, user_id=None):
+        with self._write() as conn:
+            row = conn.execute(SELECT_FOR_WRITE, (memory_id,)).fetchone()
+            if row is None or (user_id is not None and row[1] != user_id):
+                return NOT_FOUND
+            seq, owner, old = row
+            old_terms, old_length = _terms(old)
+            conn.execute(DELETE_MEMORY, (seq,))
+            conn.execute(DELETE_FTS, (seq, _owner_token(owner), old_terms))
+            conn.execute(UPDATE_STATS, (owner, -1, -old_length))
+        return {"deleted": True}
+
+    def close(self) -> None:
+        """关闭所有线程的连接"""
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
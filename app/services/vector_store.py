@@ -0,0 +1,269 @@
+"""
+本地向量检索
+- VectorIndex: 每个用户一个连续的float32矩阵，精确检索用矩阵乘法批量计算余弦相似度
+- IVF近似检索: 项目内实现的倒排文件索引（k-means聚类 + 只扫描最近的nprobe个簇）
+- VectorMemoryClient: 基于向量检索的本地记忆后端
+
+numpy为可选依赖，只有启用本地向量后端时才需要安装。
+"""
+import itertools
+import logging
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # 可选依赖
+    np = None
+
+from app.services.demo_memory_client import DemoMemoryClient, UserShard
+from app.services.embedding_service import HashingEmbeddingProvider, normalize_rows as _normalize, require_numpy
+from app.services.memory_records import public_memory
+
+# 训练IVF时最多采样的向量数，以及每个簇的最少训练样本数
+IVF_TRAIN_SAMPLE = 50000
+IVF_MIN_POINTS_PER_LIST = 39
+KMEANS_ITERATIONS = 10
+
+
+def _top_k(scores, k: int):
+    """每行取分数最高的k个下标，按分数降序"""
+    k = min(k, scores.shape[-1])
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.int64)
+    part = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    order = np.argsort(-np.take_along_axis(scores, part, axis=-1), axis=-1, kind="stable")
+    return np.take_along_axis(part, order, axis=-1)
+
+
+class _IVF:
+    """倒排文件索引：每个簇保存所属的行号"""
+
+    def __init__(self, centroids):
+        self.centroids = centroids
+        self.lists: List[Set[int]] = [set() for _ in range(len(centroids))]
+        self.assignment: Dict[int, int] = {}
+
+    @classmethod
+    def train(cls, matrix, nlist: int, seed: int = 0) -> "_IVF":
+        """球面k-means，在采样数据上训练簇中心"""
+        rng = np.random.default_rng(seed)
+        sample = matrix
+        if len(matrix) > IVF_TRAIN_SAMPLE:
+            sample = matrix[rng.choice(len(matrix), IVF_TRAIN_SAMPLE, replace=False)]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            empty = np.bincount(labels, minlength=nlist) == 0
+            # 空簇重新随机取一个样本点
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = _normalize(sums)
+        return cls(centroids)
+
+    def assign(self, rows: Iterable[int], vectors) -> None:
+        labels = np.argmax(vectors @ self.centroids.T, axis=1)
+        for row, label in zip(rows, labels):
+            self.discard(row)
+            self.lists[label].add(row)
+            self.assignment[row] = int(label)
+
+    def discard(self, row: int) -> None:
+        label = self.assignment.pop(row, None)
+        if label is not None:
+            self.lists[label].discard(row)
+
+    def probe(self, query, nprobe: int):
+        """返回最近nprobe个簇中的行号"""
+        nearest = _top_k((self.centroids @ query)[None, :], nprobe)[0]
+        rows = [row for label in nearest for row in self.lists[label]]
+        return np.fromiter(rows, dtype=np.int64, count=len(rows))
+
+
+class VectorIndex:
+    """单用户向量索引
+
+    mode="exact"时做全量矩阵乘法；mode="ivf"时向量数达到ivf_min_vectors后
+    自动训练IVF，检索只扫描最近的nprobe个簇（数据量翻倍后重新训练）。
+    """
+
+    def __init__(self, dim: int, mode: str = "exact", ivf_min_vectors: int = 10000,
+                 nprobe: int = 8, initial_capacity: int = 64):
+        require_numpy()
+        if mode not in ("exact", "ivf"):
+            raise ValueError(f"unknown vector index mode: {mode}")
+        self.dim = dim
+        self.mode = mode
+        self.ivf_min_vectors = ivf_min_vectors
+        self.nprobe = nprobe
+        self._matrix = np.zeros((initial_capacity, dim), dtype=np.float32)
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._ivf: Optional[_IVF] = None
+        self._ivf_trained_size = 0
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._rows
+
+    def add(self, item_id: str, vector) -> None:
+        """添加或替换向量"""
+        vector = _normalize(vector)
+        row = self._rows.get(item_id)
+        if row is None:
+            row = len(self._ids)
+            if row == len(self._matrix):
+                grown = np.zeros((len(self._matrix) * 2, self.dim), dtype=np.float32)
+                grown[:row] = self._matrix[:row]
+                self._matrix = grown
+            self._ids.append(item_id)
+            self._rows[item_id] = row
+        self._matrix[row] = vector
+        if self._ivf is not None:
+            self._ivf.assign([row], self._matrix[row:row + 1])
+        self._maybe_train()
+
+    def remove(self, item_id: str) -> None:
+        """删除向量：用最后一行填补空位，保持矩阵连续"""
+        row = self._rows.pop(item_id, None)
+        if row is None:
+            return
+        last = len(self._ids) - 1
+        if self._ivf is not None:
+            self._ivf.discard(row)
+        if row != last:
+            moved = self._ids[last]
+            self._matrix[row] = self._matrix[last]
+            self._ids[row] = moved
+            self._rows[moved] = row
+            if self._ivf is not None:
+                self._ivf.discard(last)
+                self._ivf.assign([row], self._matrix[row:row + 1])
+        self._ids.pop()
+
+    def _maybe_train(self) -> None:
+        size = len(self._ids)
+        if self.mode != "ivf" or size < self.ivf_min_vectors:
+            return
+        if self._ivf is not None and size < 2 * self._ivf_trained_size:
+            return
+        nlist = max(1, min(int(np.sqrt(size)), size // IVF_MIN_POINTS_PER_LIST))
+        matrix = self._matrix[:size]
+        self._ivf = _IVF.train(matrix, nlist)
+        self._ivf.assign(range(size), matrix)
+        self._ivf_trained_size = size
+        logging.info(f"Trained IVF index with {nlist} lists over {size} vectors")
+
+    def search(self, vector, k: int = 10,
+               candidates: Optional[Set[str]] = None) -> List[Tuple[str, float]]:
+        return self.search_batch(np.asarray(vector, dtype=np.float32)[None, :], k, candidates)[0]
+
+    def search_batch(self, vectors, k: int = 10,
+                     candidates: Optional[Set[str]] = None) -> List[List[Tuple[str, float]]]:
+        """批量检索，返回每个查询的[(id, 余弦相似度)]"""
+        queries = _normalize(np.atleast_2d(vectors))
+        size = len(self._ids)
+        if size == 0 or k <= 0:
+            return [[] for _ in range(len(queries))]
+        if candidates is not None:
+            rows = np.fromiter((self._rows[i] for i in candidates if i in self._rows), dtype=np.int64)
+            return [self._score_rows(query, rows, k) for query in queries]
+        if self._ivf is not None:
+            return [self._score_rows(query, self._ivf.probe(query, self.nprobe), k) for query in queries]
+        scores = queries @ self._matrix[:size].T
+        top = _top_k(scores, k)
+        return [[(self._ids[row], float(scores[q, row])) for row in top[q]] for q in range(len(queries))]
+
+    def _score_rows(self, query, rows, k: int) -> List[Tuple[str, float]]:
+        if len(rows) == 0:
+            return []
+        scores = self._matrix[rows] @ query
+        top = _top_k(scores[None, :], k)[0]
+        return [(self._ids[rows[i]], float(scores[i])) for i in top]
+
+
+class VectorShard(UserShard):
+    """在用户分片上附加向量索引"""
+
+    def __init__(self, dim: int, index_options: dict):
+        super().__init__()
+        self.vector_index = VectorIndex(dim, **index_options)
+        # 向量ID -> 记忆ID
+        self.embedding_owners: Dict[str, str] = {}
+
+
+class VectorMemoryClient(DemoMemoryClient):
+    """本地语义检索后端：记忆存储沿用DemoMemoryClient，search改为向量检索，
+    keyword_search仍为BM25，供混合检索使用
+
+    向量在分片锁之外计算，编码期间不阻塞同一用户的其他读写
+    """
+
+    def __init__(self, api_key, dim: int = 256, mode: str = "exact",
+                 ivf_min_vectors: int = 10000, nprobe: int = 8, embed=None):
+        require_numpy()
+        super().__init__(api_key)
+        self.dim = dim
+        # embed: 文本列表 -> 归一化向量矩阵，通常为EmbeddingService.embed_batch
+        self._embed = embed or HashingEmbeddingProvider(dim=dim).embed_batch
+        self._index_options = {"mode": mode, "ivf_min_vectors": ivf_min_vectors, "nprobe": nprobe}
+        self._embedding_seq = itertools.count()
+
+    def _new_shard(self) -> VectorShard:
+        return VectorShard(self.dim, self._index_options)
+
+    def add(self, messages, user_id, metadata=None):
+        vector = self._embed([messages[0]["content"] if messages else ""])[0]
+        result = super().add(messages, user_id, metadata)
+        shard, _ = self._record(result["id"])
+        if shard is None:
+            return result
+        with shard.lock:
+            memory = shard.memories.get(result["id"])
+            # 写入后可能已被并发删除
+            if memory is not None:
+                memory["embedding_id"] = f"emb-{next(self._embedding_seq)}"
+                shard.embedding_owners[memory["embedding_id"]] = memory["id"]
+                shard.vector_index.add(memory["embedding_id"], vector)
+        return result
+
+    def search(self, query, user_id, limit=10, categories=None, metadata_filter=None):
+        return self.vector_search(query, user_id, limit=limit, categories=categories,
+                                  metadata_filter=metadata_filter)
+
+    def vector_search(self, query, user_id, limit=10, categories=None, metadata_filter=None):
+        """向量检索，score为余弦相似度；有过滤条件时只对候选向量打分"""
+        shard = self._shard(user_id)
+        if shard is None:
+            return []
+        vector = self._embed([query])[0]
+        with shard.lock:
+            candidates = self._filter_candidates(shard, categories, metadata_filter)
+            if candidates is not None:
+                if not candidates:
+                    return []
+                candidates = {shard.memories[memory_id].get("embedding_id") for memory_id in candidates}
+                candidates.discard(None)
+            hits = shard.vector_index.search(vector, k=limit, candidates=candidates)
+            return [dict(public_memory(shard.memories[shard.embedding_owners[embedding_id]]), score=round(score, 6))
+                    for embedding_id, score in hits]
+
+    def update(self, memory_id, data, user_id=None):
+        shard, memory = self._record(memory_id, user_id)
+        # 内容未变时不重新编码
+        if memory is None or memory["memory"] == data:
+            return super().update(memory_id, data, user_id=user_id)
+        vector = self._embed([data])[0]
+        with shard.lock:
+            result = super().update(memory_id, data, user_id=user_id)
+            if "error" not in result and "embedding_id" in memory:
+                shard.vector_index.add(memory["embedding_id"], vector)
+            return result
+
+    def _on_delete(self, shard: VectorShard, memory: dict) -> None:
+        embedding_id = memory.get("embedding_id")
+        if embedding_id is not None:
+            shard.embedding_owners.pop(embedding_id, None)
+            shard.vector_index.remove(embedding_id)
@@ -0,0 +1,308 @@
+"""
+记忆写入的后写（write-behind）队列
+memory_write_mode=async时，POST /api/memories先把请求写入本地日志（SQLite，synchronous=FULL），
+落盘后立即返回write_id；后台任务再按用户分组批量写入MemoryService，失败时指数退避重试。
+
+- 组提交：短时间内并发到达的请求合并为一个事务写入日志，多个请求共享一次fsync
+- 日志中的条目在写入后端成功前一直保留，进程重启后继续写入；
+  写入后端成功但尚未标记完成时进程退出，重启后会再写一次（至少一次语义）
+- 通过write_id查询状态：pending / committed（带memory_id）/ failed（重试次数用尽）
+- 多个进程可共用同一日志：条目在写入前被原子地认领（状态改为inflight并设置租约），
+  只有认领者会写入；认领者在租约到期前未标记结果（进程退出或卡住）时，条目重新可被认领
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.utils.executor import BlockingExecutor
+
+PENDING = "pending"
+COMMITTED = "committed"
+FAILED = "failed"
+# 已被某个写入任务认领，next_attempt_at为租约到期时间；对外仍显示为pending
+INFLIGHT = "inflight"
+# 清理已完成条目的间隔（秒）
+PURGE_INTERVAL = 300.0
+
+
+class WriteJournal:
+    """待写入记忆的本地日志，所有方法都是同步的，由单线程执行器调用"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # 首次使用时才创建文件，同步写入模式下不会产生日志文件
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # 每次提交都fsync，确认返回前条目已持久化
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS writes ("
+                "id TEXT PRIMARY KEY, user_id TEXT NOT NULL, content TEXT NOT NULL, "
+                "metadata TEXT NOT NULL, status TEXT NOT NULL, memory_id TEXT, error TEXT, "
+                "attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_writes_due ON writes (status, next_attempt_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def append_many(self, entries: List[dict]) -> None:
+        """在一个事务中写入多条，返回时已落盘"""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.executemany(
+                    "INSERT INTO writes (id, user_id, content, metadata, status, next_attempt_at, "
+                    "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(entry["write_id"], entry["user_id"], entry["content"],
+                      json.dumps(entry["metadata"] or {}, ensure_ascii=False), PENDING, now, now, now)
+                     for entry in entries]
+                )
+
+    def claim(self, limit: int, now: float, lease: float) -> List[dict]:
+        """认领到期待写入的条目（含租约已过期的inflight条目），按提交顺序返回
+
+        选取和改状态在同一条UPDATE中完成，BEGIN IMMEDIATE先取得写锁，
+        多个进程同时认领时每个条目只会被其中一个拿到
+        """
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    "UPDATE writes SET status = ?, next_attempt_at = ?, updated_at = ? WHERE id IN ("
+                    "SELECT id FROM writes WHERE status IN (?, ?) AND next_attempt_at <= ? "
+                    "ORDER BY created_at LIMIT ?) "
+                    "RETURNING id, user_id, content, metadata, attempts, created_at",
+                    (INFLIGHT, now + lease, now, PENDING, INFLIGHT, now, limit)
+                ).fetchall()
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        # RETURNING不保证顺序
+        rows.sort(key=lambda row: row[5])
+        return [{"write_id": row[0], "user_id": row[1], "content": row[2],
+                 "metadata": json.loads(row[3]), "attempts": row[4]} for row in rows]
+
+    def mark_many(self, updates: List[Tuple[str, str, Optional[str], Optional[str], int, float]]) -> None:
+        """批量更新状态，每项为(write_id, status, memory_id, error, attempts, next_attempt_at)"""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.executemany(
+                    "UPDATE writes SET status = ?, memory_id = ?, error = ?, attempts = ?, "
+                    "next_attempt_at = ?, updated_at = ? WHERE id = ?",
+                    [(status, memory_id, error, attempts, next_attempt_at, now, write_id)
+                     for write_id, status, memory_id, error, attempts, next_attempt_at in updates]
+                )
+
+    def get(self, write_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT id, user_id, status, memory_id, error, attempts, created_at, updated_at "
+                "FROM writes WHERE id = ?", (write_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"write_id": row[0], "user_id": row[1], "status": PENDING if row[2] == INFLIGHT else row[2],
+                "memory_id": row[3],
+                "error": row[4], "attempts": row[5], "created_at": row[6], "updated_at": row[7]}
+
+    def purge(self, before: float) -> int:
+        """删除早于before完成（成功或失败）的条目"""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                cursor = conn.execute("DELETE FROM writes WHERE status IN (?, ?) AND updated_at < ?",
+                                      (COMMITTED, FAILED, before))
+        return cursor.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class WriteBehindQueue:
+    def __init__(self, journal: WriteJournal, group_commit_delay: float = 0.005,
+                 group_max_items: int = 256, batch_size: int = 100, max_attempts: int = 5,
+                 retry_backoff: float = 2.0, retention: float = 86400.0, poll_interval: float = 1.0,
+                 lease: float = 300.0):
+        self.journal = journal
+        self.group_commit_delay = group_commit_delay
+        self.group_max_items = group_max_items
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.retention = retention
+        self.poll_interval = poll_interval
+        self.lease = lease
+        # SQLite连接同一时间只允许一个线程使用，日志操作串行执行
+        self.executor = BlockingExecutor(max_workers=1, max_queue=1024, name="write-journal")
+        self._appends: List[Tuple[dict, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._commits: set = set()
+        self._wake: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._last_purge = 0.0
+
+    async def submit(self, user_id: str, content: str, metadata: Optional[dict] = None) -> dict:
+        """写入日志并返回{"write_id", "status"}；返回时条目已落盘"""
+        entry = {"write_id": str(uuid.uuid4()), "user_id": user_id, "content": content, "metadata": metadata}
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._appends.append((entry, future))
+        if len(self._appends) >= self.group_max_items:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.group_commit_delay, self._flush)
+        await asyncio.shield(future)
+        if self._wake is not None:
+            self._wake.set()
+        return {"write_id": entry["write_id"], "status": PENDING}
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._appends = self._appends, []
+        if batch:
+            task = asyncio.ensure_future(self._commit(batch))
+            self._commits.add(task)
+            task.add_done_callback(self._commits.discard)
+
+    async def _commit(self, batch: List[Tuple[dict, asyncio.Future]]) -> None:
+        try:
+            await self.executor.run(self.journal.append_many, [entry for entry, _ in batch])
+        except Exception as e:
+            logging.error(f"Write journal commit of {len(batch)} entries failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for _, future in batch:
+            if not future.done():
+                future.set_result(None)
+
+    async def status(self, write_id: str, user_id: str) -> Optional[dict]:
+        """查询写入状态，条目不存在或不属于该用户时返回None"""
+        record = await self.executor.run(self.journal.get, write_id)
+        if record is None or record["user_id"] != user_id:
+            return None
+        return record
+
+    async def drain_once(self, memory_service) -> int:
+        """把一批到期条目写入MemoryService，返回处理的条目数"""
+        entries = await self.executor.run(self.journal.claim, self.batch_size, time.time(), self.lease)
+        if not entries:
+            return 0
+        groups: Dict[str, List[dict]] = {}
+        for entry in entries:
+            groups.setdefault(entry["user_id"], []).append(entry)
+
+        async def write_group(user_id: str, group: List[dict]) -> List[dict]:
+            items = [{"content": entry["content"], "metadata": entry["metadata"]} for entry in group]
+            try:
+                return await memory_service.add_memories(items, user_id=user_id)
+            except Exception as e:
+                return [{"status": "error", "error": str(e)}] * len(group)
+
+        results = await asyncio.gather(*(write_group(user_id, group) for user_id, group in groups.items()))
+        now = time.time()
+        updates = []
+        for group, outcomes in zip(groups.values(), results):
+            for entry, outcome in zip(group, outcomes):
+                if outcome["status"] == "created":
+                    updates.append((entry["write_id"], COMMITTED, outcome.get("memory_id"), None,
+                                    entry["attempts"] + 1, now))
+                    continue
+                attempts = entry["attempts"] + 1
+                if attempts >= self.max_attempts:
+                    logging.error(f"Write {entry['write_id']} failed after {attempts} attempts: {outcome.get('error')}")
+                    updates.append((entry["write_id"], FAILED, None, outcome.get("error"), attempts, now))
+                else:
+                    delay = self.retry_backoff * 2 ** (attempts - 1)
+                    updates.append((entry["write_id"], PENDING, None, outcome.get("error"), attempts, now + delay))
+        await self.executor.run(self.journal.mark_many, updates)
+        return len(entries)
+
+    async def _run(self, memory_service) -> None:
+        while True:
+            try:
+                processed = await self.drain_once(memory_service)
+                if time.time() - self._last_purge > PURGE_INTERVAL:
+                    self._last_purge = time.time()
+                    await self.executor.run(self.journal.purge, time.time() - self.retention)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Write-behind worker error: {e}")
+                processed = 0
+            if processed < self.batch_size:
+                # 没有更多到期条目时等待新提交或重试到期
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def start(self, memory_service) -> None:
+        """启动后台写入任务，重启前未完成的条目也会继续写入"""
+        if self._worker is None:
+            self._wake = asyncio.Event()
+            self._worker = asyncio.create_task(self._run(memory_service))
+
+    async def close(self) -> None:
+        """提交尚未落盘的条目并停止后台任务，未写入后端的条目保留在日志中"""
+        if self._appends:
+            self._flush()
+        if self._commits:
+            await asyncio.gather(*self._commits, return_exceptions=True)
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        self.journal.close()
+        self.executor.shutdown()
+
+
+def create_write_queue() -> WriteBehindQueue:
+    """根据配置创建后写队列"""
+    return WriteBehindQueue(
+        WriteJournal(settings.memory_write_journal_path),
+        group_commit_delay=settings.memory_write_group_commit_ms / 1000,
+        group_max_items=settings.memory_write_group_max_items,
+        batch_size=settings.memory_write_batch_size,
+        max_attempts=settings.memory_write_max_attempts,
+        retry_backoff=settings.memory_write_retry_backoff,
+        retention=settings.memory_write_retention,
+        lease=settings.memory_write_lease
+    )
+
+
+# 单例实例
+write_queue = create_write_queue()
+
+def get_write_queue():
+    return write_queue
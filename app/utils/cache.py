@@ -0,0 +1,315 @@
+"""
+通用缓存组件
+- LRUCache: 进程内LRU缓存，支持容量上限和TTL过期
+- SQLiteCache: 可选的磁盘缓存层，进程重启后仍然有效
+- TieredCache: 内存层 + 磁盘层组合；协程中使用aget/aset，磁盘层读写在线程中执行
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.utils.exceptions import ServiceUnavailableException
+from app.utils.executor import BlockingExecutor
+
+_MISSING = object()
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str, casefold: bool = False) -> str:
+    """NFKC规范化并合并空白，用于构造缓存键；casefold=True时忽略大小写"""
+    text = _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+    return text.casefold() if casefold else text
+
+
+def content_hash(text: str, *parts: str) -> str:
+    """规范化文本 + 附加维度（模型、提示词版本等）的sha256"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    digest.update(normalize_text(text).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """线程安全的LRU + TTL缓存
+
+    ttl为None表示不过期；set时可为单个条目指定ttl。
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None):
+        if max_size < 1:
+            raise ValueError("max_size must be >= 1")
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def get(self, key, default=None, count: bool = True):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is not None and expires_at <= time.monotonic():
+                    del self._data[key]
+                    self.expirations += 1
+                else:
+                    self._data.move_to_end(key)
+                    if count:
+                        self.hits += 1
+                    return value
+            if count:
+                self.misses += 1
+            return default
+
+    def set(self, key, value, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key) -> bool:
+        with self._lock:
+            return self._data.pop(key, _MISSING) is not _MISSING
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def values(self) -> list:
+        """未过期条目的快照，不影响LRU顺序和计数"""
+        now = time.monotonic()
+        with self._lock:
+            return [value for value, expires_at in self._data.values()
+                    if expires_at is None or expires_at > now]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
+
+
+class SQLiteCache:
+    """基于SQLite的磁盘缓存，值以JSON存储
+
+    超过max_entries时按最近访问时间淘汰最旧的条目。
+    命中只记录访问时间，累计touch_batch条或下次set时（淘汰前）再批量写回，读命中不提交事务。
+    """
+
+    def __init__(self, path: str, max_entries: int = 100000, ttl: Optional[float] = None,
+                 touch_batch: int = 256):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.touch_batch = touch_batch
+        self._lock = threading.Lock()
+        # 命中但尚未写回的访问时间 key -> accessed_at
+        self._touched: Dict[str, float] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        with self._lock:
+            self._connection()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        """调用方持有锁；close()之后再次使用时重新打开"""
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # 缓存可重建：WAL下NORMAL只在检查点fsync，掉电最多丢失最近的写入
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache (accessed_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str, default=None):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (row[1] is not None and row[1] <= now):
+                if row is not None:
+                    conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                    conn.commit()
+                self.misses += 1
+                return default
+            self._touched[key] = now
+            if len(self._touched) >= self.touch_batch:
+                self._flush_touched()
+                conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def _flush_touched(self) -> None:
+        """写回累计的访问时间，调用方持有锁并负责提交"""
+        if self._touched:
+            self._conn.executemany("UPDATE cache SET accessed_at = ? WHERE key = ?",
+                                   [(accessed_at, key) for key, accessed_at in self._touched.items()])
+            self._touched.clear()
+
+    def set(self, key: str, value, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            conn = self._connection()
+            self._touched.pop(key, None)
+            self._flush_touched()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, payload, expires_at, now)
+            )
+            count = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+            overflow = count - self.max_entries
+            if overflow > 0:
+                conn.execute(
+                    "DELETE FROM cache WHERE key IN "
+                    "(SELECT key FROM cache ORDER BY accessed_at LIMIT ?)",
+                    (overflow,)
+                )
+                self.evictions += overflow
+            conn.commit()
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            conn = self._connection()
+            cursor = conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            conn.commit()
+            return cursor.rowcount > 0
+
+    def clear(self) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM cache")
+            conn.commit()
+
+    def close(self) -> None:
+        """写回访问时间并关闭连接"""
+        with self._lock:
+            if self._conn is None:
+                return
+            self._flush_touched()
+            self._conn.commit()
+            self._conn.close()
+            self._conn = None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            conn = self._connection()
+            size = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        return {"size": size, "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class TieredCache:
+    """内存LRU在前、磁盘缓存在后；磁盘命中会回填内存层
+
+    get/set同步访问磁盘层，供线程中的调用方使用；事件循环中使用aget/aset，
+    磁盘层读写交给单线程执行器（SQLiteCache本身是串行的），执行器排满时按未命中/跳过写入处理
+    """
+
+    def __init__(self, memory: LRUCache, disk: Optional[SQLiteCache] = None, max_disk_queue: int = 256):
+        self.memory = memory
+        self.disk = disk
+        self.executor = BlockingExecutor(max_workers=1, max_queue=max_disk_queue, name="disk-cache")
+
+    def get(self, key, default=None):
+        value = self.memory.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if self.disk is not None:
+            value = self.disk.get(key, _MISSING)
+            if value is not _MISSING:
+                self.memory.set(key, value)
+                return value
+        return default
+
+    def set(self, key, value, ttl: Optional[float] = None) -> None:
+        self.memory.set(key, value, ttl=ttl)
+        if self.disk is not None:
+            self.disk.set(key, value, ttl=ttl)
+
+    async def aget(self, key, default=None):
+        """内存层命中时直接返回，不切换线程"""
+        value = self.memory.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if self.disk is not None:
+            try:
+                value = await self.executor.run(self.disk.get, key, _MISSING)
+            except ServiceUnavailableException:
+                return default
+            if value is not _MISSING:
+                self.memory.set(key, value)
+                return value
+        return default
+
+    async def aset(self, key, value, ttl: Optional[float] = None) -> None:
+        self.memory.set(key, value, ttl=ttl)
+        if self.disk is not None:
+            try:
+                await self.executor.run(self.disk.set, key, value, ttl=ttl)
+            except ServiceUnavailableException:
+                pass
+
+    def delete(self, key) -> None:
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def close(self) -> None:
+        """写回磁盘层并释放执行器线程；之后仍可继续使用（磁盘层按需重新打开）"""
+        self.executor.shutdown()
+        if self.disk is not None:
+            self.disk.close()
+
+    async def aclose(self) -> None:
+        """close()的协程版本，排在已提交的磁盘操作之后执行"""
+        if self.disk is not None:
+            try:
+                await self.executor.run(self.disk.close)
+            except ServiceUnavailableException:
+                self.disk.close()
+        self.executor.shutdown()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        stats = {"memory": self.memory.stats()}
+        if self.disk is not None:
+            stats["disk"] = self.disk.stats()
+        return stats
@@ -34,7 +34,8 @@ async def app_exception_handler(request: Request, exc: AppException) -> JSONResp
     
     return JSONResponse(
         status_code=exc.status_code,
-        content=error_response.model_dump()
+        content=error_response.model_dump(),
+        headers=getattr(exc, "headers", None)
     )
 
 async def http_exception_handler(request: Request, exc: HTTPException) -> JSONResponse:
@@ -23,6 +23,11 @@ class ValidationException(AppException):
             context={"field": field} if field else {}
         )
 
+class InvalidCursorException(ValidationException):
+    """分页游标无效（格式错误、被篡改或与当前后端的游标类型不符）"""
+    def __init__(self, detail: str = "无效的分页游标"):
+        super().__init__(detail=detail, field="cursor")
+
 class NotFoundException(AppException):
     """资源未找到异常"""
     def __init__(self, detail: str = "Resource not found", resource_type: str = "resource"):
@@ -97,3 +102,24 @@ class AuthServiceException(ExternalServiceException):
             detail=detail, 
             service_name="supabase_auth"
         )
+
+class ServiceUnavailableException(AppException):
+    """服务繁忙异常（背压）"""
+    def __init__(self, detail: str = "Service temporarily unavailable", retry_after: Optional[int] = None):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, 
+            detail=detail,
+            error_code="SERVICE_UNAVAILABLE",
+            context={"retry_after": retry_after} if retry_after else {}
+        )
+        if retry_after:
+            self.headers = {"Retry-After": str(retry_after)}
+
+class GatewayTimeoutException(AppException):
+    """上游服务超时异常"""
+    def __init__(self, detail: str = "Upstream service timed out"):
+        super().__init__(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT, 
+            detail=detail,
+            error_code="UPSTREAM_TIMEOUT"
+        )
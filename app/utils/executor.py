@@ -0,0 +1,90 @@
+"""
+阻塞调用调度器
+把同步SDK调用放到有界线程池中执行，避免阻塞事件循环
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from app.utils.exceptions import ServiceUnavailableException, GatewayTimeoutException
+
+
+class BlockingExecutor:
+    """有界线程池调度器
+
+    - max_workers: 同时执行的线程数
+    - max_queue: 线程全部占用时允许排队的调用数，超出后立即返回503
+    - timeout: 单次调用的默认超时（秒），超时返回504
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, timeout: Optional[float] = None,
+                 name: str = "blocking"):
+        if max_workers < 1:
+            raise ValueError("max_workers must be >= 1")
+        if max_queue < 0:
+            raise ValueError("max_queue must be >= 0")
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.name = name
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    @property
+    def capacity(self) -> int:
+        """执行中 + 排队中的调用上限"""
+        return self.max_workers + self.max_queue
+
+    @property
+    def pending(self) -> int:
+        """当前占用的槽位数（包括已超时但线程仍在运行的调用）"""
+        return self._pending
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix=self.name
+            )
+        return self._executor
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, func: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """在线程池中执行func，队列满时抛出ServiceUnavailableException"""
+        with self._lock:
+            if self._pending >= self.capacity:
+                raise ServiceUnavailableException(
+                    detail=f"{self.name} executor is saturated, please retry later",
+                    retry_after=1
+                )
+            self._pending += 1
+            executor = self._get_executor()
+
+        try:
+            future = executor.submit(functools.partial(func, *args, **kwargs))
+        except BaseException:
+            self._release(None)
+            raise
+        # 槽位在线程真正结束（或排队中被取消）时才释放，超时的调用仍然计入上限
+        future.add_done_callback(self._release)
+
+        call_timeout = self.timeout if timeout is None else timeout
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), call_timeout)
+        except asyncio.TimeoutError:
+            raise GatewayTimeoutException(
+                detail=f"{self.name} call timed out after {call_timeout}s"
+            )
+
+    def shutdown(self, wait: bool = False) -> None:
+        """关闭线程池，未开始的调用会被取消"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,55 @@
+"""
+NDJSON（每行一个JSON值）的解析与序列化
+"""
+import json
+import zlib
+from typing import Any, AsyncIterable, AsyncIterator, List
+
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+def is_ndjson(content_type: str) -> bool:
+    return content_type.split(";")[0].strip().lower() in NDJSON_MEDIA_TYPES
+
+
+def parse_ndjson(body: bytes) -> List[Any]:
+    """解析完整的NDJSON文本，跳过空行；某行不是合法JSON时抛出ValueError并指明行号"""
+    items = []
+    for line_number, line in enumerate(body.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            items.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"line {line_number}: {e.msg}") from e
+    return items
+
+
+def dumps_line(value: Any) -> str:
+    """序列化为一行NDJSON（含换行符）"""
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+async def iter_lines(chunks: AsyncIterable[bytes], max_line_bytes: int = 1 << 20) -> AsyncIterator[bytes]:
+    """把字节块流切分为行（不含换行符），单行超过max_line_bytes时抛出ValueError"""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        lines = buffer.split(b"\n")
+        buffer = lines.pop()
+        for line in lines:
+            yield line.rstrip(b"\r")
+        if len(buffer) > max_line_bytes:
+            raise ValueError(f"line exceeds {max_line_bytes} bytes")
+    if buffer:
+        yield buffer.rstrip(b"\r")
+
+
+async def gzip_stream(chunks: AsyncIterable[str], level: int = 6) -> AsyncIterator[bytes]:
+    """把文本块流式压缩为gzip字节流"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,41 @@
+"""
+请求合并（single-flight）
+同一key的调用在途时，后到的调用不再发起新请求，而是等待在途调用的结果。
+调用结束后立即移除，不缓存结果；共享的是同一个结果对象，调用方不应修改它。
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.shared = 0
+
+    def __len__(self) -> int:
+        """在途调用数"""
+        return len(self._calls)
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """执行func()，同一key已有在途调用时等待其结果（包括异常）"""
+        future = self._calls.get(key)
+        if future is None:
+            self.calls += 1
+            future = asyncio.ensure_future(func())
+            self._calls[key] = future
+            future.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.shared += 1
+        # shield: 单个调用方取消不影响共享同一调用的其他调用方
+        return await asyncio.shield(future)
+
+    def _finish(self, key: Hashable, future: asyncio.Future) -> None:
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        # 所有调用方都已取消时，避免异常未被读取的警告
+        if not future.cancelled():
+            future.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self._calls), "calls": self.calls, "shared": self.shared}
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""
+mem0后端延迟对比：同步客户端 + 线程池 vs 原生异步HTTP连接池
+
+在本地端口启动mem0替身服务（带模拟网络延迟），对两种后端并发发起搜索请求，
+输出p50/p99延迟和总吞吐。
+
+用法:
+    SECRET_KEY=x MEM0_API_KEY=x python scripts/bench_mem0_backends.py --requests 500 --concurrency 100
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import httpx
+import uvicorn
+
+from app.services.memory_service import MemoryService
+from app.services.mem0_http_client import AsyncMem0Client
+from app.utils.executor import BlockingExecutor
+from tests.fake_servers import create_fake_mem0_app
+
+
+class SyncMem0StandIn:
+    """模拟同步SDK：每次调用都新建连接"""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+
+    def search(self, query, user_id, limit=10):
+        resp = httpx.post(f"{self.base_url}/v1/memories/search/",
+                          json={"query": query, "user_id": user_id, "limit": limit})
+        resp.raise_for_status()
+        return resp.json()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(latency: float) -> str:
+    port = free_port()
+    config = uvicorn.Config(create_fake_mem0_app(latency=latency), host="127.0.0.1",
+                            port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}"
+
+
+async def run_load(service: MemoryService, requests: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await service.search_memories(query=f"q{i}", user_id="bench-user", limit=10)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "p50": statistics.median(latencies),
+        "p99": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        "rps": requests / elapsed
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.02, help="替身服务的模拟延迟（秒）")
+    parser.add_argument("--workers", type=int, default=8, help="线程池大小")
+    args = parser.parse_args()
+
+    base_url = start_server(args.latency)
+
+    thread_service = MemoryService(client=SyncMem0StandIn(base_url))
+    thread_service.executor = BlockingExecutor(max_workers=args.workers, max_queue=args.requests,
+                                               timeout=60, name="mem0")
+    async_service = MemoryService(client=AsyncMem0Client(api_key="bench", base_url=base_url))
+    await async_service.startup()
+
+    print(f"requests={args.requests} concurrency={args.concurrency} "
+          f"latency={args.latency * 1000:.0f}ms workers={args.workers}")
+    for name, service in (("thread-offload", thread_service), ("async-http", async_service)):
+        stats = await run_load(service, args.requests, args.concurrency)
+        print(f"{name:>15}: p50={stats['p50']:.1f}ms p99={stats['p99']:.1f}ms rps={stats['rps']:.0f}")
+        await service.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+把NDJSON文件流式导入到re-call.ai
+
+文件按块上传到 POST /api/memories/import，服务端边读边写并记录检查点；
+连接中断或服务端返回503时等待后用同一import_id重新上传，服务端会跳过检查点之前的行。
+
+用法:
+    python scripts/import_memories.py memories.ndjson --token <access_token>
+    python scripts/import_memories.py memories.ndjson --token <access_token> --import-id migrate-2024-12
+"""
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+import httpx
+
+CHUNK_SIZE = 64 * 1024
+
+
+def default_import_id(path: str) -> str:
+    """同一文件（路径+大小）得到同一import_id，便于重复执行同一命令续传"""
+    size = os.path.getsize(path)
+    digest = hashlib.sha256(f"{os.path.abspath(path)}:{size}".encode("utf-8")).hexdigest()
+    return f"file-{digest[:16]}"
+
+
+def read_chunks(path: str):
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            yield chunk
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Stream an NDJSON file into re-call.ai")
+    parser.add_argument("path")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--token", required=True, help="Bearer access token")
+    parser.add_argument("--import-id", default=None)
+    parser.add_argument("--retries", type=int, default=5)
+    args = parser.parse_args()
+
+    import_id = args.import_id or default_import_id(args.path)
+    headers = {"Authorization": f"Bearer {args.token}", "Content-Type": "application/x-ndjson"}
+    with httpx.Client(base_url=args.url, headers=headers, timeout=httpx.Timeout(30.0, read=None)) as client:
+        for attempt in range(args.retries + 1):
+            try:
+                response = client.post("/api/memories/import", params={"import_id": import_id},
+                                       content=read_chunks(args.path))
+            except httpx.TransportError as e:
+                print(f"attempt {attempt + 1}: connection error: {e}", file=sys.stderr)
+                time.sleep(2 ** attempt)
+                continue
+            if response.status_code == 503:
+                delay = int(response.headers.get("Retry-After", 2 ** attempt))
+                print(f"attempt {attempt + 1}: {response.json().get('message', 'unavailable')}", file=sys.stderr)
+                time.sleep(delay)
+                continue
+            response.raise_for_status()
+            summary = response.json()
+            print(f"import {import_id}: {summary['created']} created, {summary['invalid']} invalid, "
+                  f"{summary['failed']} failed (resumed after line {summary['resumed_from']})")
+            for error in summary["errors"]:
+                print(f"  line {error['line']}: {error['error']}", file=sys.stderr)
+            return 0
+    print(f"import {import_id} did not finish; rerun the same command to resume", file=sys.stderr)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
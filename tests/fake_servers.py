@@ -0,0 +1,100 @@
+"""
+测试用的本地替身服务
+以ASGI应用形式提供，既可通过httpx.ASGITransport直接调用，也可用uvicorn跑在本地端口
+"""
+import asyncio
+import itertools
+import json
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+def create_fake_mem0_app(latency: float = 0.0) -> FastAPI:
+    """模拟mem0 Platform v1 API的内存实现，latency用于模拟网络往返"""
+    app = FastAPI()
+    memories = {}
+    ids = itertools.count()
+    app.state.requests = []
+
+    @app.middleware("http")
+    async def record_and_delay(request: Request, call_next):
+        app.state.requests.append((request.method, request.url.path, request.headers.get("authorization")))
+        if latency:
+            await asyncio.sleep(latency)
+        return await call_next(request)
+
+    @app.post("/v1/memories/")
+    async def add(payload: dict):
+        memory_id = f"fake-{next(ids)}"
+        memories[memory_id] = {
+            "id": memory_id,
+            "memory": payload["messages"][0]["content"],
+            "user_id": payload["user_id"],
+            "metadata": payload.get("metadata") or {},
+            "created_at": "2024-12-01T12:00:00Z"
+        }
+        return [{"id": memory_id, "event": "ADD", "data": {"memory": memories[memory_id]["memory"]}}]
+
+    @app.post("/v1/memories/search/")
+    async def search(payload: dict):
+        query = payload["query"].lower()
+        results = [m for m in memories.values()
+                   if m["user_id"] == payload["user_id"] and query in m["memory"].lower()]
+        return results[:payload.get("limit", 10)]
+
+    @app.get("/v1/memories/")
+    async def get_all(user_id: str, page: int = None, page_size: int = None):
+        results = [m for m in memories.values() if m["user_id"] == user_id]
+        if page is None or page_size is None:
+            return results
+        start = (page - 1) * page_size
+        return {
+            "count": len(results),
+            "next": f"?page={page + 1}" if start + page_size < len(results) else None,
+            "previous": f"?page={page - 1}" if page > 1 else None,
+            "results": results[start:start + page_size]
+        }
+
+    @app.get("/v1/memories/{memory_id}/")
+    async def get(memory_id: str):
+        if memory_id not in memories:
+            raise HTTPException(status_code=404, detail="Memory not found")
+        return memories[memory_id]
+
+    @app.put("/v1/memories/{memory_id}/")
+    async def update(memory_id: str, payload: dict):
+        if memory_id not in memories:
+            raise HTTPException(status_code=404, detail="Memory not found")
+        memories[memory_id]["memory"] = payload["text"]
+        return {"id": memory_id}
+
+    @app.delete("/v1/memories/{memory_id}/")
+    async def delete(memory_id: str):
+        if memories.pop(memory_id, None) is None:
+            raise HTTPException(status_code=404, detail="Memory not found")
+        return {"message": "Memory deleted successfully!"}
+
+    return app
+
+def create_fake_llm_app(chunks, delay: float = 0.0) -> FastAPI:
+    """模拟OpenAI兼容的chat/completions接口，stream=true时按SSE逐段返回chunks"""
+    app = FastAPI()
+    app.state.payloads = []
+
+    @app.post("/chat/completions")
+    async def completions(payload: dict):
+        app.state.payloads.append(payload)
+        if not payload.get("stream"):
+            return {"choices": [{"message": {"content": "".join(chunks)}}]}
+
+        async def events():
+            yield ": OPENROUTER PROCESSING\n\n"
+            for chunk in chunks:
+                if delay:
+                    await asyncio.sleep(delay)
+                data = {"choices": [{"delta": {"content": chunk}}]}
+                yield f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
@@ -0,0 +1,176 @@
+import asyncio
+import gzip
+import json
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from app.config import settings
+from app.main import app
+from app.api.auth import get_current_user
+from app.services.memory_service import MemoryService, encode_cursor, get_memory_service
+from app.services.llm_service import LLMService, get_llm_service
+from app.services.write_queue import WriteBehindQueue, WriteJournal, get_write_queue
+from tests.fake_servers import create_fake_llm_app
+
+@pytest.fixture
+def memory_service():
+    return MemoryService()
+
+@pytest.fixture
+def client(memory_service):
+    app.dependency_overrides[get_current_user] = lambda: "user-a"
+    app.dependency_overrides[get_memory_service] = lambda: memory_service
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+def parse_sse(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        event, data = "message", None
+        for line in block.splitlines():
+            if line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: "):
+                data = line[6:]
+        events.append((event, data))
+    return events
+
+def test_stream_summary_endpoint(client, memory_service):
+    llm = LLMService(transport=httpx.ASGITransport(app=create_fake_llm_app(["一句", "话摘要"])))
+    llm.base_url = "http://fake-llm/chat/completions"
+    app.dependency_overrides[get_llm_service] = lambda: llm
+
+    memory_id = memory_service.client.add([{"role": "user", "content": "记忆内容"}], user_id="user-a")["id"]
+    response = client.get(f"/api/memories/{memory_id}/summary/stream")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert parse_sse(response.text) == [
+        ("message", '{"delta": "一句"}'),
+        ("message", '{"delta": "话摘要"}'),
+        ("done", '{"summary": "一句话摘要"}'),
+    ]
+
+def test_stream_summary_hides_other_users_memories(client, memory_service):
+    memory_id = memory_service.client.add([{"role": "user", "content": "别人的"}], user_id="user-b")["id"]
+    assert client.get(f"/api/memories/{memory_id}/summary/stream").status_code == 404
+    assert client.get("/api/memories/missing/summary/stream").status_code == 404
+
+def test_update_and_delete_reject_other_users_memories(client, memory_service):
+    memory_id = memory_service.client.add([{"role": "user", "content": "别人的"}], user_id="user-b")["id"]
+    assert client.put(f"/api/memories/{memory_id}", json={"content": "改"}).status_code == 404
+    assert client.delete(f"/api/memories/{memory_id}").status_code == 404
+    assert memory_service.client.get(memory_id)["memory"] == "别人的"
+
+    own = memory_service.client.add([{"role": "user", "content": "自己的"}], user_id="user-a")["id"]
+    assert client.delete(f"/api/memories/{own}").status_code == 200
+
+def test_list_memories_paginates_with_cursor(client, memory_service):
+    for i in range(3):
+        memory_service.client.add([{"role": "user", "content": f"m{i}"}], user_id="user-a")
+
+    first = client.get("/api/memories", params={"limit": 2}).json()
+    assert [m["content"] for m in first["memories"]] == ["m0", "m1"]
+    assert first["has_more"] is True and first["total"] == 3
+
+    second = client.get("/api/memories", params={"limit": 2, "cursor": first["next_cursor"]}).json()
+    assert [m["content"] for m in second["memories"]] == ["m2"]
+    assert second["has_more"] is False and second["next_cursor"] is None
+
+def test_list_memories_rejects_bad_cursor(client):
+    assert client.get("/api/memories", params={"cursor": "%%%"}).status_code == 422
+    # 能解码但类型不符的游标（篡改或来自其他后端）同样返回422
+    for tampered in ([1, 2], "x", True, {"p": 1}):
+        response = client.get("/api/memories", params={"cursor": encode_cursor(tampered)})
+        assert response.status_code == 422
+
+def test_search_memories_endpoint(client, memory_service):
+    memory_service.client.add([{"role": "user", "content": "学习FastAPI"}], user_id="user-a")
+    body = client.get("/api/memories/search", params={"q": "fastapi", "limit": 5}).json()
+    assert body["total"] == 1 and body["limit"] == 5
+    assert body["results"][0]["content"] == "学习FastAPI"
+
+def test_search_endpoint_with_filters(client, memory_service):
+    memory_service.client.add([{"role": "user", "content": "FastAPI笔记"}], user_id="user-a", metadata={"category": "study"})
+    memory_service.client.add([{"role": "user", "content": "FastAPI上线"}], user_id="user-a", metadata={"category": "work"})
+    response = client.post("/api/memories/search", json={"query": "FastAPI", "categories": ["work"], "mode": "hybrid"})
+    assert response.status_code == 200
+    assert [m["content"] for m in response.json()["results"]] == ["FastAPI上线"]
+    assert client.post("/api/memories/search", json={"query": "x", "mode": "bogus"}).status_code == 422
+
+def test_batch_create_accepts_json_array(client, memory_service):
+    body = client.post("/api/memories/batch", json=[
+        {"content": "第一条", "metadata": {"category": "study"}},
+        {"content": "   "},
+        {"content": "第二条"},
+        "not an object",
+    ]).json()
+    assert body["total"] == 4 and body["succeeded"] == 2 and body["failed"] == 2
+    assert [r["status"] for r in body["results"]] == ["created", "invalid", "created", "invalid"]
+    assert [r["index"] for r in body["results"]] == [0, 1, 2, 3]
+    listed = client.get("/api/memories").json()["memories"]
+    assert [m["content"] for m in listed] == ["第一条", "第二条"]
+    assert listed[0]["id"] == body["results"][0]["memory_id"]
+
+def test_batch_create_accepts_ndjson(client):
+    payload = '{"content": "a"}\n\n{"content": "b"}\n'
+    response = client.post("/api/memories/batch", content=payload,
+                           headers={"content-type": "application/x-ndjson"})
+    assert response.status_code == 200 and response.json()["succeeded"] == 2
+
+def test_batch_create_rejects_malformed_body(client):
+    bad_line = client.post("/api/memories/batch", content='{"content": "a"}\n{oops',
+                           headers={"content-type": "application/x-ndjson"})
+    assert bad_line.status_code == 422
+    assert client.post("/api/memories/batch", json={"content": "a"}).status_code == 422
+
+def test_export_streams_all_memories_as_ndjson(client, memory_service, monkeypatch):
+    monkeypatch.setattr("app.api.memories.settings.memory_export_page_size", 2)
+    for i in range(5):
+        memory_service.client.add([{"role": "user", "content": f"m{i}"}], user_id="user-a", metadata={"i": i})
+    memory_service.client.add([{"role": "user", "content": "other"}], user_id="user-b")
+
+    response = client.get("/api/memories/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["content"] for line in lines] == [f"m{i}" for i in range(5)]
+    assert lines[3]["metadata"] == {"i": 3}
+    # 导出不写入分页缓存
+    assert memory_service.list_cache.stats()["size"] == 0
+
+def test_export_gzip(client, memory_service):
+    memory_service.client.add([{"role": "user", "content": "压缩"}], user_id="user-a")
+    response = client.get("/api/memories/export", params={"gzip": "true"})
+    assert response.headers["content-type"] == "application/gzip"
+    assert json.loads(gzip.decompress(response.content))["content"] == "压缩"
+
+def test_import_endpoint_streams_ndjson_and_exposes_checkpoint(client, memory_service):
+    payload = "".join(json.dumps({"content": f"导入{i}"}, ensure_ascii=False) + "\n" for i in range(3))
+    response = client.post("/api/memories/import", params={"import_id": "job-1"}, content=payload,
+                           headers={"content-type": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.json()["created"] == 3 and response.json()["line"] == 3
+
+    assert client.get("/api/memories/import/job-1").json()["line"] == 3
+    assert client.get("/api/memories/import/missing").status_code == 404
+    # 重新提交同一文件不会重复写入
+    again = client.post("/api/memories/import", params={"import_id": "job-1"}, content=payload).json()
+    assert again["resumed_from"] == 3 and again["created"] == 3
+    assert len(client.get("/api/memories").json()["memories"]) == 3
+
+def test_async_write_mode_acknowledges_with_write_id(client, memory_service, monkeypatch, tmp_path):
+    queue = WriteBehindQueue(WriteJournal(str(tmp_path / "journal.db")), group_commit_delay=0)
+    app.dependency_overrides[get_write_queue] = lambda: queue
+    monkeypatch.setattr(settings, "memory_write_mode", "async")
+
+    response = client.post("/api/memories", json={"content": "稍后写入"})
+    assert response.status_code == 202
+    write_id = response.json()["data"]["write_id"]
+    assert client.get(f"/api/memories/writes/{write_id}").json()["status"] == "pending"
+    assert client.get("/api/memories/writes/missing").status_code == 404
+    assert memory_service.client.get_all("user-a") == []
+
+    asyncio.run(queue.drain_once(memory_service))
+    status = client.get(f"/api/memories/writes/{write_id}").json()
+    assert status["status"] == "committed"
+    assert memory_service.client.get(status["memory_id"])["memory"] == "稍后写入"
@@ -0,0 +1,78 @@
+import base64
+import json
+import time
+from types import SimpleNamespace
+import pytest
+from app.services.auth_service import AuthService, TokenVerificationCache, token_expiry
+
+def make_token(exp):
+    payload = base64.urlsafe_b64encode(json.dumps({"sub": "u", "exp": exp}).encode()).decode().rstrip("=")
+    return f"header.{payload}.signature"
+
+class AuthApiError(Exception):
+    def __init__(self, status):
+        super().__init__("invalid JWT")
+        self.status = status
+
+class FakeAuth:
+    """模拟Supabase SDK：get_user返回对象形式的响应"""
+
+    def __init__(self):
+        self.calls = 0
+        self.valid = {}
+        self.down = False
+
+    def get_user(self, token):
+        self.calls += 1
+        if self.down:
+            raise ConnectionError("network unreachable")
+        if token not in self.valid:
+            raise AuthApiError(401)
+        return SimpleNamespace(user=SimpleNamespace(id=self.valid[token]))
+
+@pytest.fixture
+def service():
+    service = AuthService(token_cache=TokenVerificationCache(max_size=10, max_ttl=300, negative_ttl=30))
+    service.client = SimpleNamespace(auth=FakeAuth())
+    return service
+
+@pytest.mark.asyncio
+async def test_valid_tokens_are_verified_once(service):
+    token = make_token(time.time() + 3600)
+    service.client.auth.valid[token] = "user-1"
+    assert await service.get_user_from_token(token) == "user-1"
+    assert await service.get_user_from_token(token) == "user-1"
+    assert await service.verify_token(token) == {"user": {"id": "user-1"}}
+    assert service.client.auth.calls == 1
+
+@pytest.mark.asyncio
+async def test_invalid_tokens_are_negatively_cached(service):
+    assert await service.get_user_from_token("bogus") is None
+    assert await service.get_user_from_token("bogus") is None
+    assert service.client.auth.calls == 1
+
+@pytest.mark.asyncio
+async def test_transient_errors_are_not_cached(service):
+    token = make_token(time.time() + 3600)
+    service.client.auth.valid[token] = "user-1"
+    service.client.auth.down = True
+    assert await service.get_user_from_token(token) is None
+    service.client.auth.down = False
+    assert await service.get_user_from_token(token) == "user-1"
+
+@pytest.mark.asyncio
+async def test_expired_tokens_are_not_cached(service):
+    token = make_token(time.time() - 1)
+    service.client.auth.valid[token] = "user-1"
+    await service.get_user_from_token(token)
+    await service.get_user_from_token(token)
+    assert service.client.auth.calls == 2
+
+def test_cache_ttl_is_bounded_by_exp():
+    cache = TokenVerificationCache(max_ttl=300)
+    token = make_token(time.time() + 0.05)
+    cache.set_valid(token, "user-1", token_expiry(token))
+    assert cache.get(token) == {"user_id": "user-1"}
+    time.sleep(0.06)
+    assert cache.get(token) is None
+    assert token_expiry("not-a-jwt") is None
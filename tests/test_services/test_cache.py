@@ -0,0 +1,107 @@
+import threading
+import time
+import pytest
+from app.utils.cache import LRUCache, SQLiteCache, TieredCache, content_hash, normalize_text
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+def test_lru_ttl_and_counters():
+    cache = LRUCache(max_size=10, ttl=0.05)
+    cache.set("a", 1)
+    cache.set("forever", 2, ttl=60)
+    assert cache.get("a") == 1
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert cache.get("forever") == 2
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["misses"] == 1 and stats["expirations"] == 1
+
+def test_content_hash_normalizes_text():
+    assert normalize_text("  ＦａｓｔＡＰＩ\n\t学习 ") == "FastAPI 学习"
+    assert content_hash("ＦａｓｔＡＰＩ  学习", "m", "v1") == content_hash("FastAPI 学习", "m", "v1")
+    assert content_hash("FastAPI 学习", "m", "v1") != content_hash("FastAPI 学习", "m", "v2")
+    assert content_hash("FastAPI 学习", "m1", "v1") != content_hash("FastAPI 学习", "m2", "v1")
+
+def test_sqlite_cache_persists_and_evicts(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = SQLiteCache(path, max_entries=2)
+    cache.set("a", {"summary": "摘要"})
+    cache.set("b", ["x"])
+    cache.get("a")
+    cache.set("c", "z")
+    assert cache.get("b") is None
+    cache.close()
+
+    reopened = SQLiteCache(path, max_entries=2)
+    assert reopened.get("a") == {"summary": "摘要"}
+    assert reopened.get("c") == "z"
+    reopened.close()
+
+def test_sqlite_cache_ttl(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.db"), ttl=-1)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+    cache.close()
+
+def test_tiered_cache_promotes_disk_hits(tmp_path):
+    disk = SQLiteCache(str(tmp_path / "cache.db"))
+    disk.set("k", "v")
+    cache = TieredCache(LRUCache(max_size=10), disk)
+    assert cache.get("k") == "v"
+    assert cache.memory.get("k") == "v"
+    assert cache.stats()["disk"]["hits"] == 1
+    cache.close()
+
+def test_sqlite_cache_batches_access_time_updates(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.db"), max_entries=2, touch_batch=3)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    changes = cache._conn.total_changes
+    cache.get("a")
+    cache.get("a")
+    # 命中不写库
+    assert cache._conn.total_changes == changes
+    # 淘汰前先写回访问时间，最近访问的a保留
+    cache.set("c", 3)
+    assert cache.get("b") is None and cache.get("a") == 1
+    cache.close()
+
+@pytest.mark.asyncio
+async def test_tiered_cache_async_access_runs_disk_tier_off_loop(tmp_path):
+    disk = SQLiteCache(str(tmp_path / "cache.db"))
+    threads = []
+    get = disk.get
+    disk.get = lambda *args: (threads.append(threading.current_thread()), get(*args))[1]
+    cache = TieredCache(LRUCache(max_size=10), disk)
+    await cache.aset("k", {"v": 1})
+    cache.memory.clear()
+    assert await cache.aget("k") == {"v": 1}
+    assert await cache.aget("k") == {"v": 1}
+    assert await cache.aget("missing") is None
+    # 第二次由内存层命中，不访问磁盘
+    assert len(threads) == 2 and threading.main_thread() not in threads
+    cache.close()
+
+@pytest.mark.asyncio
+async def test_tiered_cache_close_persists_access_times_and_can_reopen(tmp_path):
+    disk = SQLiteCache(str(tmp_path / "cache.db"), max_entries=2)
+    cache = TieredCache(LRUCache(max_size=10), disk)
+    await cache.aset("a", 1)
+    await cache.aset("b", 2)
+    cache.memory.clear()
+    await cache.aget("a")
+    await cache.aclose()
+
+    # 关闭时写回了a的访问时间，重新打开后淘汰的是b
+    await cache.aset("c", 3)
+    cache.memory.clear()
+    assert await cache.aget("b") is None and await cache.aget("a") == 1
+    cache.close()
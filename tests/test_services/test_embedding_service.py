@@ -0,0 +1,51 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.services.embedding_service import EmbeddingProvider, EmbeddingService, HashingEmbeddingProvider
+from app.utils.cache import LRUCache, SQLiteCache, TieredCache
+
+class CountingProvider(EmbeddingProvider):
+    def __init__(self):
+        self.inner = HashingEmbeddingProvider(dim=64)
+        self.name = self.inner.name
+        self.dim = self.inner.dim
+        self.calls = []
+
+    def embed_batch(self, texts):
+        self.calls.append(list(texts))
+        return self.inner.embed_batch(texts)
+
+def test_hashing_provider_is_deterministic_and_normalized():
+    provider = HashingEmbeddingProvider(dim=64)
+    first, second, other = provider.embed_batch(["学习FastAPI", "学习FastAPI", "周末散步"])
+    assert np.array_equal(first, second)
+    assert np.linalg.norm(first) == pytest.approx(1.0)
+    assert first @ other < first @ second
+
+def test_hashing_provider_ngrams_tolerate_spelling_variants():
+    provider = HashingEmbeddingProvider(dim=256)
+    base, variant, unrelated = provider.embed_batch(["database", "databases", "gardening"])
+    assert base @ variant > base @ unrelated
+
+def test_batch_encodes_only_cache_misses_once():
+    provider = CountingProvider()
+    service = EmbeddingService(provider, TieredCache(LRUCache(max_size=100)))
+    vectors = service.embed_batch(["a b", "c d", "a  b"])
+    assert provider.calls == [["a b", "c d"]]
+    assert np.array_equal(vectors[0], vectors[2])
+
+    again = service.embed_batch(["c d", "e f"])
+    assert provider.calls[-1] == ["e f"]
+    assert np.array_equal(again[0], vectors[1])
+
+def test_disk_cache_survives_restart(tmp_path):
+    path = str(tmp_path / "embeddings.db")
+    first = EmbeddingService(CountingProvider(), TieredCache(LRUCache(max_size=10), SQLiteCache(path)))
+    expected = first.embed("记忆管理")
+    first.close()
+
+    provider = CountingProvider()
+    second = EmbeddingService(provider, TieredCache(LRUCache(max_size=10), SQLiteCache(path)))
+    assert np.array_equal(second.embed("记忆管理"), expected)
+    assert provider.calls == []
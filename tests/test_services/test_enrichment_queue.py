@@ -0,0 +1,105 @@
+import asyncio
+import json
+import re
+import httpx
+import pytest
+from app.services.enrichment_queue import EnrichmentQueue, estimate_tokens
+from app.services.llm_service import LLMService
+
+def batch_handler(calls, max_in_flight=None):
+    """按提示词中的编号返回每条内容的富化结果"""
+    state = {"in_flight": 0, "peak": 0}
+
+    async def handler(request):
+        prompt = json.loads(request.content)["messages"][0]["content"]
+        calls.append(prompt)
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        await asyncio.sleep(0.01)
+        state["in_flight"] -= 1
+        items = re.findall(r"^\[(\d+)\] (.*)$", prompt, re.MULTILINE)
+        if items:
+            body = {"items": [{"index": int(i), "summary": f"摘要:{text}", "tags": ["t"], "keywords": ["k"]}
+                              for i, text in items]}
+        else:
+            text = prompt.rsplit("内容：", 1)[-1]
+            body = {"summary": f"摘要:{text}", "tags": ["t"], "keywords": ["k"]}
+        return httpx.Response(200, json={"choices": [{"message": {"content": json.dumps(body, ensure_ascii=False)}}]})
+
+    return handler, state
+
+@pytest.mark.asyncio
+async def test_concurrent_items_are_packed_into_one_call():
+    calls = []
+    handler, _ = batch_handler(calls)
+    llm = LLMService(transport=httpx.MockTransport(handler))
+    queue = EnrichmentQueue(llm, max_batch_items=10, linger=0.01)
+
+    results = await queue.enrich_many([f"内容{i}" for i in range(5)])
+    assert [r.summary for r in results] == [f"摘要:内容{i}" for i in range(5)]
+    assert len(calls) == 1
+    await queue.close()
+    await llm.shutdown()
+
+@pytest.mark.asyncio
+async def test_batches_split_by_size_and_run_under_concurrency_limit():
+    calls = []
+    handler, state = batch_handler(calls)
+    llm = LLMService(transport=httpx.MockTransport(handler))
+    queue = EnrichmentQueue(llm, max_batch_items=2, max_concurrency=2, linger=0.01)
+
+    results = await queue.enrich_many([f"内容{i}" for i in range(8)])
+    assert [r.summary for r in results] == [f"摘要:内容{i}" for i in range(8)]
+    assert len(calls) == 4
+    assert state["peak"] <= 2
+    await queue.close()
+    await llm.shutdown()
+
+@pytest.mark.asyncio
+async def test_duplicates_and_cached_items_skip_the_llm():
+    calls = []
+    handler, _ = batch_handler(calls)
+    llm = LLMService(transport=httpx.MockTransport(handler))
+    queue = EnrichmentQueue(llm, linger=0.01)
+
+    first = await queue.enrich_many(["相同内容", "相同内容 ", "不同内容"])
+    assert first[0] == first[1]
+    assert len(calls) == 1
+    await queue.enrich_many(["相同内容", "不同内容"])
+    assert len(calls) == 1
+    await queue.close()
+    await llm.shutdown()
+
+@pytest.mark.asyncio
+async def test_missing_batch_items_fall_back_to_single_calls():
+    calls = []
+
+    def handler(request):
+        prompt = json.loads(request.content)["messages"][0]["content"]
+        calls.append(prompt)
+        if "编号" in prompt:
+            body = {"items": [{"index": 0, "summary": "第一条", "tags": [], "keywords": []}]}
+        else:
+            body = {"summary": "单独处理", "tags": [], "keywords": []}
+        return httpx.Response(200, json={"choices": [{"message": {"content": json.dumps(body, ensure_ascii=False)}}]})
+
+    llm = LLMService(transport=httpx.MockTransport(handler))
+    queue = EnrichmentQueue(llm, linger=0.01)
+    results = await queue.enrich_many(["甲", "乙"])
+    assert [r.summary for r in results] == ["第一条", "单独处理"]
+    assert len(calls) == 2
+    await queue.close()
+    await llm.shutdown()
+
+@pytest.mark.asyncio
+async def test_batch_failure_propagates_to_every_item():
+    llm = LLMService(transport=httpx.MockTransport(lambda request: httpx.Response(400)))
+    queue = EnrichmentQueue(llm, linger=0.01)
+    results = await asyncio.gather(queue.enrich("甲"), queue.enrich("乙"), return_exceptions=True)
+    assert all(isinstance(r, httpx.HTTPStatusError) for r in results)
+    await queue.close()
+    await llm.shutdown()
+
+def test_estimate_tokens_counts_cjk_per_character():
+    assert estimate_tokens("记忆管理") > estimate_tokens("memo")
+    assert estimate_tokens("a" * 400) < estimate_tokens("记" * 400)
@@ -0,0 +1,74 @@
+import asyncio
+import threading
+import time
+import pytest
+from app.utils.executor import BlockingExecutor
+from app.utils.exceptions import ServiceUnavailableException, GatewayTimeoutException
+from app.services.memory_service import MemoryService
+
+@pytest.mark.asyncio
+async def test_blocking_call_does_not_block_event_loop():
+    executor = BlockingExecutor(max_workers=2, max_queue=0, timeout=5)
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    result, _ = await asyncio.gather(executor.run(time.sleep, 0.1), ticker())
+    assert result is None
+    assert len(ticks) == 5
+    assert ticks[-1] - ticks[0] < 0.1
+    executor.shutdown()
+
+@pytest.mark.asyncio
+async def test_queue_full_raises_503():
+    executor = BlockingExecutor(max_workers=1, max_queue=1, timeout=5)
+    release = threading.Event()
+    running = [asyncio.ensure_future(executor.run(release.wait)) for _ in range(2)]
+    await asyncio.sleep(0.01)
+    assert executor.pending == 2
+
+    with pytest.raises(ServiceUnavailableException) as exc_info:
+        await executor.run(release.wait)
+    assert exc_info.value.status_code == 503
+
+    release.set()
+    await asyncio.gather(*running)
+    assert executor.pending == 0
+    executor.shutdown()
+
+@pytest.mark.asyncio
+async def test_timeout_raises_504_and_keeps_slot_until_thread_finishes():
+    executor = BlockingExecutor(max_workers=1, max_queue=0, timeout=0.05)
+    release = threading.Event()
+
+    with pytest.raises(GatewayTimeoutException) as exc_info:
+        await executor.run(release.wait)
+    assert exc_info.value.status_code == 504
+    # 线程仍在运行，槽位不应提前释放
+    assert executor.pending == 1
+
+    release.set()
+    for _ in range(100):
+        if executor.pending == 0:
+            break
+        await asyncio.sleep(0.01)
+    assert executor.pending == 0
+    executor.shutdown()
+
+@pytest.mark.asyncio
+async def test_memory_service_dispatches_through_executor():
+    service = MemoryService()
+    calling_threads = []
+    original_get_all = service.client.get_all
+
+    def get_all(user_id):
+        calling_threads.append(threading.current_thread().name)
+        return original_get_all(user_id=user_id)
+
+    service.client.get_all = get_all
+    await service.get_all_memories(user_id="executor-user")
+    assert calling_threads and calling_threads[0].startswith("mem0")
+    await service.shutdown()
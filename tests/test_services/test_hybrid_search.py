@@ -0,0 +1,67 @@
+import pytest
+from app.services.demo_memory_client import DemoMemoryClient
+from app.services.hybrid_search import matches_filters, reciprocal_rank_fusion, weighted_fusion
+from app.services.memory_service import MemoryService
+
+def test_rrf_rewards_documents_ranked_by_both_sources():
+    fused = reciprocal_rank_fusion({
+        "keyword": [("a", 9.0), ("b", 5.0)],
+        "vector": [("b", 0.9), ("c", 0.8)],
+    }, k=60)
+    assert [item_id for item_id, _ in fused] == ["b", "a", "c"]
+    assert fused[0][1] == pytest.approx(1 / 62 + 1 / 61)
+
+def test_weighted_fusion_normalizes_each_source():
+    fused = weighted_fusion({
+        "keyword": [("a", 10.0), ("b", 5.0)],
+        "vector": [("b", 0.8), ("a", 0.2)],
+    }, weights={"keyword": 1.0, "vector": 2.0})
+    assert fused[0] == ("b", pytest.approx(0.5 + 2.0))
+    assert fused[1] == ("a", pytest.approx(1.0 + 0.5))
+
+def test_matches_filters():
+    memory = {"metadata": {"category": "study", "tags": ["FastAPI", "编程"], "importance": "high"}}
+    assert matches_filters(memory, categories=["work", "study"])
+    assert not matches_filters(memory, categories=["work"])
+    assert matches_filters(memory, metadata_filter={"tags": "FastAPI", "importance": "high"})
+    assert not matches_filters(memory, metadata_filter={"importance": "low"})
+    assert not matches_filters(memory, metadata_filter={"missing": None})
+    assert matches_filters({"categories": ["work"], "metadata": {}}, categories=["work"])
+
+@pytest.mark.asyncio
+async def test_default_search_applies_filters():
+    service = MemoryService(client=DemoMemoryClient(api_key="demo"))
+    await service.add_memory("FastAPI学习笔记", "u", {"category": "study"})
+    await service.add_memory("FastAPI项目上线", "u", {"category": "work"})
+    results = await service.search_memories("FastAPI", "u", limit=5, categories=["work"])
+    assert [r["memory"] for r in results] == ["FastAPI项目上线"]
+
+@pytest.mark.asyncio
+async def test_hybrid_search_fuses_keyword_and_vector_results():
+    pytest.importorskip("numpy")
+    from app.services.vector_store import VectorMemoryClient
+
+    service = MemoryService(client=VectorMemoryClient(api_key="local", dim=128))
+    await service.add_memory("今天学习了FastAPI的依赖注入", "u", {"importance": "high"})
+    await service.add_memory("FastAPI依赖注入踩坑记录", "u", {"importance": "low"})
+    await service.add_memory("周末去公园散步", "u", {"importance": "high"})
+
+    results = await service.search_memories("FastAPI依赖注入", "u", limit=2, mode="hybrid")
+    assert len(results) == 2
+    assert all(set(r["scores"]) == {"keyword", "vector"} for r in results)
+    assert results[0]["score"] >= results[1]["score"]
+
+    results = await service.search_memories("FastAPI依赖注入", "u", limit=5, mode="hybrid",
+                                            fusion="weighted", metadata_filter={"importance": "high"})
+    assert [r["memory"] for r in results][0] == "今天学习了FastAPI的依赖注入"
+    assert all(r["metadata"]["importance"] == "high" for r in results)
+
+    keyword = await service.search_memories("散步", "u", limit=5, mode="keyword")
+    assert [r["memory"] for r in keyword] == ["周末去公园散步"]
+
+@pytest.mark.asyncio
+async def test_hybrid_falls_back_to_default_search_without_vector_support():
+    service = MemoryService(client=DemoMemoryClient(api_key="demo"))
+    await service.add_memory("学习FastAPI", "u")
+    results = await service.search_memories("FastAPI", "u", limit=5, mode="hybrid")
+    assert [r["memory"] for r in results] == ["学习FastAPI"] and "scores" not in results[0]
@@ -0,0 +1,95 @@
+import asyncio
+import json
+import pytest
+from app.services.demo_memory_client import DemoMemoryClient
+from app.services.import_service import ImportCheckpointStore, ImportService
+from app.services.memory_service import MemoryService
+from app.utils.exceptions import ServiceUnavailableException
+
+def ndjson(lines):
+    return "".join(line + "\n" for line in lines).encode("utf-8")
+
+async def chunked(data, size=7):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+class FailingClient(DemoMemoryClient):
+    """写入指定内容时模拟后端不可用"""
+
+    def __init__(self, fail_on):
+        super().__init__(api_key="demo")
+        self.fail_on = fail_on
+
+    def add(self, messages, user_id, metadata=None):
+        if messages[0]["content"] in self.fail_on:
+            raise RuntimeError("backend down")
+        return super().add(messages, user_id, metadata)
+
+@pytest.mark.asyncio
+async def test_import_counts_created_and_invalid_lines():
+    service = MemoryService(client=DemoMemoryClient(api_key="demo"))
+    importer = ImportService(ImportCheckpointStore(), batch_size=2, max_in_flight=2)
+    data = ndjson([json.dumps({"content": f"m{i}"}) for i in range(5)] + ["", "{bad", json.dumps({"content": " "})])
+    summary = await importer.import_ndjson(service, "u", "job", chunked(data))
+    assert summary["created"] == 5 and summary["invalid"] == 2 and summary["failed"] == 0
+    assert summary["line"] == 8 and summary["lines"] == 8
+    assert [e["line"] for e in summary["errors"]] == [7, 8]
+    assert sorted(m["memory"] for m in await service.get_all_memories("u")) == [f"m{i}" for i in range(5)]
+
+@pytest.mark.asyncio
+async def test_import_resumes_from_checkpoint_after_backend_outage():
+    client = FailingClient(fail_on={"m4", "m5"})
+    service = MemoryService(client=client)
+    importer = ImportService(ImportCheckpointStore(), batch_size=2, max_in_flight=1)
+    data = ndjson([json.dumps({"content": f"m{i}"}) for i in range(8)])
+
+    with pytest.raises(ServiceUnavailableException):
+        await importer.import_ndjson(service, "u", "job", chunked(data))
+    checkpoint = await importer.get_checkpoint("u", "job")
+    assert checkpoint["line"] == 4 and checkpoint["created"] == 4
+
+    client.fail_on = set()
+    summary = await importer.import_ndjson(service, "u", "job", chunked(data))
+    assert summary["resumed_from"] == 4 and summary["created"] == 8
+    assert sorted(m["memory"] for m in await service.get_all_memories("u")) == [f"m{i}" for i in range(8)]
+
+@pytest.mark.asyncio
+async def test_import_partial_batch_failures_are_reported_not_retried():
+    service = MemoryService(client=FailingClient(fail_on={"m1"}))
+    importer = ImportService(ImportCheckpointStore(), batch_size=2)
+    data = ndjson([json.dumps({"content": f"m{i}"}) for i in range(3)])
+    summary = await importer.import_ndjson(service, "u", "job", chunked(data))
+    assert summary["created"] == 2 and summary["failed"] == 1 and summary["line"] == 3
+    assert summary["errors"] == [{"line": 2, "error": "backend down"}]
+
+@pytest.mark.asyncio
+async def test_import_limits_in_flight_batches():
+    in_flight = peak = 0
+
+    class SlowService(MemoryService):
+        async def add_memories(self, items, user_id, concurrency=None):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return [{"status": "created", "memory_id": "x"} for _ in items]
+
+    importer = ImportService(ImportCheckpointStore(), batch_size=1, max_in_flight=3)
+    data = ndjson([json.dumps({"content": f"m{i}"}) for i in range(20)])
+    summary = await importer.import_ndjson(SlowService(client=DemoMemoryClient(api_key="demo")), "u", "job", chunked(data))
+    assert summary["created"] == 20 and summary["line"] == 20
+    assert peak == 3
+
+@pytest.mark.asyncio
+async def test_checkpoints_persist_to_sqlite_off_the_event_loop(tmp_path):
+    path = str(tmp_path / "checkpoints.db")
+    first = ImportCheckpointStore(path)
+    importer = ImportService(first, batch_size=2)
+    data = ndjson([json.dumps({"content": f"m{i}"}) for i in range(5)])
+    await importer.import_ndjson(MemoryService(client=DemoMemoryClient(api_key="demo")), "u", "job", chunked(data))
+    await importer.close()
+
+    second = ImportCheckpointStore(path)
+    assert (await second.aget("u", "job"))["line"] == 5
+    await second.aclose()
@@ -0,0 +1,97 @@
+import json
+import time
+from types import SimpleNamespace
+import httpx
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from app.services.auth_service import AuthService, TokenVerificationCache
+from app.services.jwt_verifier import JWTVerifier, UnknownKeyError
+
+SECRET = "super-secret-jwt-token-with-at-least-32-characters"
+
+def mint(key, algorithm="HS256", kid=None, **claims):
+    payload = {"sub": "user-1", "aud": "authenticated", "exp": int(time.time()) + 3600, **claims}
+    headers = {"kid": kid} if kid else None
+    return jwt.encode(payload, key, algorithm=algorithm, headers=headers)
+
+def jwk_of(private_key, kid, algorithm):
+    data = json.loads(jwt.algorithms.get_default_algorithms()[algorithm].to_jwk(private_key.public_key()))
+    return dict(data, kid=kid, alg=algorithm, use="sig")
+
+class JWKSServer:
+    def __init__(self, keys):
+        self.keys = keys
+        self.requests = 0
+
+    def transport(self):
+        def handler(request):
+            self.requests += 1
+            return httpx.Response(200, json={"keys": self.keys})
+        return httpx.MockTransport(handler)
+
+def test_hs256_tokens_verify_with_project_secret():
+    verifier = JWTVerifier(secret=SECRET)
+    assert verifier.verify(mint(SECRET))["sub"] == "user-1"
+    with pytest.raises(jwt.InvalidSignatureError):
+        verifier.verify(mint("another-secret-that-is-also-32-bytes-long"))
+    with pytest.raises(jwt.ExpiredSignatureError):
+        verifier.verify(mint(SECRET, exp=int(time.time()) - 120))
+    with pytest.raises(jwt.InvalidAudienceError):
+        verifier.verify(mint(SECRET, aud="anon-service"))
+
+@pytest.mark.asyncio
+async def test_asymmetric_tokens_verify_with_jwks():
+    rsa_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    ec_key = ec.generate_private_key(ec.SECP256R1())
+    server = JWKSServer([jwk_of(rsa_key, "rsa-1", "RS256"), jwk_of(ec_key, "ec-1", "ES256")])
+    verifier = JWTVerifier(jwks_url="https://project.supabase.co/jwks", transport=server.transport())
+    await verifier.start()
+    try:
+        assert verifier.verify(mint(rsa_key, "RS256", kid="rsa-1"))["sub"] == "user-1"
+        assert verifier.verify(mint(ec_key, "ES256", kid="ec-1"))["sub"] == "user-1"
+        with pytest.raises(jwt.InvalidSignatureError):
+            verifier.verify(mint(rsa.generate_private_key(public_exponent=65537, key_size=2048), "RS256", kid="rsa-1"))
+        # 没有配置secret时不接受HS256，避免用公钥当HMAC密钥的算法混淆
+        with pytest.raises(UnknownKeyError):
+            verifier.verify(mint(SECRET))
+        assert server.requests == 1
+    finally:
+        await verifier.close()
+
+@pytest.mark.asyncio
+async def test_unknown_kid_triggers_background_refresh():
+    old_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    new_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    server = JWKSServer([jwk_of(old_key, "old", "RS256")])
+    verifier = JWTVerifier(jwks_url="https://project.supabase.co/jwks", transport=server.transport(),
+                           min_refresh_interval=0)
+    await verifier.start()
+    server.keys.append(jwk_of(new_key, "new", "RS256"))
+    token = mint(new_key, "RS256", kid="new")
+    with pytest.raises(UnknownKeyError):
+        verifier.verify(token)
+    await verifier._refresh_task
+    assert verifier.verify(token)["sub"] == "user-1"
+    await verifier.close()
+
+class RemoteAuth:
+    def __init__(self):
+        self.calls = 0
+
+    def get_user(self, token):
+        self.calls += 1
+        return SimpleNamespace(user=SimpleNamespace(id="remote-user"))
+
+@pytest.mark.asyncio
+async def test_auth_service_verifies_locally_and_falls_back_for_unknown_keys():
+    service = AuthService(token_cache=TokenVerificationCache(), verifier=JWTVerifier(secret=SECRET))
+    service.client = SimpleNamespace(auth=RemoteAuth())
+
+    assert await service.get_user_from_token(mint(SECRET)) == "user-1"
+    assert await service.get_user_from_token(mint("wrong-secret-wrong-secret-wrong-secret")) is None
+    assert service.client.auth.calls == 0
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    assert await service.get_user_from_token(mint(key, "RS256", kid="unknown")) == "remote-user"
+    assert service.client.auth.calls == 1
@@ -1,33 +1,191 @@
+import httpx
 import pytest
-from unittest.mock import patch, MagicMock
+from app.services import llm_service as llm_module
 from app.services.llm_service import LLMService
 
+def chat_response(content, status_code=200, headers=None):
+    return httpx.Response(
+        status_code,
+        json={"choices": [{"message": {"content": content}}]},
+        headers=headers
+    )
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(llm_module.asyncio, "sleep", fake_sleep)
+    return delays
+
 @pytest.mark.asyncio
-@patch("httpx.AsyncClient")
-async def test_summarize(mock_async_client):
-    class MockResponse:
-        async def json(self):
-            return {"choices": [{"message": {"content": "摘要结果"}}]}
-        async def raise_for_status(self):
-            return None
-    mock_instance = MagicMock()
-    mock_instance.__aenter__.return_value.post.return_value = MockResponse()
-    mock_async_client.return_value = mock_instance
-    service = LLMService()
+async def test_summarize():
+    service = LLMService(transport=httpx.MockTransport(lambda request: chat_response("摘要结果")))
     result = await service.summarize("测试内容")
     assert result == "摘要结果"
+    await service.shutdown()
 
 @pytest.mark.asyncio
-@patch("httpx.AsyncClient")
-async def test_extract_tags(mock_async_client):
-    class MockResponse:
-        async def json(self):
-            return {"choices": [{"message": {"content": "标签1, 标签2, 标签3"}}]}
-        async def raise_for_status(self):
-            return None
-    mock_instance = MagicMock()
-    mock_instance.__aenter__.return_value.post.return_value = MockResponse()
-    mock_async_client.return_value = mock_instance
-    service = LLMService()
+async def test_extract_tags():
+    service = LLMService(transport=httpx.MockTransport(lambda request: chat_response("标签1, 标签2, 标签3")))
     result = await service.extract_tags("测试内容")
-    assert result == ["标签1", "标签2", "标签3"] 
\ No newline at end of file
+    assert result == ["标签1", "标签2", "标签3"]
+    await service.shutdown()
+
+@pytest.mark.asyncio
+async def test_client_is_reused_across_calls():
+    service = LLMService(transport=httpx.MockTransport(lambda request: chat_response("ok")))
+    await service.startup()
+    client = service._client
+    await service.summarize("a")
+    await service.extract_tags("b")
+    assert service._client is client
+    await service.shutdown()
+    assert client.is_closed
+
+@pytest.mark.asyncio
+async def test_retries_on_429_and_5xx(no_sleep):
+    responses = [
+        httpx.Response(429, headers={"Retry-After": "2"}),
+        httpx.Response(503),
+        chat_response("最终结果"),
+    ]
+    service = LLMService(transport=httpx.MockTransport(lambda request: responses.pop(0)))
+    assert await service.summarize("内容") == "最终结果"
+    assert no_sleep[0] == 2.0
+    assert 0 <= no_sleep[1] <= service.retry_backoff * 2
+    await service.shutdown()
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_retries(no_sleep):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(500)
+
+    service = LLMService(transport=httpx.MockTransport(handler))
+    with pytest.raises(httpx.HTTPStatusError):
+        await service.summarize("内容")
+    assert len(calls) == service.max_retries + 1
+    await service.shutdown()
+
+@pytest.mark.asyncio
+async def test_client_errors_are_not_retried(no_sleep):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(400)
+
+    service = LLMService(transport=httpx.MockTransport(handler))
+    with pytest.raises(httpx.HTTPStatusError):
+        await service.summarize("内容")
+    assert len(calls) == 1
+    await service.shutdown()
+
+@pytest.mark.asyncio
+async def test_enrich_single_structured_call():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return chat_response('```json\n{"summary": "学习FastAPI", "tags": ["编程", "编程"], "keywords": ["FastAPI", "依赖注入"]}\n```')
+
+    service = LLMService(transport=httpx.MockTransport(handler))
+    result = await service.enrich("今天学习了FastAPI的依赖注入")
+    assert result.summary == "学习FastAPI"
+    assert result.tags == ["编程"]
+    assert result.keywords == ["FastAPI", "依赖注入"]
+    assert len(requests) == 1
+    assert b'"response_format"' in requests[0].content
+    await service.shutdown()
+
+@pytest.mark.parametrize("text", [
+    "不是JSON",
+    '["summary"]',
+    '{"summary": "", "tags": []}',
+    '{"summary": "ok", "tags": "a, b"}',
+])
+def test_parse_enrichment_is_strict(text):
+    from app.services.llm_service import parse_enrichment
+    with pytest.raises(ValueError):
+        parse_enrichment(text)
+
+@pytest.mark.asyncio
+async def test_enrich_falls_back_to_separate_calls():
+    def handler(request):
+        prompt = request.content.decode("utf-8")
+        if "JSON" in prompt:
+            return chat_response("抱歉，我无法输出JSON")
+        if "总结" in prompt:
+            return chat_response("一句话摘要")
+        return chat_response("标签1, 标签2")
+
+    service = LLMService(transport=httpx.MockTransport(handler))
+    result = await service.enrich("内容")
+    assert result.summary == "一句话摘要"
+    assert result.tags == ["标签1", "标签2"]
+    assert result.keywords == ["标签1", "标签2"]
+    await service.shutdown()
+
+@pytest.mark.asyncio
+async def test_enrich_results_are_cached_by_normalized_content():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return chat_response('{"summary": "摘要", "tags": ["标签"], "keywords": ["关键词"]}')
+
+    service = LLMService(transport=httpx.MockTransport(handler))
+    first = await service.enrich("今天学习了 FastAPI")
+    second = await service.enrich("  今天学习了\nFastAPI ")
+    assert first == second
+    assert len(calls) == 1
+    assert service.cache_stats()["memory"]["hits"] == 1
+    await service.shutdown()
+
+@pytest.mark.asyncio
+async def test_cache_survives_restart_with_sqlite_tier(tmp_path):
+    from app.utils.cache import LRUCache, SQLiteCache, TieredCache
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return chat_response("摘要结果")
+
+    path = str(tmp_path / "llm.db")
+    for _ in range(2):
+        cache = TieredCache(LRUCache(max_size=10), SQLiteCache(path))
+        service = LLMService(transport=httpx.MockTransport(handler), cache=cache)
+        assert await service.summarize("测试内容") == "摘要结果"
+        await service.shutdown()
+        # shutdown写回并关闭磁盘层
+        assert cache.disk._conn is None
+    assert len(calls) == 1
+
+@pytest.mark.asyncio
+async def test_stream_summary_consumes_sse_incrementally():
+    from tests.fake_servers import create_fake_llm_app
+    app = create_fake_llm_app(["今天", "学习了", "FastAPI"])
+    service = LLMService(transport=httpx.ASGITransport(app=app))
+    service.base_url = "http://fake-llm/chat/completions"
+
+    deltas = [delta async for delta in service.stream_summary("内容")]
+    assert deltas == ["今天", "学习了", "FastAPI"]
+    assert app.state.payloads[0]["stream"] is True
+
+    # 完整摘要写入缓存，再次请求不再访问上游
+    assert [delta async for delta in service.stream_summary("内容")] == ["今天学习了FastAPI"]
+    assert await service.summarize("内容") == "今天学习了FastAPI"
+    assert len(app.state.payloads) == 1
+    await service.shutdown()
+
+@pytest.mark.asyncio
+async def test_stream_summary_raises_on_http_error():
+    service = LLMService(transport=httpx.MockTransport(lambda request: httpx.Response(401)))
+    with pytest.raises(httpx.HTTPStatusError):
+        [delta async for delta in service.stream_summary("内容")]
+    await service.shutdown()
@@ -0,0 +1,138 @@
+import os
+import pytest
+from app.services import log_memory_store
+from app.services.log_memory_store import LogMemoryClient
+from app.services.memory_service import MemoryService
+from app.utils.exceptions import InvalidCursorException
+
+def open_store(path, **kwargs):
+    return LogMemoryClient(str(path), compact_interval=0, **kwargs)
+
+def add(client, content, user_id="u"):
+    return client.add([{"role": "user", "content": content}], user_id=user_id)["id"]
+
+def test_crud_and_ownership(tmp_path):
+    client = open_store(tmp_path)
+    first = add(client, "学习FastAPI依赖注入")
+    second = add(client, "周末去爬山")
+    other = add(client, "FastAPI依赖注入", user_id="u2")
+
+    assert [m["id"] for m in client.search("依赖注入", user_id="u")] == [first]
+    client.update(first, "学习Django")
+    assert client.get(first)["memory"] == "学习Django" and "_seq" not in client.get(first)
+    assert client.search("依赖注入", user_id="u") == []
+    assert "error" in client.delete(other, user_id="u")
+    client.delete(second)
+    assert [m["id"] for m in client.get_all("u")] == [first]
+    assert client.get(second) is None
+    client.close()
+
+def test_reopen_rebuilds_index_from_footers(tmp_path, monkeypatch):
+    client = open_store(tmp_path, segment_max_bytes=256)
+    ids = [add(client, f"memory {i}") for i in range(20)]
+    client.update(ids[3], "changed")
+    client.delete(ids[5])
+    client.close()
+
+    # 封存段只读footer，不逐条扫描
+    def no_scan(self):
+        raise AssertionError("sealed segment should not be scanned")
+    monkeypatch.setattr(log_memory_store.Segment, "_scan", no_scan)
+    reopened = open_store(tmp_path)
+    memories = reopened.get_all("u")
+    assert [m["id"] for m in memories] == ids[:5] + ids[6:]
+    assert reopened.get(ids[3])["memory"] == "changed"
+    reopened.close()
+
+def test_torn_tail_of_unsealed_segment_is_truncated(tmp_path):
+    client = open_store(tmp_path)
+    kept = add(client, "kept")
+    add(client, "torn")
+    path = client._active.path
+    # 模拟进程崩溃：不封存当前段，最后一条记录只写了一半
+    os.close(client._active._fd)
+    client._active._fd = None
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 3)
+
+    reopened = open_store(tmp_path)
+    assert [m["id"] for m in reopened.get_all("u")] == [kept]
+    new = add(reopened, "after restart")
+    reopened.close()
+    assert [m["id"] for m in open_store(tmp_path).get_all("u")] == [kept, new]
+
+def test_compaction_reclaims_garbage_and_keeps_live_data(tmp_path):
+    client = open_store(tmp_path, segment_max_bytes=512)
+    ids = [add(client, f"memory {i}") for i in range(30)]
+    for memory_id in ids[:20]:
+        client.delete(memory_id)
+    for memory_id in ids[20:25]:
+        client.update(memory_id, "updated")
+    before = sum(s["size"] for s in client.segments())
+
+    assert client.compact() > 0
+    assert sum(s["size"] for s in client.segments()) < before
+    assert [m["id"] for m in client.get_all("u")] == ids[20:]
+    assert [m["memory"] for m in client.get_all("u")][:5] == ["updated"] * 5
+    client.close()
+
+    reopened = open_store(tmp_path)
+    assert [m["id"] for m in reopened.get_all("u")] == ids[20:]
+    assert reopened.get(ids[0]) is None
+    reopened.close()
+
+def test_tombstones_are_reclaimed_once_deleted_records_are_gone(tmp_path):
+    client = open_store(tmp_path, segment_max_bytes=2048)
+    ids = [add(client, f"memory {i}") for i in range(300)]
+    for memory_id in ids:
+        client.delete(memory_id)
+    for _ in range(3):
+        client.compact()
+    # 只剩当前段：删除记录所在的段被整理后，墓碑所在的段也成为垃圾被整理掉
+    assert [s["sealed"] for s in client.segments()] == [False]
+    client.close()
+
+    # 重启后墓碑按同样的规则计为垃圾
+    reopened = open_store(tmp_path, segment_max_bytes=2048)
+    for _ in range(3):
+        reopened.compact()
+    assert reopened.get_all("u") == [] and reopened.get(ids[0]) is None
+    assert [s["sealed"] for s in reopened.segments()] == [False]
+    reopened.close()
+    assert os.listdir(tmp_path) == []
+
+def test_tombstone_is_kept_while_an_older_record_remains(tmp_path):
+    client = open_store(tmp_path, segment_max_bytes=256)
+    kept_old = add(client, "old record in a segment that is not compacted")
+    for i in range(10):
+        add(client, f"filler {i}")
+    client.delete(kept_old)
+    victims = [add(client, f"victim {i}") for i in range(10)]
+    for memory_id in victims:
+        client.delete(memory_id)
+    client.compact()
+    client.close()
+    # 旧记录所在段未被整理，墓碑必须保留，否则重启后记录会复活
+    reopened = open_store(tmp_path)
+    assert reopened.get(kept_old) is None
+    assert [m["memory"] for m in reopened.get_all("u")] == [f"filler {i}" for i in range(10)]
+    reopened.close()
+
+@pytest.mark.asyncio
+async def test_memory_service_pages_log_backend(tmp_path):
+    service = MemoryService(client=open_store(tmp_path))
+    for i in range(5):
+        await service.add_memory(f"m{i}", user_id="u")
+    page = await service.list_memories("u", limit=3, use_cache=False)
+    rest = await service.list_memories("u", limit=3, cursor=page["next_cursor"], use_cache=False)
+    assert [m["memory"] for m in page["results"] + rest["results"]] == [f"m{i}" for i in range(5)]
+    assert not rest["has_more"] and rest["total"] == 5
+    await service.shutdown()
+
+def test_list_rejects_cursor_of_wrong_type(tmp_path):
+    client = open_store(tmp_path)
+    client.add([{"role": "user", "content": "m"}], user_id="u")
+    for cursor in ([1, 2], "1", True):
+        with pytest.raises(InvalidCursorException):
+            client.list("u", cursor=cursor)
+    client.close()
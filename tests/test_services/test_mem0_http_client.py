@@ -0,0 +1,74 @@
+import httpx
+import pytest
+from app.services.memory_service import MemoryService
+from app.services.mem0_http_client import AsyncMem0Client
+from tests.fake_servers import create_fake_mem0_app
+
+def make_service():
+    app = create_fake_mem0_app()
+    client = AsyncMem0Client(
+        api_key="m0-test",
+        base_url="http://fake-mem0",
+        transport=httpx.ASGITransport(app=app)
+    )
+    return app, MemoryService(client=client)
+
+@pytest.mark.asyncio
+async def test_crud_roundtrip_against_fake_server():
+    app, service = make_service()
+    await service.startup()
+
+    added = await service.add_memory("学习FastAPI依赖注入", user_id="u1", metadata={"k": "v"})
+    assert added["id"] == "fake-0"
+    await service.add_memory("别人的记忆", user_id="u2")
+
+    results = await service.search_memories("fastapi", user_id="u1", limit=5)
+    assert [r["id"] for r in results] == ["fake-0"]
+
+    memories = await service.get_all_memories(user_id="u1")
+    assert len(memories) == 1 and memories[0]["metadata"] == {"k": "v"}
+
+    await service.update_memory("fake-0", "学习FastAPI中间件")
+    assert (await service.get_all_memories(user_id="u1"))[0]["memory"] == "学习FastAPI中间件"
+
+    await service.delete_memory("fake-0")
+    assert await service.get_all_memories(user_id="u1") == []
+
+    assert all(auth == "Token m0-test" for _, _, auth in app.state.requests)
+    await service.shutdown()
+
+@pytest.mark.asyncio
+async def test_async_backend_bypasses_thread_pool():
+    _, service = make_service()
+    await service.add_memory("内容", user_id="u1")
+    assert service.executor._executor is None
+    await service.shutdown()
+
+@pytest.mark.asyncio
+async def test_connection_pool_is_shared_and_closed_on_shutdown():
+    _, service = make_service()
+    await service.startup()
+    http_client = service.client._client
+    await service.get_all_memories(user_id="u1")
+    await service.search_memories("x", user_id="u1")
+    assert service.client._client is http_client
+
+    await service.shutdown()
+    assert http_client.is_closed
+    assert service.client._client is None
+
+@pytest.mark.asyncio
+async def test_missing_memory_maps_to_not_found_like_local_backends():
+    _, service = make_service()
+    assert await service.update_memory("missing", "x") == {"error": "Memory not found"}
+    assert await service.delete_memory("missing") == {"error": "Memory not found"}
+    await service.shutdown()
+
+@pytest.mark.asyncio
+async def test_upstream_error_propagates():
+    client = AsyncMem0Client(api_key="m0-test", base_url="http://fake-mem0",
+                             transport=httpx.MockTransport(lambda request: httpx.Response(500)))
+    service = MemoryService(client=client)
+    with pytest.raises(httpx.HTTPStatusError):
+        await service.delete_memory("any")
+    await service.shutdown()
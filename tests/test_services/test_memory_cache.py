@@ -0,0 +1,191 @@
+import asyncio
+import time
+
+import pytest
+from app.services.demo_memory_client import DemoMemoryClient
+from app.services.memory_cache import MemoryListCache, WriteClock
+from app.services.memory_service import MemoryService
+
+class CountingClient(DemoMemoryClient):
+    def __init__(self):
+        super().__init__(api_key="demo")
+        self.calls = {"get_all": 0, "list": 0}
+
+    def get_all(self, user_id):
+        self.calls["get_all"] += 1
+        return super().get_all(user_id)
+
+    def list(self, user_id, limit=50, cursor=None):
+        self.calls["list"] += 1
+        return super().list(user_id, limit=limit, cursor=cursor)
+
+@pytest.fixture
+def service():
+    service = MemoryService(client=CountingClient(), list_cache=MemoryListCache(max_users=2))
+    yield service
+    service.executor.shutdown()
+
+@pytest.mark.asyncio
+async def test_get_all_is_served_from_cache(service):
+    await service.add_memory("a", user_id="u1")
+    assert len(await service.get_all_memories("u1")) == 1
+    assert len(await service.get_all_memories("u1")) == 1
+    assert service.client.calls["get_all"] == 1
+
+@pytest.mark.asyncio
+async def test_writes_invalidate_or_patch_cache(service):
+    memory_id = (await service.add_memory("a", user_id="u1"))["id"]
+    await service.get_all_memories("u1")
+
+    await service.add_memory("b", user_id="u1")
+    assert [m["memory"] for m in await service.get_all_memories("u1")] == ["a", "b"]
+    assert service.client.calls["get_all"] == 2
+
+    await service.update_memory(memory_id, "a2", user_id="u1")
+    assert [m["memory"] for m in await service.get_all_memories("u1")] == ["a2", "b"]
+
+    await service.delete_memory(memory_id)
+    assert [m["memory"] for m in await service.get_all_memories("u1")] == ["b"]
+    assert service.client.calls["get_all"] == 2
+
+@pytest.mark.asyncio
+async def test_list_pages_are_cached_and_dropped_on_delete(service):
+    ids = [(await service.add_memory(f"m{i}", user_id="u1"))["id"] for i in range(3)]
+    first = await service.list_memories("u1", limit=2)
+    assert (await service.list_memories("u1", limit=2)) == first
+    assert service.client.calls["list"] == 1
+
+    await service.delete_memory(ids[0], user_id="u1")
+    page = await service.list_memories("u1", limit=2)
+    assert page["total"] == 2
+    assert service.client.calls["list"] == 2
+
+@pytest.mark.asyncio
+async def test_failed_update_does_not_patch_cache(service):
+    await service.add_memory("a", user_id="u1")
+    await service.get_all_memories("u1")
+    await service.update_memory("missing", "x", user_id="u1")
+    assert [m["memory"] for m in await service.get_all_memories("u1")] == ["a"]
+
+@pytest.mark.asyncio
+async def test_users_are_evicted_least_recently_used(service):
+    for user in ("u1", "u2", "u3"):
+        await service.add_memory("x", user_id=user)
+        await service.get_all_memories(user)
+    assert service.client.calls["get_all"] == 3
+    await service.get_all_memories("u3")
+    await service.get_all_memories("u1")
+    assert service.client.calls["get_all"] == 4
+
+class SlowReadClient(CountingClient):
+    """读取时先取快照再等待，模拟读取期间发生写操作"""
+
+    def get_all(self, user_id):
+        memories = super().get_all(user_id)
+        time.sleep(0.05)
+        return memories
+
+    def list(self, user_id, limit=50, cursor=None):
+        page = super().list(user_id, limit=limit, cursor=cursor)
+        time.sleep(0.05)
+        return page
+
+@pytest.mark.asyncio
+async def test_reads_overlapping_a_write_do_not_fill_cache():
+    service = MemoryService(client=SlowReadClient(), list_cache=MemoryListCache())
+    try:
+        slow_all = asyncio.ensure_future(service.get_all_memories("u1"))
+        slow_page = asyncio.ensure_future(service.list_memories("u1", limit=10))
+        await asyncio.sleep(0.01)
+        await service.add_memory("a", user_id="u1")
+        assert await slow_all == [] and (await slow_page)["results"] == []
+
+        assert [m["memory"] for m in await service.get_all_memories("u1")] == ["a"]
+        assert [m["memory"] for m in (await service.list_memories("u1", limit=10))["results"]] == ["a"]
+        assert service.client.calls == {"get_all": 2, "list": 2}
+    finally:
+        service.executor.shutdown()
+
+def test_fill_with_stale_generation_is_skipped():
+    cache = MemoryListCache()
+    generation = cache.generation("u1")
+    cache.patch("1", {"memory": "b"})
+    cache.set_all("u1", [{"id": "1", "memory": "a"}], generation=generation)
+    assert cache.get_all("u1") is None
+
+def test_large_user_lists_are_not_cached():
+    cache = MemoryListCache(max_user_memories=2)
+    cache.set_all("u1", [{"id": str(i)} for i in range(3)])
+    assert cache.get_all("u1") is None
+
+def test_cached_lists_are_isolated_from_callers():
+    cache = MemoryListCache()
+    cache.set_all("u1", [{"id": "1", "memory": "a"}])
+    returned = cache.get_all("u1")
+    returned.append({"id": "2"})
+    cache.patch("1", {"memory": "b"}, user_id="u1")
+    assert returned[0]["memory"] == "a"
+    assert cache.get_all("u1") == [{"id": "1", "memory": "b"}]
+
+class SearchCountingClient(DemoMemoryClient):
+    def __init__(self):
+        super().__init__(api_key="demo")
+        self.searches = 0
+
+    def search(self, query, user_id, limit=10):
+        self.searches += 1
+        return super().search(query, user_id, limit=limit)
+
+@pytest.fixture
+def search_service():
+    from app.services.memory_cache import SearchResultCache
+    service = MemoryService(client=SearchCountingClient(), search_cache=SearchResultCache())
+    yield service
+    service.executor.shutdown()
+
+@pytest.mark.asyncio
+async def test_search_cache_normalizes_queries(search_service):
+    await search_service.add_memory("学习FastAPI", user_id="u1")
+    first = await search_service.search_memories("FastAPI", user_id="u1", limit=5)
+    assert await search_service.search_memories("  ｆａｓｔａｐｉ ", user_id="u1", limit=5) == first
+    assert search_service.client.searches == 1
+    await search_service.search_memories("FastAPI", user_id="u1", limit=6)
+    await search_service.search_memories("FastAPI", user_id="u2", limit=5)
+    assert search_service.client.searches == 3
+
+@pytest.mark.asyncio
+async def test_writes_bump_generation_so_stale_results_never_leak(search_service):
+    memory_id = (await search_service.add_memory("学习FastAPI", user_id="u1"))["id"]
+    assert len(await search_service.search_memories("fastapi", user_id="u1")) == 1
+
+    await search_service.add_memory("FastAPI进阶", user_id="u1")
+    assert len(await search_service.search_memories("fastapi", user_id="u1")) == 2
+
+    await search_service.update_memory(memory_id, "学习Django", user_id="u1")
+    assert len(await search_service.search_memories("fastapi", user_id="u1")) == 1
+
+    await search_service.delete_memory(memory_id)
+    assert len(await search_service.search_memories("django", user_id="u1")) == 0
+    assert search_service.client.searches == 4
+
+def test_search_key_taken_before_write_is_not_served_after():
+    from app.services.memory_cache import SearchResultCache
+    cache = SearchResultCache()
+    stale_key = cache.key("u1", "q", 10)
+    cache.bump("u1")
+    cache.set(stale_key, [{"id": "old"}])
+    assert cache.get(cache.key("u1", "q", 10)) is None
+
+def test_write_clock_is_bounded_and_never_misses_a_write():
+    clock = WriteClock(max_users=2)
+    stamp = clock.now()
+    clock.written("u1")
+    for user in ("u2", "u3", "u4"):
+        clock.written(user)
+    assert len(clock) == 2
+    # u1已被淘汰，仍判定为有写入；从未写过的用户也按下限保守判断
+    assert clock.changed_since("u1", stamp) and clock.changed_since("new", stamp)
+    assert not clock.changed_since("u4", clock.now())
+    before = clock.last_write("u4")
+    clock.written()
+    assert clock.last_write("u4") > before and len(clock) == 0
@@ -0,0 +1,99 @@
+import httpx
+import pytest
+from app.services.demo_memory_client import DemoMemoryClient
+from app.services.mem0_http_client import AsyncMem0Client
+from app.services.memory_service import MemoryService, decode_cursor, encode_cursor
+from app.utils.exceptions import ValidationException
+from tests.fake_servers import create_fake_mem0_app
+
+async def collect_pages(service, user_id, limit):
+    pages, cursor = [], None
+    while True:
+        page = await service.list_memories(user_id=user_id, limit=limit, cursor=cursor)
+        pages.append([item["memory"] for item in page["results"]])
+        if not page["has_more"]:
+            assert page["next_cursor"] is None
+            return pages, page["total"]
+        cursor = page["next_cursor"]
+
+def test_demo_client_pages_with_keyset_cursor():
+    client = DemoMemoryClient(api_key="demo")
+    ids = [client.add([{"role": "user", "content": f"m{i}"}], user_id="u1")["id"] for i in range(5)]
+    client.add([{"role": "user", "content": "other"}], user_id="u2")
+
+    first = client.list("u1", limit=2)
+    assert [m["id"] for m in first["results"]] == ids[:2]
+    # 删除游标之前的记录不影响后续页
+    client.delete(ids[0])
+    second = client.list("u1", limit=2, cursor=first["next_cursor"])
+    assert [m["id"] for m in second["results"]] == ids[2:4]
+    assert second["total"] == 4
+
+def test_demo_client_ids_do_not_collide_after_delete():
+    client = DemoMemoryClient(api_key="demo")
+    first = client.add([{"role": "user", "content": "a"}], user_id="u1")["id"]
+    client.add([{"role": "user", "content": "b"}], user_id="u1")
+    client.delete(first)
+    third = client.add([{"role": "user", "content": "c"}], user_id="u1")["id"]
+    assert len({m["id"] for m in client.get_all("u1")}) == 2
+    assert third != first
+
+def test_demo_client_partitions_storage_by_user():
+    client = DemoMemoryClient(api_key="demo")
+    mine = client.add([{"role": "user", "content": "FastAPI笔记"}], user_id="u1")["id"]
+    theirs = client.add([{"role": "user", "content": "FastAPI笔记"}], user_id="u2")["id"]
+
+    assert [m["id"] for m in client.get_all("u1")] == [mine]
+    assert [m["id"] for m in client.keyword_search("FastAPI", user_id="u2")] == [theirs]
+    assert client.get_all("nobody") == [] and client.list("nobody")["total"] == 0
+    # 指定user_id时不能修改或删除其他用户的记忆
+    assert "error" in client.update(theirs, "篡改", user_id="u1")
+    assert "error" in client.delete(theirs, user_id="u1")
+    assert client.get(theirs)["memory"] == "FastAPI笔记"
+    assert client.delete(theirs, user_id="u2") == {"deleted": True}
+    assert client.get(theirs) is None and client.get_all("u2") == []
+
+@pytest.mark.asyncio
+async def test_list_memories_walks_all_pages_with_demo_client():
+    service = MemoryService(client=DemoMemoryClient(api_key="demo"))
+    for i in range(7):
+        await service.add_memory(f"m{i}", user_id="u1")
+    pages, total = await collect_pages(service, "u1", limit=3)
+    assert pages == [["m0", "m1", "m2"], ["m3", "m4", "m5"], ["m6"]]
+    assert total == 7
+    await service.shutdown()
+
+@pytest.mark.asyncio
+async def test_list_memories_uses_page_params_on_http_backend():
+    app = create_fake_mem0_app()
+    client = AsyncMem0Client(api_key="k", base_url="http://fake", transport=httpx.ASGITransport(app=app))
+    service = MemoryService(client=client)
+    for i in range(5):
+        await service.add_memory(f"m{i}", user_id="u1")
+    pages, total = await collect_pages(service, "u1", limit=2)
+    assert pages == [["m0", "m1"], ["m2", "m3"], ["m4"]]
+    assert total == 5
+    await service.shutdown()
+
+def test_cursor_roundtrip_and_validation():
+    assert decode_cursor(encode_cursor(42)) == 42
+    assert decode_cursor(None) is None
+    with pytest.raises(ValidationException):
+        decode_cursor("not-a-cursor")
+
+@pytest.mark.asyncio
+async def test_add_memories_reports_per_item_status():
+    class FlakyClient(DemoMemoryClient):
+        def add(self, messages, user_id, metadata=None):
+            if messages[0]["content"] == "boom":
+                raise RuntimeError("backend down")
+            return super().add(messages, user_id, metadata)
+
+    service = MemoryService(client=FlakyClient(api_key="demo"))
+    results = await service.add_memories(
+        [{"content": "a"}, {"content": "boom"}, {"content": "b", "metadata": {"k": "v"}}],
+        user_id="u", concurrency=2
+    )
+    assert [r["status"] for r in results] == ["created", "error", "created"]
+    assert results[1]["error"] == "backend down"
+    assert len(await service.get_all_memories("u")) == 2
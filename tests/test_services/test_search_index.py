@@ -0,0 +1,84 @@
+from app.services.demo_memory_client import DemoMemoryClient
+from app.services.search_index import BM25Index, FilterIndex, tokenize
+
+def test_tokenize_uses_bigrams_for_chinese_and_words_for_latin():
+    assert tokenize("记忆管理", for_query=True) == ["记忆", "忆管", "管理"]
+    assert tokenize("学FastAPI", for_query=True) == ["学", "fastapi"]
+    assert tokenize("ＡＰＩ 接口") == ["api", "接口", "接", "口"]
+
+def test_bm25_ranks_more_relevant_documents_first():
+    index = BM25Index()
+    index.add("a", "今天学习了FastAPI的依赖注入系统")
+    index.add("b", "记忆管理系统：管理个人记忆，检索记忆")
+    index.add("c", "周末去公园散步")
+    results = index.search("记忆管理", limit=10)
+    assert [doc_id for doc_id, _ in results] == ["b"]
+    assert results[0][1] > 0
+
+    results = index.search("系统", limit=10)
+    assert {doc_id for doc_id, _ in results} == {"a", "b"}
+
+def test_single_character_query_matches():
+    index = BM25Index()
+    index.add("a", "学习")
+    assert index.search("学")[0][0] == "a"
+
+def test_index_updates_and_removals():
+    index = BM25Index()
+    index.add("a", "苹果")
+    index.add("a", "香蕉")
+    assert index.search("苹果") == []
+    assert index.search("香蕉")[0][0] == "a"
+    index.remove("a")
+    assert index.search("香蕉") == [] and len(index) == 0
+
+def test_candidates_restrict_results():
+    index = BM25Index()
+    index.add("a", "会议记录")
+    index.add("b", "会议纪要")
+    assert [doc_id for doc_id, _ in index.search("会议", candidates={"b"})] == ["b"]
+
+def test_demo_client_search_returns_scores_per_user():
+    client = DemoMemoryClient(api_key="demo")
+    first = client.add([{"role": "user", "content": "学习FastAPI的依赖注入"}], user_id="u1")["id"]
+    client.add([{"role": "user", "content": "FastAPI中间件"}], user_id="u2")
+    client.add([{"role": "user", "content": "读书笔记"}], user_id="u1")
+
+    results = client.search("依赖注入", user_id="u1")
+    assert [r["id"] for r in results] == [first]
+    assert results[0]["score"] > 0
+
+    client.update(first, "学习Django")
+    assert client.search("依赖注入", user_id="u1") == []
+    client.delete(first)
+    assert client.search("django", user_id="u1") == []
+
+def test_filter_index_candidates():
+    index = FilterIndex()
+    index.add("a", ["study"], {"importance": "high", "tags": ["FastAPI", "编程"]})
+    index.add("b", ["work"], {"importance": "high"})
+    index.add("c", ["study"], {"importance": "low"})
+    assert index.candidates() is None
+    assert index.candidates(categories=["study", "work"]) == {"a", "b", "c"}
+    assert index.candidates(categories=["study"], metadata_filter={"importance": "high"}) == {"a"}
+    assert index.candidates(metadata_filter={"tags": "FastAPI"}) == {"a"}
+    assert index.candidates(metadata_filter={"importance": "none"}) == set()
+
+    index.add("a", ["work"], {})
+    assert index.candidates(categories=["study"]) == {"c"}
+    index.remove("c")
+    assert index.candidates(categories=["study"]) == set()
+
+def test_filters_are_applied_before_scoring():
+    client = DemoMemoryClient(api_key="demo")
+    for i in range(20):
+        client.add([{"role": "user", "content": "会议 会议 会议"}], user_id="u", metadata={"category": "work"})
+    target = client.add([{"role": "user", "content": "会议 记录"}], user_id="u", metadata={"category": "study"})["id"]
+
+    # 未过滤的top-1不会是目标，过滤后仍能召回
+    assert client.search("会议", user_id="u", limit=1)[0]["id"] != target
+    results = client.search("会议", user_id="u", limit=1, categories=["study"])
+    assert [r["id"] for r in results] == [target]
+
+    client.delete(target)
+    assert client.search("会议", user_id="u", limit=1, categories=["study"]) == []
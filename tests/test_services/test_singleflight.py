@@ -0,0 +1,84 @@
+import asyncio
+import pytest
+from app.services.memory_service import MemoryService
+from app.utils.singleflight import SingleFlight
+
+class SlowClient:
+    """记录调用次数的慢速客户端"""
+
+    def __init__(self):
+        self.calls = {"get_all": 0, "search": 0}
+        self.memories = []
+
+    async def get_all(self, user_id):
+        self.calls["get_all"] += 1
+        snapshot = list(self.memories)
+        await asyncio.sleep(0.02)
+        return snapshot
+
+    async def search(self, query, user_id, limit=10):
+        self.calls["search"] += 1
+        await asyncio.sleep(0.02)
+        return [{"id": "m1", "memory": query}]
+
+    async def add(self, messages, user_id, metadata=None):
+        self.memories.append({"id": f"m{len(self.memories)}", "memory": messages[0]["content"]})
+        return {"id": self.memories[-1]["id"]}
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_result_and_errors():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    assert await asyncio.gather(*(flight.do("k", work) for _ in range(5))) == ["result"] * 5
+    assert len(calls) == 1 and len(flight) == 0
+    assert flight.stats() == {"in_flight": 0, "calls": 1, "shared": 4}
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    results = await asyncio.gather(flight.do("e", fail), flight.do("e", fail), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    # 调用结束后不缓存结果
+    await flight.do("k", work)
+    assert len(calls) == 2
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_shared_call():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.02)
+        return 42
+
+    first = asyncio.ensure_future(flight.do("k", work))
+    second = asyncio.ensure_future(flight.do("k", work))
+    await asyncio.sleep(0)
+    first.cancel()
+    assert await second == 42
+
+@pytest.mark.asyncio
+async def test_memory_service_coalesces_identical_reads():
+    client = SlowClient()
+    service = MemoryService(client=client)
+    await asyncio.gather(*(service.get_all_memories("u") for _ in range(5)),
+                         *(service.search_memories("q", "u") for _ in range(5)),
+                         service.search_memories("q", "other"))
+    assert client.calls == {"get_all": 1, "search": 2}
+
+@pytest.mark.asyncio
+async def test_reads_after_a_write_do_not_join_earlier_flight():
+    client = SlowClient()
+    service = MemoryService(client=client)
+    before = asyncio.ensure_future(service.get_all_memories("u"))
+    await asyncio.sleep(0.005)
+    await service.add_memory("new", user_id="u")
+    after = await service.get_all_memories("u")
+    assert await before == [] and [m["memory"] for m in after] == ["new"]
+    assert client.calls["get_all"] == 2
@@ -0,0 +1,122 @@
+import threading
+import pytest
+from app.services.demo_memory_client import DemoMemoryClient
+from app.services.memory_service import MemoryService
+from app.services.sqlite_memory_store import SQLiteMemoryClient
+from app.utils.exceptions import InvalidCursorException
+
+@pytest.fixture
+def client(tmp_path):
+    client = SQLiteMemoryClient(str(tmp_path / "memories.db"))
+    yield client
+    client.close()
+
+def test_crud_persists_across_reopen(tmp_path):
+    path = str(tmp_path / "memories.db")
+    client = SQLiteMemoryClient(path)
+    first = client.add([{"role": "user", "content": "学习FastAPI依赖注入"}], user_id="u1", metadata={"tag": "work"})["id"]
+    second = client.add([{"role": "user", "content": "周末去爬山"}], user_id="u1")["id"]
+    client.delete(second)
+    client.close()
+
+    reopened = SQLiteMemoryClient(path)
+    assert [m["id"] for m in reopened.get_all("u1")] == [first]
+    assert reopened.get(first)["metadata"] == {"tag": "work"}
+    # 删除后新ID不与已有ID冲突
+    third = reopened.add([{"role": "user", "content": "新的"}], user_id="u1")["id"]
+    assert third not in (first, second)
+    reopened.close()
+
+def test_fts_search_is_scoped_to_user_and_tracks_updates(client):
+    mine = client.add([{"role": "user", "content": "学习FastAPI依赖注入"}], user_id="u1")["id"]
+    client.add([{"role": "user", "content": "周末去爬山"}], user_id="u1")
+    client.add([{"role": "user", "content": "FastAPI依赖注入"}], user_id="u2")
+
+    results = client.search("依赖注入", user_id="u1")
+    assert [m["id"] for m in results] == [mine] and results[0]["score"] > 0
+    assert client.search("", user_id="u1") == []
+
+    client.update(mine, "学习Django")
+    assert client.search("依赖注入", user_id="u1") == []
+    assert [m["id"] for m in client.search("django", user_id="u1")] == [mine]
+
+def test_ownership_is_enforced(client):
+    memory_id = client.add([{"role": "user", "content": "别人的"}], user_id="u2")["id"]
+    assert "error" in client.update(memory_id, "改", user_id="u1")
+    assert "error" in client.delete(memory_id, user_id="u1")
+    assert client.get(memory_id)["memory"] == "别人的"
+    assert client.delete(memory_id, user_id="u2") == {"deleted": True}
+
+def test_connection_per_thread(client):
+    client.add([{"role": "user", "content": "m"}], user_id="u")
+    seen = []
+
+    def read():
+        seen.append((client._conn(), len(client.get_all("u"))))
+
+    threads = [threading.Thread(target=read) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(conn) for conn, _ in seen}) == 3 and all(count == 1 for _, count in seen)
+
+@pytest.mark.asyncio
+async def test_memory_service_pages_sqlite_backend(client):
+    service = MemoryService(client=client)
+    for i in range(5):
+        await service.add_memory(f"m{i}", user_id="u")
+    contents, cursor = [], None
+    while True:
+        page = await service.list_memories("u", limit=2, cursor=cursor, use_cache=False)
+        contents.extend(m["memory"] for m in page["results"])
+        # 只有首页计算总数
+        assert page["total"] == (5 if cursor is None else None)
+        if not page["has_more"]:
+            break
+        cursor = page["next_cursor"]
+    assert contents == [f"m{i}" for i in range(5)]
+
+    results = await service.search_memories("m3", user_id="u", metadata_filter={"x": 1})
+    assert results == []
+
+def test_list_rejects_cursor_of_wrong_shape(client):
+    client.add([{"role": "user", "content": "m"}], user_id="u")
+    for cursor in (1, [1, 2], ["2024-01-01", "x"], ["2024-01-01", 1, 2]):
+        with pytest.raises(InvalidCursorException):
+            client.list("u", cursor=cursor)
+
+def test_scores_use_only_the_users_own_corpus(tmp_path):
+    mine = ["apple banana", "orange juice", "apple pie recipe", "weekend hiking"]
+    alone = SQLiteMemoryClient(str(tmp_path / "alone.db"))
+    shared = SQLiteMemoryClient(str(tmp_path / "shared.db"))
+    reference = DemoMemoryClient(api_key="demo")
+    for content in mine:
+        for client in (alone, shared, reference):
+            client.add([{"role": "user", "content": content}], user_id="u1")
+    # 另一个用户的语料中apple极其常见
+    for i in range(50):
+        shared.add([{"role": "user", "content": f"apple {i}"}], user_id="u2")
+
+    def scores(client):
+        # 同分时按记忆ID排序，各后端的ID不同，这里只比较得分
+        return sorted((m["memory"], m["score"]) for m in client.search("apple recipe", user_id="u1"))
+
+    assert scores(shared) == scores(alone) == scores(reference)
+    assert shared.search("apple recipe", user_id="u1")[0]["memory"] == "apple pie recipe"
+
+    # 更新和删除同步维护统计
+    for client in (shared, reference):
+        first = client.get_all("u1")[1]["id"]
+        client.update(first, "apple orange", user_id="u1")
+        client.delete(client.get_all("u1")[3]["id"], user_id="u1")
+    assert scores(shared) == scores(reference)
+
+    # 旧版本的库没有统计表时，打开时补齐
+    expected = scores(shared)
+    shared._conn().execute("DELETE FROM user_stats")
+    shared.close()
+    reopened = SQLiteMemoryClient(str(tmp_path / "shared.db"))
+    assert scores(reopened) == expected
+    for client in (alone, reopened):
+        client.close()
@@ -0,0 +1,108 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.services.embedding_service import EmbeddingService, HashingEmbeddingProvider
+from app.services.memory_service import MemoryService
+from app.services.vector_store import VectorIndex, VectorMemoryClient
+
+def _random_vectors(n, dim, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+def test_exact_search_matches_brute_force():
+    vectors = _random_vectors(200, 16)
+    index = VectorIndex(dim=16, initial_capacity=4)
+    for i, vector in enumerate(vectors):
+        index.add(f"v{i}", vector)
+
+    query = vectors[7] + 0.01
+    results = index.search(query, k=5)
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    expected = np.argsort(-(normalized @ (query / np.linalg.norm(query))))[:5]
+    assert [item_id for item_id, _ in results] == [f"v{i}" for i in expected]
+    assert results[0][0] == "v7" and results[0][1] == pytest.approx(1.0, abs=1e-3)
+
+def test_batch_search_and_candidates():
+    vectors = _random_vectors(50, 8)
+    index = VectorIndex(dim=8)
+    for i, vector in enumerate(vectors):
+        index.add(f"v{i}", vector)
+    batch = index.search_batch(vectors[[3, 9]], k=1)
+    assert [hits[0][0] for hits in batch] == ["v3", "v9"]
+    assert [item_id for item_id, _ in index.search(vectors[3], k=5, candidates={"v1", "v2"})] in (["v1", "v2"], ["v2", "v1"])
+
+def test_remove_keeps_matrix_compact():
+    index = VectorIndex(dim=4)
+    index.add("a", [1, 0, 0, 0])
+    index.add("b", [0, 1, 0, 0])
+    index.add("c", [0, 0, 1, 0])
+    index.remove("a")
+    assert len(index) == 2 and "a" not in index
+    assert index.search([0, 0, 1, 0], k=1)[0][0] == "c"
+    index.add("b", [0, 0, 0, 1])
+    assert index.search([0, 0, 0, 1], k=1)[0][0] == "b"
+
+def test_ivf_mode_recalls_nearest_neighbours():
+    centers = _random_vectors(20, 32, seed=1) * 5
+    rng = np.random.default_rng(2)
+    vectors = np.repeat(centers, 50, axis=0) + rng.standard_normal((1000, 32)).astype(np.float32)
+    index = VectorIndex(dim=32, mode="ivf", ivf_min_vectors=500, nprobe=4)
+    for i, vector in enumerate(vectors):
+        index.add(f"v{i}", vector)
+    assert index._ivf is not None
+
+    exact = VectorIndex(dim=32)
+    for i, vector in enumerate(vectors):
+        exact.add(f"v{i}", vector)
+    recall = []
+    for q in range(0, 1000, 50):
+        expected = {item_id for item_id, _ in exact.search(vectors[q], k=10)}
+        found = {item_id for item_id, _ in index.search(vectors[q], k=10)}
+        recall.append(len(expected & found) / 10)
+    assert sum(recall) / len(recall) >= 0.9
+
+    index.remove("v0")
+    assert "v0" not in {item_id for item_id, _ in index.search(vectors[0], k=10)}
+
+@pytest.mark.asyncio
+async def test_vector_backend_fills_embedding_id_and_scores():
+    service = MemoryService(client=VectorMemoryClient(api_key="local", dim=128))
+    first = await service.add_memory("今天学习了FastAPI的依赖注入", "user-a")
+    await service.add_memory("周末去公园散步", "user-a")
+    await service.add_memory("FastAPI依赖注入笔记", "user-b")
+
+    results = await service.search_memories("FastAPI依赖注入", "user-a", limit=5)
+    assert results[0]["id"] == first["id"]
+    assert results[0]["embedding_id"] and 0 < results[0]["score"] <= 1
+    assert all(r["user_id"] == "user-a" for r in results)
+
+    await service.update_memory(first["id"], "周末去爬山", user_id="user-a")
+    results = await service.search_memories("周末", "user-a", limit=1)
+    assert results[0]["memory"] in ("周末去爬山", "周末去公园散步")
+
+    await service.delete_memory(first["id"], user_id="user-a")
+    results = await service.search_memories("周末去爬山", "user-a", limit=5)
+    assert first["id"] not in {r["id"] for r in results}
+
+def test_update_with_unchanged_content_skips_embedding():
+    calls = []
+    provider = EmbeddingService(HashingEmbeddingProvider(dim=32), cache=None)
+
+    def embed(texts):
+        calls.append(list(texts))
+        return provider.embed_batch(texts)
+
+    client = VectorMemoryClient(api_key="local", dim=32, embed=embed)
+    memory_id = client.add([{"role": "user", "content": "笔记"}], user_id="u")["id"]
+    client.update(memory_id, "笔记")
+    assert calls == [["笔记"]]
+    client.update(memory_id, "新笔记")
+    assert calls[-1] == ["新笔记"]
+
+def test_vector_search_filters_before_scoring():
+    client = VectorMemoryClient(api_key="local", dim=64)
+    for i in range(10):
+        client.add([{"role": "user", "content": "FastAPI依赖注入"}], user_id="u", metadata={"importance": "low"})
+    target = client.add([{"role": "user", "content": "周末散步"}], user_id="u", metadata={"importance": "high"})["id"]
+    results = client.vector_search("FastAPI依赖注入", user_id="u", limit=1, metadata_filter={"importance": "high"})
+    assert [r["id"] for r in results] == [target]
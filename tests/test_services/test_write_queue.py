@@ -0,0 +1,90 @@
+import asyncio
+import time
+import pytest
+from app.services.memory_service import MemoryService
+from app.services.write_queue import WriteBehindQueue, WriteJournal
+
+@pytest.fixture
+def queue(tmp_path):
+    return WriteBehindQueue(WriteJournal(str(tmp_path / "journal.db")), group_commit_delay=0.01,
+                            retry_backoff=0.0, max_attempts=2)
+
+@pytest.mark.asyncio
+async def test_concurrent_submits_share_one_journal_commit(queue, monkeypatch):
+    commits = []
+    append_many = queue.journal.append_many
+    monkeypatch.setattr(queue.journal, "append_many", lambda entries: (commits.append(len(entries)), append_many(entries)))
+
+    accepted = await asyncio.gather(*(queue.submit("u", f"m{i}") for i in range(10)))
+    assert commits == [10]
+    assert all(item["status"] == "pending" for item in accepted)
+    assert (await queue.status(accepted[0]["write_id"], "u"))["status"] == "pending"
+    assert await queue.status(accepted[0]["write_id"], "other") is None
+    await queue.close()
+
+@pytest.mark.asyncio
+async def test_drain_writes_to_memory_service_and_survives_restart(tmp_path):
+    path = str(tmp_path / "journal.db")
+    first = WriteBehindQueue(WriteJournal(path))
+    accepted = [await first.submit("u", f"m{i}", {"i": i}) for i in range(3)]
+    await first.close()
+
+    # 重启后从日志继续写入
+    service = MemoryService()
+    second = WriteBehindQueue(WriteJournal(path))
+    assert await second.drain_once(service) == 3
+    assert await second.drain_once(service) == 0
+    status = await second.status(accepted[1]["write_id"], "u")
+    assert status["status"] == "committed" and status["attempts"] == 1
+    memory = await service.get_memory(status["memory_id"])
+    assert memory["memory"] == "m1" and memory["metadata"] == {"i": 1}
+    await second.close()
+
+@pytest.mark.asyncio
+async def test_failed_writes_are_retried_then_marked_failed(queue):
+    class FailingService:
+        calls = 0
+
+        async def add_memories(self, items, user_id):
+            self.calls += 1
+            return [{"status": "error", "error": "upstream down"}] * len(items)
+
+    service = FailingService()
+    accepted = await queue.submit("u", "m")
+    await queue.drain_once(service)
+    assert (await queue.status(accepted["write_id"], "u"))["status"] == "pending"
+    await queue.drain_once(service)
+    status = await queue.status(accepted["write_id"], "u")
+    assert status["status"] == "failed" and status["error"] == "upstream down" and service.calls == 2
+    await queue.close()
+
+@pytest.mark.asyncio
+async def test_background_worker_commits_submissions(queue):
+    service = MemoryService()
+    queue.start(service)
+    accepted = await queue.submit("u", "后台写入")
+    for _ in range(100):
+        status = await queue.status(accepted["write_id"], "u")
+        if status["status"] == "committed":
+            break
+        await asyncio.sleep(0.01)
+    assert status["status"] == "committed"
+    assert [m["memory"] for m in await service.get_all_memories("u")] == ["后台写入"]
+    await queue.close()
+
+def test_claimed_entries_are_not_handed_out_twice_until_lease_expires(tmp_path):
+    path = str(tmp_path / "journal.db")
+    first, second = WriteJournal(path), WriteJournal(path)
+    first.append_many([{"write_id": f"w{i}", "user_id": "u", "content": f"m{i}", "metadata": None}
+                       for i in range(3)])
+    now = time.time()
+    claimed = first.claim(2, now, lease=60.0)
+    assert [entry["write_id"] for entry in claimed] == ["w0", "w1"]
+    # 另一个进程（连接）只能认领剩余条目
+    assert [entry["write_id"] for entry in second.claim(10, now, lease=60.0)] == ["w2"]
+    assert second.claim(10, now, lease=60.0) == []
+    assert second.get("w0")["status"] == "pending"
+    # 租约到期后重新可被认领
+    assert [entry["write_id"] for entry in second.claim(10, now + 61.0, lease=60.0)] == ["w0", "w1", "w2"]
+    first.close()
+    second.close()